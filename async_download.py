@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Асинхронное скачивание файлов с повторами.
+
+Загрузки идут параллельно в asyncio: семафор ограничивает число
+одновременных запросов, сами запросы выполняются в потоках через общую
+requests.Session с пулом keep-alive соединений. На 429 и 5xx запрос
+повторяется с экспоненциальной задержкой, а если сервер прислал
+Retry-After - ждем, сколько он просит.
+
+Для каждого скачанного файла в .downloads.json запоминаются ETag,
+Last-Modified и размер. В следующий раз файл запрашивается условно
+(If-None-Match / If-Modified-Since) и на 304 не скачивается; файл без
+сведений пропускается, если его размер совпал с Content-Length.
+Файлы пишутся во временный файл и атомарно переименовываются.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import requests
+from email.utils import parsedate_to_datetime
+from extract_covers import create_session
+import build_cache
+import tracing
+
+STATE_FILE = ".downloads.json"
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+CONCURRENCY = 8
+RETRIES = 4
+BACKOFF = 0.5
+MAX_DELAY = 60
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CHUNK_SIZE = 64 * 1024
+
+class RetryableError(Exception):
+    """Временная ошибка: запрос стоит повторить, при необходимости не раньше retry_after секунд."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def load_state(filename=STATE_FILE):
+    """Загружает сведения о скачанных файлах."""
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_state(state, filename=STATE_FILE):
+    """Сохраняет сведения о скачанных файлах."""
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+def parse_retry_after(value):
+    """Retry-After в секундах: заголовок бывает и числом, и HTTP-датой."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def describe(url, response, size):
+    """Запись для .downloads.json по ответу сервера."""
+    return {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'size': size,
+    }
+
+def fetch_once(session, url, path, entry, force=False):
+    """
+    Одна попытка скачать url в path. Выполняется в потоке.
+    Возвращает (скачан ли файл, запись для состояния, число байт).
+    """
+    with tracing.span('fetch', path) as span:
+        headers = {}
+        exists = os.path.exists(path)
+        if (exists and not force and entry and entry.get('url') == url
+                and entry.get('size') == os.path.getsize(path)):
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = session.get(url, headers=headers, stream=True, timeout=30)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            raise RetryableError(str(e))
+        span['status'] = response.status_code
+        with response:
+            if response.status_code in RETRY_STATUSES:
+                raise RetryableError(f"HTTP {response.status_code}",
+                                     parse_retry_after(response.headers.get('Retry-After')))
+            if response.status_code == 304:
+                return False, entry, 0
+            response.raise_for_status()
+
+            length = response.headers.get('Content-Length')
+            if exists and not force and not headers and length and int(length) == os.path.getsize(path):
+                # Сведений о файле нет, но размер совпал - считаем его уже скачанным
+                return False, describe(url, response, int(length)), 0
+
+            size = 0
+            with build_cache.atomic_write(path, 'wb', suffix='.part') as f:
+                try:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+                        size += len(chunk)
+                except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError) as e:
+                    # Соединение оборвалось посреди тела: urllib3 сам замечает, что байт
+                    # меньше Content-Length, и до проверки ниже дело не доходит
+                    raise RetryableError(f"обрыв после {size} байт: {e}")
+                if length and size != int(length) and not response.headers.get('Content-Encoding'):
+                    raise RetryableError(f"получено {size} байт из {length}")
+        span['bytes'] = size
+        return True, describe(url, response, size), size
+
+async def fetch(session, semaphore, url, path, entry, force=False, retries=RETRIES):
+    """Скачивает файл, повторяя попытку при временных ошибках с экспоненциальной задержкой."""
+    async with semaphore:
+        for attempt in range(retries + 1):
+            try:
+                return await asyncio.to_thread(fetch_once, session, url, path, entry, force)
+            except RetryableError as e:
+                if attempt == retries:
+                    raise
+                delay = e.retry_after
+                if delay is None:
+                    # Случайная добавка разводит повторы параллельных запросов во времени
+                    delay = BACKOFF * 2 ** attempt * (1 + random.random())
+                await asyncio.sleep(min(delay, MAX_DELAY))
+
+async def download_jobs(jobs, state, concurrency, force, retries):
+    """Запускает все загрузки и печатает результат каждой по мере готовности."""
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {'downloaded': 0, 'skipped': 0, 'bytes': 0, 'failed': []}
+    with create_session(concurrency) as session:
+        session.headers['User-Agent'] = USER_AGENT
+
+        async def run(url, path):
+            try:
+                return url, path, await fetch(session, semaphore, url, path, state.get(path), force, retries)
+            except (RetryableError, requests.exceptions.RequestException, OSError) as e:
+                return url, path, e
+
+        tasks = [asyncio.create_task(run(url, path)) for url, path in jobs]
+        for i, task in enumerate(asyncio.as_completed(tasks)):
+            url, path, result = await task
+            if isinstance(result, Exception):
+                stats['failed'].append((url, path, str(result)))
+                print(f"({i+1}/{len(jobs)}) Ошибка {path}: {result}")
+                continue
+            downloaded, entry, size = result
+            if entry:
+                state[path] = entry
+            if downloaded:
+                stats['downloaded'] += 1
+                stats['bytes'] += size
+                print(f"({i+1}/{len(jobs)}) Скачано: {path} ({size / 1024:.0f} KB)")
+            else:
+                stats['skipped'] += 1
+    return stats
+
+def download_all(jobs, concurrency=CONCURRENCY, force=False, retries=RETRIES, state_file=STATE_FILE):
+    """
+    Скачивает файлы по списку (url, путь). Возвращает статистику:
+    скачано, пропущено без изменений, байт и список неудачных загрузок.
+    """
+    jobs = list(jobs)
+    for directory in {os.path.dirname(path) for _, path in jobs}:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    state = load_state(state_file)
+    started = time.perf_counter()
+    stats = asyncio.run(download_jobs(jobs, state, concurrency, force, retries))
+    elapsed = time.perf_counter() - started
+    save_state(state, state_file)
+
+    print(f"Скачано {stats['downloaded']} из {len(jobs)}, без изменений {stats['skipped']}, "
+          f"ошибок {len(stats['failed'])}. {stats['bytes'] / (1024 * 1024):.1f} MB за {elapsed:.1f} с "
+          f"({stats['bytes'] / (1024 * 1024) / max(elapsed, 1e-9):.2f} MB/с, "
+          f"{len(jobs) / max(elapsed, 1e-9):.1f} файлов/с)")
+    for url, path, error in stats['failed']:
+        print(f"  Не скачан {path} ({url}): {error}")
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Параллельное скачивание файлов по списку")
+    parser.add_argument('list', help="файл со строками 'URL путь'")
+    parser.add_argument('--jobs', type=int, default=CONCURRENCY,
+                        help=f"число одновременных загрузок (по умолчанию {CONCURRENCY})")
+    parser.add_argument('--retries', type=int, default=RETRIES, help=f"число повторов (по умолчанию {RETRIES})")
+    parser.add_argument('--force', action='store_true', help="скачать все файлы заново")
+    tracing.add_argument(parser)
+    args = parser.parse_args()
+    with open(args.list, 'r', encoding='utf-8') as f:
+        jobs = [line.split(None, 1) for line in f if line.strip()]
+    with tracing.session(args.trace):
+        download_all([(url, path.strip()) for url, path in jobs], concurrency=max(1, args.jobs),
+                     force=args.force, retries=args.retries)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Вес страницы архива: статическая сетка против виртуальной.
+
+Сравнивает нынешний index.html, где в разметке все обложки, со страницей
+site_render.py --virtual, которая рисует из JSON только строки рядом с экраном.
+Без браузера считаются размер HTML (и gzip) и число элементов в разметке,
+для виртуальной страницы - вместе с JSON каталога. Если установлены Selenium
+и Chrome, страницы открываются в headless Chrome через server.py и замеряются
+число узлов DOM после загрузки и после прокрутки до конца, DOMContentLoaded,
+загрузка, готовность сетки и время до интерактивности: конец последней
+длинной задачи (дольше 50 мс) или DOMContentLoaded, если их не было.
+
+Запуск из корня репозитория: python bench/dom_weight.py
+"""
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import socket
+import argparse
+import subprocess
+from html.parser import HTMLParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from catalog import DATA_DIR, load_catalog
+from site_render import render_site
+
+STATIC_PAGE = "index.html"
+VIRTUAL_PAGE = "index_virtual.html"
+# Собирает длинные задачи с самого начала загрузки страницы
+LONGTASK_OBSERVER = """
+window.__longtasks = [];
+new PerformanceObserver(list => window.__longtasks.push(...list.getEntries().map(e => e.startTime + e.duration)))
+    .observe({ type: 'longtask', buffered: true });
+"""
+PAGE_METRICS = """
+const nav = performance.getEntriesByType('navigation')[0];
+const ready = performance.getEntriesByName('vgrid-ready')[0];
+return {
+    nodes: document.getElementsByTagName('*').length,
+    dcl: nav.domContentLoadedEventEnd,
+    load: nav.loadEventEnd,
+    ready: ready ? ready.startTime : null,
+    tti: Math.max(nav.domContentLoadedEventEnd, ready ? ready.startTime : 0, ...window.__longtasks),
+};
+"""
+
+class ElementCounter(HTMLParser):
+    """Считает элементы в разметке."""
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def handle_starttag(self, tag, attrs):
+        self.count += 1
+
+def static_metrics(page, extra_files=()):
+    """Размер страницы и ее данных в байтах (и в gzip) и число элементов в разметке."""
+    files = [page] + list(extra_files)
+    data = [open(path, 'rb').read() for path in files]
+    counter = ElementCounter()
+    counter.feed(data[0].decode('utf-8'))
+    counter.close()
+    return {
+        'bytes': sum(len(d) for d in data),
+        'gzip': sum(len(gzip.compress(d, compresslevel=9)) for d in data),
+        'elements': counter.count,
+    }
+
+def free_port():
+    """Свободный TCP-порт для server.py."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for_port(port, timeout=10):
+    """Ждет, пока сервер начнет принимать соединения."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server.py не ответил на порту {port}")
+
+def browser_metrics(pages, repeat):
+    """Замеры в headless Chrome: медиана по repeat загрузкам. None, если браузера нет."""
+    try:
+        from selenium import webdriver
+        from selenium.common.exceptions import WebDriverException
+    except ImportError:
+        print("Selenium не установлен: замеры в браузере пропущены")
+        return None
+
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless=new')
+    options.add_argument('--window-size=1280,900')
+    try:
+        driver = webdriver.Chrome(options=options)
+    except WebDriverException as e:
+        print(f"Chrome не запустился, замеры в браузере пропущены: {e.msg}")
+        return None
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py"), '--port', str(port),
+                               '--root', ROOT, '--no-browser'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = {}
+    try:
+        wait_for_port(port)
+        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': LONGTASK_OBSERVER})
+        for page in pages:
+            runs = []
+            for _ in range(repeat):
+                driver.get(f"http://127.0.0.1:{port}/{page}")
+                # Виртуальная сетка появляется после загрузки JSON
+                deadline = time.monotonic() + 10
+                while (time.monotonic() < deadline and page == VIRTUAL_PAGE
+                       and not driver.execute_script("return performance.getEntriesByName('vgrid-ready').length")):
+                    time.sleep(0.05)
+                metrics = driver.execute_script(PAGE_METRICS)
+                driver.execute_script("window.scrollTo(0, document.body.scrollHeight)")
+                time.sleep(0.3)
+                metrics['nodes_scrolled'] = driver.execute_script(
+                    "return document.getElementsByTagName('*').length")
+                runs.append(metrics)
+            results[page] = {key: sorted(run[key] for run in runs)[len(runs) // 2]
+                             if runs[0][key] is not None else None for key in runs[0]}
+    finally:
+        driver.quit()
+        server.terminate()
+        server.wait()
+    return results
+
+def run(repeat=3, keep=False):
+    """Собирает виртуальную страницу и сравнивает ее с index.html."""
+    if not os.path.exists(STATIC_PAGE):
+        print(f"{STATIC_PAGE} не найден: сначала соберите сайт")
+        return
+    render_site(load_catalog(), output=VIRTUAL_PAGE, virtual=True, force=True)
+    data_files = glob.glob(os.path.join(DATA_DIR, "covers.*.json"))
+    try:
+        static = {STATIC_PAGE: static_metrics(STATIC_PAGE),
+                  VIRTUAL_PAGE: static_metrics(VIRTUAL_PAGE, data_files)}
+        browser = browser_metrics([STATIC_PAGE, VIRTUAL_PAGE], repeat)
+    finally:
+        if not keep:
+            os.remove(VIRTUAL_PAGE)
+
+    print(f"\n{'страница':<20} {'KB':>7} {'gzip, KB':>9} {'элементов':>10}")
+    for page, metrics in static.items():
+        print(f"{page:<20} {metrics['bytes'] / 1024:>7.1f} {metrics['gzip'] / 1024:>9.1f} "
+              f"{metrics['elements']:>10}")
+    print("  (для виртуальной страницы KB - вместе с JSON каталога)")
+    if browser:
+        print(f"\n{'страница':<20} {'узлов':>7} {'после прокрутки':>16} {'DCL, мс':>8} "
+              f"{'сетка, мс':>10} {'load, мс':>9} {'TTI, мс':>8}")
+        for page, metrics in browser.items():
+            ready = f"{metrics['ready']:.0f}" if metrics['ready'] is not None else '-'
+            print(f"{page:<20} {metrics['nodes']:>7} {metrics['nodes_scrolled']:>16} {metrics['dcl']:>8.0f} "
+                  f"{ready:>10} {metrics['load']:>9.0f} {metrics['tti']:>8.0f}")
+    return {'static': static, 'browser': browser}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Вес DOM и время до интерактивности: статическая и виртуальная сетка")
+    parser.add_argument('--repeat', type=int, default=3, help="число загрузок каждой страницы (по умолчанию 3)")
+    parser.add_argument('--keep', action='store_true', help=f"не удалять собранную {VIRTUAL_PAGE}")
+    parser.add_argument('--json', metavar='FILE', help="записать результаты в FILE")
+    args = parser.parse_args()
+    results = run(repeat=max(1, args.repeat), keep=args.keep)
+    if results and args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
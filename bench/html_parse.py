@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Сравнение разбора HTML: BeautifulSoup против потокового html_stream.
+
+Для каждой страницы замеряет лучшее время из нескольких запусков и пик
+памяти (tracemalloc) и проверяет, что оба способа находят одинаковые записи.
+Запуск из корня репозитория: python bench/html_parse.py
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_stream import iter_cover_items, iter_sheet_rows, read_chunks
+
+# Сгенерированные страницы с обложками и сохраненные копии Google-таблицы
+COVER_PAGES = ['index.html', 'index_old.html']
+SHEET_PAGES = ['iframe_output.html', 'selenium_output.html']
+
+def soup_cover_items(filename):
+    """Записи обложек через BeautifulSoup, как их разбирали раньше."""
+    with open(filename, 'r', encoding='utf-8') as f:
+        soup = BeautifulSoup(f.read(), 'html.parser')
+    items = []
+    for cover in soup.find_all('div', class_='cover-item'):
+        number_elem = cover.find('div', class_='cover-number')
+        date_elem = cover.find('div', class_='cover-date')
+        img_elem = cover.find('img')
+        items.append((number_elem.get_text(strip=True) if number_elem else '',
+                      date_elem.get_text(strip=True) if date_elem else '',
+                      img_elem.get('src', '') if img_elem else ''))
+    return items
+
+def stream_cover_items(filename):
+    """Записи обложек через потоковый парсер."""
+    return [(item['number'], item['date'], item['image_url'])
+            for item in iter_cover_items(read_chunks(filename))]
+
+def soup_sheet_rows(filename):
+    """Строки первой таблицы через BeautifulSoup."""
+    with open(filename, 'r', encoding='utf-8') as f:
+        soup = BeautifulSoup(f.read(), 'html.parser')
+    table = soup.find('table')
+    if not table:
+        return []
+    rows = []
+    for tr in table.find_all('tr'):
+        cells = []
+        for td in tr.find_all('td'):
+            img = td.find('img')
+            cells.append((td.get_text(strip=True), img.get('src', '') if img else ''))
+        rows.append(cells)
+    return rows
+
+def stream_sheet_rows(filename):
+    """Строки первой таблицы через потоковый парсер."""
+    return list(iter_sheet_rows(read_chunks(filename)))
+
+def measure(func, filename, repeat):
+    """Возвращает (результат, лучшее время в секундах, пик памяти в байтах)."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(filename)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(filename)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best, peak
+
+def run(repeat=5):
+    """Прогоняет оба способа разбора по всем найденным страницам."""
+    cases = [(f, soup_cover_items, stream_cover_items) for f in COVER_PAGES]
+    cases += [(f, soup_sheet_rows, stream_sheet_rows) for f in SHEET_PAGES]
+
+    print(f"{'файл':<22} {'KB':>6} {'записей':>8} {'bs4, мс':>9} {'поток, мс':>10} "
+          f"{'bs4, MB':>8} {'поток, MB':>10}")
+    for filename, soup_func, stream_func in cases:
+        if not os.path.exists(filename):
+            print(f"{filename:<22} не найден, пропускаю")
+            continue
+        soup_result, soup_time, soup_peak = measure(soup_func, filename, repeat)
+        stream_result, stream_time, stream_peak = measure(stream_func, filename, repeat)
+        same = '' if soup_result == stream_result else '  (результаты различаются)'
+        print(f"{filename:<22} {os.path.getsize(filename) / 1024:>6.0f} {len(stream_result):>8} "
+              f"{soup_time * 1000:>9.1f} {stream_time * 1000:>10.1f} "
+              f"{soup_peak / (1024 * 1024):>8.1f} {stream_peak / (1024 * 1024):>10.2f}{same}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сравнение BeautifulSoup и потокового разбора HTML")
+    parser.add_argument('--repeat', type=int, default=5, help="число замеров времени (по умолчанию 5)")
+    args = parser.parse_args()
+    run(repeat=args.repeat)
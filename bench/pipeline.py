@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""Замер всего конвейера сборки на фиксированном наборе данных.
+
+Во временной папке собирается фикстура: несколько PDF, нарисованных
+PyMuPDF (всегда одинаковых), первые строки links.csv со ссылками на эти
+PDF, миниатюры к ним из covers/ и iframe_output.html. PDF раздает
+server.py на локальном порту, так что сеть не нужна.
+
+Стадии запускаются по очереди отдельными процессами, как в жизни:
+extract_covers -> process_images -> selenium_extract (generate_html_from_data)
+-> merge_data. Для каждой замеряются время, процессорное время (вместе
+с процессами пула), пик памяти и объем записанных файлов. Результат
+пишется в JSON и сравнивается с сохраненным базовым замером: если стадия
+стала медленнее больше чем на порог, скрипт завершается с ошибкой.
+
+Запуск из корня репозитория:
+    python bench/pipeline.py --save-baseline   # записать базовый замер
+    python bench/pipeline.py                   # сравнить с ним
+"""
+import os
+import sys
+import csv
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import fitz  # PyMuPDF
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from catalog import LINKS_FILE, THUMB_DIR, cover_filename
+
+BENCH_DIR = os.path.join(ROOT, "bench")
+BASELINE_FILE = os.path.join(BENCH_DIR, "pipeline_baseline.json")
+RESULTS_FILE = os.path.join(BENCH_DIR, "pipeline_results.json")
+SHEET_FILE = "iframe_output.html"
+# Стадии: имя и команда относительно корня репозитория
+STAGES = [
+    ('extract_covers', ['extract_covers.py', '--force']),
+    ('process_images', ['process_images.py', '--force']),
+    ('generate_html', ['selenium_extract.py', '--from-file', SHEET_FILE]),
+    ('merge_data', ['merge_data.py']),
+]
+# Метрики, по которым ищется регрессия, и минимальная разница, которую
+# не стоит считать регрессией: шум измерений
+METRICS = {'wall': 0.05, 'cpu': 0.05, 'maxrss_mb': 5.0}
+THRESHOLD = 0.2
+
+def make_pdf(path, seed, pages=4):
+    """Рисует PDF выпуска: цветные блоки, текст и растровая картинка на обложке."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page(width=595, height=842)
+        for _ in range(12):
+            x, y = rng.uniform(0, 500), rng.uniform(0, 750)
+            color = (rng.random(), rng.random(), rng.random())
+            page.draw_rect(fitz.Rect(x, y, x + rng.uniform(40, 200), y + rng.uniform(20, 150)),
+                           color=color, fill=color)
+        page.insert_text((40, 60), f"Afisha fixture {seed}, page {number + 1}", fontsize=24)
+        for line in range(30):
+            page.insert_text((40, 100 + line * 22), " ".join(
+                rng.choice(["kino", "muzyka", "restoran", "teatr", "vystavka", "klub"]) for _ in range(8)),
+                fontsize=11)
+        if number == 0:
+            # Растровая картинка делает рендеринг обложки похожим на настоящий
+            pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 256, 256), False)
+            pix.set_rect(pix.irect, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+            for _ in range(40):
+                x, y = rng.randrange(0, 240), rng.randrange(0, 240)
+                pix.set_rect(fitz.IRect(x, y, x + 16, y + 16),
+                             (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+            page.insert_image(fitz.Rect(150, 300, 450, 600), pixmap=pix)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+def build_fixture(workdir, count, port):
+    """Собирает фикстуру в workdir: PDF, links.csv, миниатюры и страницу таблицы."""
+    os.makedirs(os.path.join(workdir, "fixture_pdfs"))
+    os.makedirs(os.path.join(workdir, THUMB_DIR))
+    with open(os.path.join(ROOT, LINKS_FILE), 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        rows = [row for row in reader if row.get('Дата') and row.get('Выпуск')][:count]
+
+    for i, row in enumerate(rows):
+        make_pdf(os.path.join(workdir, "fixture_pdfs", f"{i}.pdf"), seed=i)
+        row['Ссылка на выпуск'] = f"http://127.0.0.1:{port}/fixture_pdfs/{i}.pdf"
+    with open(os.path.join(workdir, LINKS_FILE), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    # Миниатюры из таблицы: имена те же, что даст каталог фикстуры
+    by_year = {}
+    for row in sorted(rows, key=lambda r: r['Дата']):
+        year = row['Дата'][:4]
+        index = by_year.setdefault(year, 0)
+        by_year[year] += 1
+        filename = cover_filename(year, row['Выпуск'].strip(), index)
+        source = os.path.join(ROOT, THUMB_DIR, filename)
+        if os.path.exists(source):
+            shutil.copy(source, os.path.join(workdir, THUMB_DIR, filename))
+    shutil.copy(os.path.join(ROOT, SHEET_FILE), os.path.join(workdir, SHEET_FILE))
+
+def free_port():
+    """Свободный порт для сервера фикстуры."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for_port(port, timeout=10):
+    """Ждет, пока сервер начнет принимать соединения."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"сервер на порту {port} не запустился")
+
+def snapshot(directory):
+    """Размер и время изменения всех файлов папки."""
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            files[path] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+def run_stage(command, workdir, log):
+    """
+    Запускает стадию и возвращает ее метрики. Процессорное время и пик памяти
+    берутся из wait4: они учитывают и дочерние процессы стадии (пулы рендеринга).
+    """
+    before = snapshot(workdir)
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable] + [os.path.join(ROOT, command[0])] + command[1:],
+                               cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - started
+    # Процесс уже собран wait4, Popen не должен ждать его второй раз
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise RuntimeError(f"{command[0]} завершился с кодом {process.returncode}")
+
+    after = snapshot(workdir)
+    written = sum(size for path, (size, mtime) in after.items() if before.get(path) != (size, mtime))
+    return {
+        'wall': round(wall, 3),
+        'cpu': round(usage.ru_utime + usage.ru_stime, 3),
+        # ru_maxrss в Linux в килобайтах
+        'maxrss_mb': round(usage.ru_maxrss / 1024, 1),
+        'written_bytes': written,
+    }
+
+def run_once(count, keep=False):
+    """Один прогон всех стадий на свежей фикстуре."""
+    workdir = tempfile.mkdtemp(prefix="afisha_bench_")
+    port = free_port()
+    results = {}
+    server = None
+    try:
+        build_fixture(workdir, count, port)
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py"), '--port', str(port),
+                                   '--root', workdir, '--no-browser'],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wait_for_port(port)
+        with open(os.path.join(workdir, "bench.log"), 'w', encoding='utf-8') as log:
+            for name, command in STAGES:
+                results[name] = run_stage(command, workdir, log)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        if keep:
+            print(f"Фикстура и лог стадий: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def median_results(runs):
+    """Медиана каждой метрики по прогонам."""
+    return {name: {metric: statistics.median(run[name][metric] for run in runs) for metric in runs[0][name]}
+            for name in runs[0]}
+
+def compare(stages, baseline, threshold):
+    """Печатает сравнение с базовым замером и возвращает список регрессий."""
+    regressions = []
+    print(f"{'стадия':<16} {'время, с':>9} {'CPU, с':>8} {'память, MB':>11} {'записано, KB':>13}  к базе")
+    for name, metrics in stages.items():
+        base = baseline.get(name, {})
+        notes = []
+        for metric, floor in METRICS.items():
+            if metric not in base:
+                continue
+            delta = metrics[metric] - base[metric]
+            if base[metric] and delta > floor and metrics[metric] > base[metric] * (1 + threshold):
+                regressions.append((name, metric, base[metric], metrics[metric]))
+                notes.append(f"{metric} +{delta / base[metric]:.0%}")
+        change = ""
+        if base.get('wall'):
+            change = f"{(metrics['wall'] - base['wall']) / base['wall']:+.0%}"
+        print(f"{name:<16} {metrics['wall']:>9.2f} {metrics['cpu']:>8.2f} {metrics['maxrss_mb']:>11.1f} "
+              f"{metrics['written_bytes'] / 1024:>13.0f}  {change}"
+              + (f"  РЕГРЕССИЯ: {', '.join(notes)}" if notes else ""))
+    return regressions
+
+def run(count=6, repeat=3, threshold=THRESHOLD, output=RESULTS_FILE, baseline_file=BASELINE_FILE,
+        save_baseline=False, keep=False):
+    """Прогоняет конвейер repeat раз и сравнивает медианы с базовым замером."""
+    runs = []
+    for i in range(repeat):
+        print(f"Прогон {i + 1}/{repeat}...")
+        runs.append(run_once(count, keep=keep and i == repeat - 1))
+    stages = median_results(runs)
+    result = {
+        'meta': {
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'pdfs': count,
+            'repeat': repeat,
+        },
+        'stages': stages,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=1)
+    print(f"Результаты записаны в {os.path.relpath(output)}")
+
+    if save_baseline:
+        with open(baseline_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=1)
+        print(f"Базовый замер записан в {os.path.relpath(baseline_file)}")
+
+    try:
+        with open(baseline_file, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {'stages': {}}
+        print("Базового замера нет, сравнивать не с чем (запустите с --save-baseline)")
+    regressions = compare(stages, baseline['stages'], threshold)
+    for name, metric, before, after in regressions:
+        print(f"  {name}: {metric} {before} -> {after} (порог {threshold:.0%})")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замер стадий конвейера сборки с проверкой регрессий")
+    parser.add_argument('--pdfs', type=int, default=6, help="число PDF в фикстуре (по умолчанию 6)")
+    parser.add_argument('--repeat', type=int, default=3, help="число прогонов, берется медиана (по умолчанию 3)")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help=f"допустимое замедление относительно базы (по умолчанию {THRESHOLD})")
+    parser.add_argument('--output', default=RESULTS_FILE, help="куда записать результаты (JSON)")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="файл базового замера (JSON)")
+    parser.add_argument('--save-baseline', action='store_true', help="сохранить этот замер как базовый")
+    parser.add_argument('--keep', action='store_true', help="не удалять фикстуру последнего прогона")
+    args = parser.parse_args()
+    if run(count=args.pdfs, repeat=max(1, args.repeat), threshold=args.threshold, output=args.output,
+           baseline_file=args.baseline, save_baseline=args.save_baseline, keep=args.keep):
+        raise SystemExit(1)
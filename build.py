@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""Сборка сайта одной командой.
+
+Стадии конвейера описаны ниже вместе с их входами и выходами; зависимости
+между ними выводятся из этих путей: стадия ждет ту, что пишет ее вход.
+Независимые стадии идут параллельно (например, сжатие обложек и индексация
+текста). Стадия пропускается, если ее выходы новее входов и самого скрипта.
+Время завершения каждой стадии хранится в .build_state.json: стадия,
+которой нечего было обновить, не трогает выходы и иначе запускалась бы
+каждый раз. В конце печатается время стадий и критический путь.
+
+    python build.py                          # стадии по умолчанию
+    python build.py mirror_pdfs search_index # только названные (и их зависимости)
+    python build.py --dry-run                # показать план
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from build_assets import DIST_DIR
+from catalog import (CATALOG_FILE, LINKS_FILE, SHEET_ROWS_FILE, BIG_DIR, THUMB_DIR, PDF_DIR,
+                     PAGES_DIR, SEARCH_DIR)
+from process_images import WIDTHS, PLACEHOLDERS_FILE, derivative_dir
+from sprites import SPRITES_DIR, SPRITE_WIDTH
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = ".build_state.json"
+TEMPLATES_DIR = "templates"
+DERIVATIVE_DIRS = [derivative_dir(width) for width in WIDTHS]
+
+# network - стадия ходит в сеть: она запускается, только если выходов еще нет,
+# изменились ее входы на диске или задан --refresh; правка самого скрипта
+# не повод заново скачивать данные. default=False - тяжелые стадии с PDF,
+# они запускаются, только если назвать их явно. optional - стадия правит
+# существующий файл и пропускается, если его нет. Размеры обложек и локальные
+# копии PDF catalog.py перечитывает с диска при каждой загрузке, поэтому папки
+# с ними - входы стадий, которые эти сведения используют, а не стадии catalog
+STAGES = [
+    # Страницу собирает стадия site, здесь таблица только загружается
+    {'name': 'sheet', 'command': ['selenium_extract.py', '--download-images', '--no-html'],
+     'inputs': [], 'outputs': [SHEET_ROWS_FILE, THUMB_DIR], 'network': True},
+    {'name': 'catalog', 'command': ['catalog.py'],
+     'inputs': [SHEET_ROWS_FILE, LINKS_FILE], 'outputs': [CATALOG_FILE]},
+    {'name': 'extract_covers', 'command': ['extract_covers.py'],
+     'inputs': [CATALOG_FILE], 'outputs': [BIG_DIR], 'network': True},
+    {'name': 'process_images', 'command': ['process_images.py'],
+     'inputs': [BIG_DIR], 'outputs': DERIVATIVE_DIRS + [PLACEHOLDERS_FILE]},
+    {'name': 'sprites', 'command': ['sprites.py'],
+     'inputs': [derivative_dir(SPRITE_WIDTH)], 'outputs': [SPRITES_DIR]},
+    {'name': 'mirror_pdfs', 'command': ['mirror_pdfs.py'],
+     'inputs': [CATALOG_FILE], 'outputs': [PDF_DIR], 'network': True, 'default': False},
+    {'name': 'search_index', 'command': ['search_index.py'],
+     'inputs': [PDF_DIR, PAGES_DIR], 'outputs': [SEARCH_DIR], 'default': False},
+    {'name': 'prerender_pages', 'command': ['prerender_pages.py'],
+     'inputs': [PDF_DIR], 'outputs': [PAGES_DIR], 'default': False},
+    {'name': 'site', 'command': ['site_render.py'],
+     'inputs': [CATALOG_FILE, PLACEHOLDERS_FILE, TEMPLATES_DIR, SEARCH_DIR, THUMB_DIR, PDF_DIR,
+                PAGES_DIR] + DERIVATIVE_DIRS,
+     'outputs': ['index.html']},
+    {'name': 'merge_data', 'command': ['merge_data.py'],
+     'inputs': [CATALOG_FILE, TEMPLATES_DIR], 'outputs': ['index_with_pdf.html']},
+    {'name': 'update_html_for_local', 'command': ['update_html_for_local.py'],
+     'inputs': [CATALOG_FILE], 'outputs': ['index_selenium.html'], 'optional': True},
+    {'name': 'fix_alt_links', 'command': ['fix_alt_links.py'],
+     'inputs': [CATALOG_FILE], 'outputs': ['index_alt.html'], 'optional': True},
+    {'name': 'assets', 'command': ['build_assets.py'],
+     'inputs': ['index.html', 'styles.css', 'styles_alt.css', 'site.js', os.path.join(TEMPLATES_DIR, 'sw.js'),
+                THUMB_DIR, 'covers_medium', SPRITES_DIR, SEARCH_DIR] + DERIVATIVE_DIRS,
+     'outputs': [DIST_DIR]},
+]
+
+def newest_mtime(path):
+    """Время изменения файла или самого нового файла в папке; None, если пути нет."""
+    if not os.path.exists(path):
+        return None
+    newest = os.stat(path).st_mtime
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            for name in files:
+                newest = max(newest, os.stat(os.path.join(root, name)).st_mtime)
+    return newest
+
+def load_state(filename=STATE_FILE):
+    """Время последнего успешного завершения каждой стадии."""
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_state(state, filename=STATE_FILE):
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+def build_graph(stages):
+    """Зависимости стадий: стадия зависит от тех, чьи выходы - ее входы."""
+    producers = {}
+    for stage in stages:
+        for output in stage['outputs']:
+            if output in producers:
+                raise ValueError(f"{output} пишут две стадии: {producers[output]} и {stage['name']}")
+            producers[output] = stage['name']
+    return {stage['name']: sorted({producers[path] for path in stage['inputs'] if path in producers})
+            for stage in stages}
+
+def select_stages(targets, graph):
+    """
+    Стадии для запуска: по умолчанию все, кроме тяжелых; для названных целей -
+    они и их зависимости, но тяжелые стадии подтягиваются, только если названы.
+    """
+    by_name = {stage['name']: stage for stage in STAGES}
+    unknown = [target for target in targets if target not in by_name]
+    if unknown:
+        raise SystemExit(f"Неизвестные стадии: {', '.join(unknown)}. Есть: {', '.join(by_name)}")
+    if not targets:
+        return {name for name, stage in by_name.items() if stage.get('default', True)}
+
+    selected = set()
+    stack = list(targets)
+    while stack:
+        name = stack.pop()
+        if name in selected:
+            continue
+        selected.add(name)
+        stack.extend(dep for dep in graph[name]
+                     if by_name[dep].get('default', True) or dep in targets)
+    return selected
+
+def stale_reason(stage, state, force=False, refresh=False):
+    """Почему стадию надо запустить, или None, если ее выходы актуальны."""
+    if force:
+        return "--force"
+    missing = [path for path in stage['outputs'] if not os.path.exists(path)]
+    if missing:
+        return f"нет {missing[0]}"
+    if stage.get('network') and refresh:
+        return "--refresh"
+
+    inputs = stage['inputs'] if stage.get('network') else stage['inputs'] + [stage['command'][0]]
+    newest_input = max((mtime for mtime in map(newest_mtime, inputs) if mtime is not None), default=0)
+    built = state.get(stage['name'])
+    if built is None:
+        # Стадия еще не запускалась через build.py - сравниваем с самими выходами
+        built = min(newest_mtime(path) for path in stage['outputs'])
+    if newest_input > built:
+        changed = max(inputs, key=lambda path: newest_mtime(path) or 0)
+        return f"изменился {changed}"
+    return None
+
+def nothing_to_fix(stage):
+    """Стадия-исправитель, которой нечего исправлять: страницы, которую она правит, нет."""
+    return stage.get('optional') and not all(os.path.exists(path) for path in stage['outputs'])
+
+def run_stage(stage):
+    """Запускает скрипт стадии, печатая его вывод с префиксом. Возвращает код завершения."""
+    command = [sys.executable, os.path.join(ROOT, stage['command'][0])] + stage['command'][1:]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, encoding='utf-8', errors='replace', bufsize=1)
+    for line in process.stdout:
+        print(f"[{stage['name']}] {line}", end='', flush=True)
+    return process.wait()
+
+def critical_path(order, graph, durations):
+    """Самая длинная по времени цепочка зависимых стадий: (стадии, суммарное время)."""
+    finish = {}
+    previous = {}
+    for name in order:
+        deps = [dep for dep in graph[name] if dep in finish]
+        before = max(deps, key=lambda dep: finish[dep], default=None)
+        finish[name] = durations.get(name, 0.0) + (finish[before] if before else 0.0)
+        previous[name] = before
+    if not finish:
+        return [], 0.0
+    name = max(finish, key=finish.get)
+    total = finish[name]
+    path = []
+    while name:
+        path.append(name)
+        name = previous[name]
+    return path[::-1], total
+
+def build(targets=(), jobs=None, force=False, refresh=False, dry_run=False):
+    """Запускает выбранные стадии в порядке зависимостей, независимые - параллельно."""
+    os.chdir(ROOT)
+    graph = build_graph(STAGES)
+    selected = select_stages(list(targets), graph)
+    stages = {stage['name']: stage for stage in STAGES if stage['name'] in selected}
+    # Зависимости внутри выбранных стадий; порядок STAGES топологический
+    deps = {name: [dep for dep in graph[name] if dep in stages] for name in stages}
+    order = list(stages)
+    state = load_state()
+
+    if dry_run:
+        for name in order:
+            reason = stale_reason(stages[name], state, force, refresh)
+            after = f" после {', '.join(deps[name])}" if deps[name] else ""
+            if nothing_to_fix(stages[name]):
+                status = 'пропущена: нечего исправлять'
+            else:
+                status = 'запуск: ' + reason if reason else 'актуальна'
+            print(f"{name:<22} {status}{after}")
+        return True
+
+    jobs = jobs or len(order)
+    results = {}
+    timings = {}
+    started = time.perf_counter()
+    pending = set(order)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for name in [name for name in order if name in pending]:
+                if any(dep not in results for dep in deps[name]):
+                    continue
+                pending.discard(name)
+                failed_deps = [dep for dep in deps[name] if results[dep] in ('ошибка', 'не запущена')]
+                if failed_deps:
+                    results[name] = 'не запущена'
+                    print(f"== {name}: не запущена, не собрана {failed_deps[0]}")
+                    continue
+                if nothing_to_fix(stages[name]):
+                    results[name] = 'пропущена'
+                    continue
+                # Если зависимость что-то пересобрала, ее выходы уже новее и причина найдется сама
+                reason = stale_reason(stages[name], state, force, refresh)
+                if reason is None:
+                    results[name] = 'актуальна'
+                    continue
+                print(f"== {name}: запуск ({reason})")
+                running[pool.submit(run_stage, stages[name])] = (name, time.perf_counter())
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, stage_started = running.pop(future)
+                finished = time.perf_counter()
+                timings[name] = (stage_started - started, finished - stage_started)
+                if future.result() == 0:
+                    results[name] = 'собрана'
+                    state[name] = time.time()
+                    save_state(state)
+                else:
+                    results[name] = 'ошибка'
+                print(f"== {name}: {results[name]} за {finished - stage_started:.1f} с")
+
+    wall = time.perf_counter() - started
+    print(f"\n{'стадия':<22} {'результат':<12} {'начало, с':>10} {'время, с':>9}")
+    for name in order:
+        start, duration = timings.get(name, (None, 0.0))
+        print(f"{name:<22} {results[name]:<12} {'' if start is None else f'{start:.1f}':>10} "
+              f"{duration:>9.1f}")
+
+    durations = {name: duration for name, (start, duration) in timings.items()}
+    path, path_time = critical_path(order, deps, durations)
+    total = sum(durations.values())
+    print(f"Общее время {wall:.1f} с, сумма стадий {total:.1f} с"
+          + (f" (параллельность x{total / wall:.1f})" if wall > 0 and total else ""))
+    if path_time:
+        print(f"Критический путь {path_time:.1f} с: " + " -> ".join(
+            f"{name} {durations.get(name, 0.0):.1f} с" for name in path))
+    return all(result in ('собрана', 'актуальна', 'пропущена') for result in results.values())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сборка сайта: стадии конвейера по графу зависимостей")
+    parser.add_argument('targets', nargs='*',
+                        help="стадии для сборки вместе с зависимостями (по умолчанию все, кроме работы с PDF)")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="сколько стадий запускать одновременно (по умолчанию без ограничения)")
+    parser.add_argument('--force', action='store_true', help="запустить стадии, даже если они актуальны")
+    parser.add_argument('--refresh', action='store_true',
+                        help="заново сходить в сеть: таблица, PDF и обложки из них")
+    parser.add_argument('--dry-run', action='store_true', help="только показать, что будет запущено")
+    args = parser.parse_args()
+    if not build(targets=args.targets, jobs=args.jobs, force=args.force, refresh=args.refresh,
+                 dry_run=args.dry_run):
+        raise SystemExit(1)
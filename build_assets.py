@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""Сборка сайта для деплоя в папку dist/.
+
+Страницы, стили и скрипты минифицируются. Стили и скрипты получают имена
+с хешем содержимого (assets/site.3f2a1b9c0d.js), и ссылки на них в страницах
+переписываются, поэтому их можно кешировать навсегда. Рядом с текстовыми
+файлами кладутся сжатые копии .gz и, если установлен brotli, .br.
+Обложки, спрайты и музыка попадают в dist/ жесткими ссылками, без копирования.
+
+В корень dist/ кладется service worker sw.js, собранный из templates/sw.js:
+в его начало дописываются версия сборки и манифест precache - страницы,
+ассеты, JSON каталога и самые мелкие обложки с хешами содержимого. С флагом
+--cache-pdfs он еще и кеширует открытые PDF для чтения без сети.
+"""
+import io
+import os
+import re
+import gzip
+import glob
+import shutil
+import hashlib
+import argparse
+import json
+from html_stream import StreamRewriter
+from process_images import WIDTHS, FORMATS, derivative_dir
+from sprites import SPRITES_DIR
+from catalog import SEARCH_DIR, DATA_DIR
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST_DIR = "dist"
+ASSETS_DIR = "assets"
+# Стили и скрипты, которые получают имена с хешем
+ASSETS = ['styles_alt.css', 'styles.css', 'site.js']
+# Страницы сайта: главная и страницы годов из site_render.py --shard
+PAGES = ['index.html', '[0-9][0-9][0-9][0-9].html']
+# Файлы и папки, которые раздаются как есть
+STATIC = (['covers', 'covers_medium', SPRITES_DIR, SEARCH_DIR, DATA_DIR, 'music', 'fav.jpeg', 'og.png', 'test.html']
+          + [derivative_dir(width) for width in WIDTHS])
+# Service worker: исходник и собранный файл в корне dist/, чтобы его область охватывала весь сайт
+SW_SOURCE = os.path.join("templates", "sw.js")
+SW_FILE = "sw.js"
+# Обложки в precache: самая мелкая ширина, по одному файлу на обложку в первом
+# из форматов, что есть, - в том же порядке, в каком их предлагает <picture>
+PRECACHE_WIDTH = WIDTHS[0]
+PRECACHE_FORMATS = ('avif', 'webp', 'jpeg')
+# Папки обложек, которые service worker кеширует по запросу: при их изменении меняется COVERS_VERSION
+COVER_DIRS = ['covers', 'covers_medium', SPRITES_DIR] + [derivative_dir(width) for width in WIDTHS]
+# Что имеет смысл сжимать: картинки и музыка уже сжаты
+COMPRESSIBLE = ('.html', '.css', '.js', '.json', '.svg', '.txt')
+
+def create_directory(dir_name):
+    """Создает директорию, если она не существует."""
+    if not os.path.exists(dir_name):
+        os.makedirs(dir_name)
+
+def minify_css(text):
+    """Убирает из CSS комментарии, переводы строк и лишние пробелы."""
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    # Пробел перед двоеточием не трогаем: в селекторе "a :hover" он значим
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+# После этих символов / начинает регулярное выражение, а не деление
+REGEX_PREFIX = set('(,=:[!&|?{};+-*%<>~^') | {''}
+WORD_RE = re.compile(r'[\w$]', re.UNICODE)
+
+def minify_js(text):
+    """
+    Убирает из JS комментарии и отступы, не трогая строки, шаблоны и регулярные выражения.
+    Переводы строк сохраняются, чтобы не сломать автоматическую расстановку точек с запятой.
+    """
+    out = []
+    i = 0
+    n = len(text)
+
+    def last():
+        return out[-1][-1] if out and out[-1] else ''
+
+    while i < n:
+        c = text[i]
+        if c in '\'"`':
+            # Строка или шаблон: копируем до закрывающей кавычки, учитывая экранирование
+            j = i + 1
+            while j < n and text[j] != c:
+                j += 2 if text[j] == '\\' else 1
+            out.append(text[i:j + 1])
+            i = j + 1
+        elif text.startswith('//', i):
+            i = text.find('\n', i)
+            i = n if i == -1 else i
+        elif text.startswith('/*', i):
+            i = text.find('*/', i + 2)
+            i = n if i == -1 else i + 2
+        elif c == '/' and last().strip() in REGEX_PREFIX:
+            # Регулярное выражение: / внутри [...] его не закрывает
+            j = i + 1
+            in_class = False
+            while j < n and (text[j] != '/' or in_class):
+                if text[j] == '\\':
+                    j += 1
+                elif text[j] == '[':
+                    in_class = True
+                elif text[j] == ']':
+                    in_class = False
+                j += 1
+            out.append(text[i:j + 1])
+            i = j + 1
+        elif c.isspace():
+            j = i
+            while j < n and text[j].isspace():
+                j += 1
+            prev, nxt = last(), text[j] if j < n else ''
+            if '\n' in text[i:j]:
+                if out and prev != '\n':
+                    out.append('\n')
+            elif (WORD_RE.match(prev) and WORD_RE.match(nxt)) or (prev in '+-' and prev == nxt):
+                out.append(' ')
+            i = j
+        else:
+            out.append(c)
+            i += 1
+    return ''.join(out).strip() + '\n'
+
+RAW_BLOCK_RE = re.compile(r'(<(script|style|pre|textarea)\b[^>]*>)(.*?)(</\2>)', re.S | re.I)
+
+def minify_html(text):
+    """
+    Сжимает пробелы между тегами и убирает комментарии. Любая серия пробелов
+    с переводом строки заменяется одним переводом строки: для браузера это
+    тот же один пробел, так что верстка не меняется. Встроенные стили
+    и скрипты минифицируются своими функциями, pre и textarea не трогаются.
+    """
+    parts = []
+    pos = 0
+    for match in RAW_BLOCK_RE.finditer(text):
+        parts.append(minify_html_text(text[pos:match.start()]))
+        open_tag, tag, body, close_tag = match.group(1), match.group(2).lower(), match.group(3), match.group(4)
+        if tag == 'style':
+            body = minify_css(body)
+        elif tag == 'script' and body.strip():
+            body = minify_js(body)
+        parts.append(open_tag + body + close_tag)
+        pos = match.end()
+    parts.append(minify_html_text(text[pos:]))
+    return ''.join(parts)
+
+def minify_html_text(text):
+    """Минификация участка HTML вне script, style, pre и textarea."""
+    text = re.sub(r'<!--(?!\[if).*?-->', '', text, flags=re.S)
+    return re.sub(r'[ \t\r]*\n\s*', '\n', text)
+
+def hashed_name(path, data):
+    """Имя файла с хешем содержимого: site.js -> site.3f2a1b9c0d.js."""
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+def write_if_changed(path, data):
+    """Записывает файл, только если содержимое изменилось. Возвращает True при записи."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    create_directory(os.path.dirname(path))
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
+
+def write_compressed(path, data, changed):
+    """Кладет рядом с файлом .gz и .br, если сжатие дает выигрыш. Возвращает пути копий."""
+    variants = [('.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda d: brotli.compress(d, quality=11)))
+    written = []
+    for suffix, compress in variants:
+        target = path + suffix
+        if changed or not os.path.exists(target):
+            compressed = compress(data)
+            if len(compressed) >= len(data):
+                continue
+            with open(target, 'wb') as f:
+                f.write(compressed)
+        written.append(target)
+    return written
+
+def link_file(source, target):
+    """Кладет файл в dist/ жесткой ссылкой, а если это невозможно - копией."""
+    if os.path.exists(target):
+        src_stat, dst_stat = os.stat(source), os.stat(target)
+        if os.path.samefile(source, target) or (
+                src_stat.st_size == dst_stat.st_size and src_stat.st_mtime_ns <= dst_stat.st_mtime_ns):
+            return
+        os.remove(target)
+    create_directory(os.path.dirname(target))
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+def iter_static(paths):
+    """Перечисляет файлы статики: сами файлы и содержимое папок."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                for name in files:
+                    if not name.startswith('.'):
+                        yield os.path.join(root, name)
+
+def revision(data):
+    """Ревизия файла для манифеста precache: хеш содержимого."""
+    return hashlib.sha256(data).hexdigest()[:10]
+
+def precache_covers(width=PRECACHE_WIDTH):
+    """Мелкие копии обложек для precache: по одному файлу на обложку."""
+    folder = derivative_dir(width)
+    if not os.path.isdir(folder):
+        return []
+    variants = {}
+    for name in os.listdir(folder):
+        stem, ext = os.path.splitext(name)
+        variants.setdefault(stem, set()).add(ext)
+    covers = []
+    for stem in sorted(variants):
+        for fmt in PRECACHE_FORMATS:
+            if FORMATS[fmt] in variants[stem]:
+                covers.append(os.path.join(folder, stem + FORMATS[fmt]))
+                break
+    return covers
+
+def service_worker(precache, covers_version, cache_pdfs):
+    """Собирает sw.js: версия, манифест precache и минифицированный templates/sw.js."""
+    with open(SW_SOURCE, 'r', encoding='utf-8') as f:
+        source = minify_js(f.read())
+    manifest = json.dumps(precache, ensure_ascii=False, separators=(',', ':'))
+    version = revision(f"{manifest}\n{covers_version}\n{cache_pdfs}\n{source}".encode('utf-8'))
+    return (f"const VERSION='{version}';\n"
+            f"const COVERS_VERSION='{covers_version}';\n"
+            f"const CACHE_PDFS={'true' if cache_pdfs else 'false'};\n"
+            f"const PRECACHE={manifest};\n" + source).encode('utf-8')
+
+def build_assets(dist_dir=DIST_DIR, clean=True, cache_pdfs=False):
+    """Собирает dist/: минифицирует и хеширует ассеты, переписывает ссылки в страницах, собирает sw.js."""
+    create_directory(dist_dir)
+    produced = set()
+    asset_map = {}
+    source_bytes = 0
+    dist_bytes = {'': 0, '.gz': 0, '.br': 0}
+
+    def emit(path, data):
+        changed = write_if_changed(path, data)
+        produced.add(path)
+        dist_bytes[''] += len(data)
+        for variant in write_compressed(path, data, changed):
+            produced.add(variant)
+            dist_bytes[variant[-3:]] += os.path.getsize(variant)
+
+    for asset in ASSETS:
+        if not os.path.exists(asset):
+            continue
+        with open(asset, 'r', encoding='utf-8') as f:
+            text = f.read()
+        source_bytes += len(text.encode('utf-8'))
+        minified = (minify_css(text) if asset.endswith('.css') else minify_js(text)).encode('utf-8')
+        name = f"{ASSETS_DIR}/{hashed_name(asset, minified)}"
+        asset_map[asset] = name
+        emit(os.path.join(dist_dir, name), minified)
+        print(f"  {asset} -> {name}")
+
+    def rewrite(tag, attrs):
+        attr = {'link': 'href', 'script': 'src'}.get(tag)
+        value = attrs.get(attr) if attr else None
+        if value and value.lstrip('./') in asset_map:
+            attrs[attr] = asset_map[value.lstrip('./')]
+            return attrs
+        return None
+
+    # Манифест precache: [путь, ревизия]; у ассетов хеш уже в имени
+    precache = [[name, ''] for name in asset_map.values()]
+    pages = sorted({page for pattern in PAGES for page in glob.glob(pattern)})
+    for page in pages:
+        with open(page, 'r', encoding='utf-8') as f:
+            text = f.read()
+        source_bytes += len(text.encode('utf-8'))
+        out = io.StringIO()
+        rewriter = StreamRewriter(out, rewrite)
+        rewriter.feed(minify_html(text))
+        rewriter.close()
+        data = out.getvalue().encode('utf-8')
+        emit(os.path.join(dist_dir, page), data)
+        precache.append([page, revision(data)])
+
+    static_count = 0
+    covers_state = hashlib.sha256()
+    for path in iter_static(STATIC):
+        target = os.path.join(dist_dir, path)
+        link_file(path, target)
+        produced.add(target)
+        static_count += 1
+        if path.split(os.sep)[0] in COVER_DIRS:
+            stat = os.stat(path)
+            covers_state.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+
+    precache_bytes = 0
+    for path in list(iter_static([DATA_DIR])) + precache_covers():
+        with open(path, 'rb') as f:
+            data = f.read()
+        precache.append([path.replace(os.sep, '/'), revision(data)])
+        precache_bytes += len(data)
+    if os.path.exists(SW_SOURCE):
+        emit(os.path.join(dist_dir, SW_FILE),
+             service_worker(precache, covers_state.hexdigest()[:10], cache_pdfs))
+        print(f"  {SW_SOURCE} -> {SW_FILE}: в precache {len(precache)} файлов "
+              f"(данные и обложки {precache_bytes / 1024:.0f} KB)"
+              + (", PDF кешируются после открытия" if cache_pdfs else ""))
+
+    if clean:
+        # Удаляем из dist/ все, что не собрано этим запуском: старые хешированные ассеты и страницы
+        for path in iter_static([dist_dir]):
+            if path not in produced:
+                os.remove(path)
+
+    print(f"Страниц: {len(pages)}, ассетов: {len(asset_map)}, статических файлов: {static_count}")
+    print(f"Текст: исходники {source_bytes / 1024:.0f} KB, минифицировано {dist_bytes[''] / 1024:.0f} KB, "
+          f"gzip {dist_bytes['.gz'] / 1024:.0f} KB"
+          + (f", brotli {dist_bytes['.br'] / 1024:.0f} KB" if brotli is not None else
+             " (brotli не установлен, .br не созданы)"))
+    return asset_map
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сборка сайта для деплоя в dist/")
+    parser.add_argument('--dist', default=DIST_DIR, help=f"папка сборки (по умолчанию {DIST_DIR})")
+    parser.add_argument('--no-clean', action='store_true', help="не удалять из dist/ файлы прошлых сборок")
+    parser.add_argument('--cache-pdfs', action='store_true',
+                        help="service worker кеширует открытые PDF, чтобы их можно было читать без сети")
+    args = parser.parse_args()
+    build_assets(dist_dir=args.dist, clean=not args.no_clean, cache_pdfs=args.cache_pdfs)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Манифест инкрементальной сборки.
+
+Для каждого результата стадии хранится ключ - хеш от всех входов:
+ссылки на источник, его ETag/Last-Modified или хеша содержимого и
+параметров обработки. Если ключ не изменился и результат лежит на диске,
+стадия пропускает элемент.
+"""
+import os
+import json
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+MANIFEST_FILE = ".build_manifest.json"
+
+def load_manifest(filename=MANIFEST_FILE):
+    """Загружает манифест сборки или возвращает пустой."""
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+@contextmanager
+def atomic_path(path, suffix='.tmp'):
+    """
+    Временный файл рядом с path: если блок завершился без ошибки, файл
+    подменяет path одним os.replace, иначе удаляется. Прерванная запись
+    не оставляет наполовину записанный path. Папка создается при необходимости.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    os.close(fd)
+    try:
+        yield tmp_path
+        # mkstemp создает файл только для владельца, а результаты сборки раздает веб-сервер
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+@contextmanager
+def atomic_write(path, mode='w', suffix='.tmp'):
+    """Открывает файл для атомарной записи в path, см. atomic_path. Текст пишется в UTF-8."""
+    with atomic_path(path, suffix) as tmp_path:
+        with open(tmp_path, mode, encoding=None if 'b' in mode else 'utf-8') as f:
+            yield f
+
+def save_manifest(manifest, filename=MANIFEST_FILE):
+    """Атомарно сохраняет манифест, чтобы прерванная сборка его не испортила."""
+    with atomic_write(filename) as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Возвращает SHA-256 содержимого файла."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def remote_fingerprint(session, url):
+    """Возвращает отпечаток удаленного файла по заголовкам HEAD-запроса.
+
+    Если сервер не отдает ни ETag, ни Last-Modified, возвращает None:
+    такой источник нельзя считать неизменным.
+    """
+    response = session.head(url, allow_redirects=True, timeout=30)
+    response.raise_for_status()
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if not (etag or last_modified):
+        return None
+    return {'etag': etag, 'last_modified': last_modified,
+            'length': response.headers.get('Content-Length')}
+
+def make_key(**inputs):
+    """Строит ключ элемента из его входов и параметров обработки."""
+    if any(value is None for value in inputs.values()):
+        return None
+    payload = json.dumps(inputs, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def is_fresh(manifest, stage, output_path, key):
+    """Проверяет, что результат уже собран из тех же входов."""
+    if key is None or not os.path.exists(output_path):
+        return False
+    return manifest.get(stage, {}).get(output_path) == key
+
+def record(manifest, stage, output_path, key):
+    """Запоминает ключ, из которого собран результат."""
+    if key is not None:
+        manifest.setdefault(stage, {})[output_path] = key
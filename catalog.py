@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""Единый каталог выпусков.
+
+Каталог собирается один раз из строк опубликованной таблицы (sheet_rows.json,
+их сохраняет selenium_extract.py) и links.csv и лежит в catalog.json: для
+каждого выпуска - id, дата, год, номер, ссылки на PDF и обложку, пути
+к обложкам всех размеров и их размеры в пикселях. Список выпусков задает
+таблица, links.csv добавляет к ним ссылки на PDF. Генераторы и скрипты-исправители
+берут данные отсюда, а не разбирают CSV и HTML каждый по-своему.
+
+catalog.json пишет только catalog.py (в build.py - стадия catalog), когда
+изменились строки таблицы или links.csv. Остальные скрипты его только читают,
+а если он устарел, собирают каталог в памяти. Сведения, которые зависят от
+файлов на диске - размеры обложек, производные изображения, локальные копии
+PDF и их страницы, - перечитываются при каждой загрузке: их пишут стадии
+после catalog, и каталог из-за них не пересобирается.
+"""
+import os
+import csv
+import json
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from PIL import Image
+import build_cache
+from process_images import WIDTHS, FORMATS, derivative_path
+
+CATALOG_FILE = "catalog.json"
+LINKS_FILE = "links.csv"
+# Строки опубликованной таблицы: дата, номер и ссылка на миниатюру (selenium_extract.py)
+SHEET_ROWS_FILE = "sheet_rows.json"
+# Обложки в полном размере (extract_covers.py) и миниатюры из таблицы (covers)
+BIG_DIR = "covers_big"
+THUMB_DIR = "covers"
+# Локальные копии PDF (mirror_pdfs.py) и их страницы в картинках (prerender_pages.py)
+PDF_DIR = "pdfs"
+PAGES_DIR = "pages"
+# Полнотекстовый индекс по PDF (search_index.py)
+SEARCH_DIR = "search"
+# Компактные данные каталога для виртуальной сетки (site_render.py --virtual)
+DATA_DIR = "data"
+
+def sanitize_number(number):
+    """Заменяет в номере выпуска символы, недопустимые в имени файла."""
+    return number.replace('/', '-').replace('\\', '-')
+
+def cover_filename(year, number, index):
+    """
+    Имя файла обложки. index - порядковый номер выпуска внутри года
+    при сортировке по дате; все стадии называют обложки только так.
+    """
+    return f"cover_{year}_{sanitize_number(number)}_{index}.jpg"
+
+def pdf_filename(year, index):
+    """Имя локальной копии PDF: год и порядковый номер выпуска внутри года."""
+    return f"issue_{year}_{index}.pdf"
+
+def image_size(path):
+    """Читает размеры изображения из заголовка файла или возвращает None."""
+    try:
+        with Image.open(path) as img:
+            return list(img.size)
+    except (FileNotFoundError, OSError):
+        return None
+
+def save_sheet_rows(sorted_data, filename=SHEET_ROWS_FILE):
+    """
+    Сохраняет строки таблицы (выпуски, сгруппированные по годам) для сборки
+    каталога. Файл переписывается, только если строки изменились.
+    """
+    rows = [{'date': item['date'], 'number': item['number'], 'image_url': item['image_url']}
+            for year in sorted(sorted_data) for item in sorted_data[year]]
+    text = json.dumps(rows, ensure_ascii=False, indent=1)
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            if f.read() == text:
+                return
+    except FileNotFoundError:
+        pass
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def load_sheet_rows(filename=SHEET_ROWS_FILE):
+    """Строки таблицы из sheet_rows.json или None, если таблицу еще не загружали."""
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def source_key(links_file=LINKS_FILE, sheet_file=SHEET_ROWS_FILE):
+    """Ключ входов каталога: содержимое CSV и строки таблицы."""
+    return build_cache.make_key(
+        links=build_cache.file_digest(links_file),
+        sheet=build_cache.file_digest(sheet_file) if os.path.exists(sheet_file) else '',
+    )
+
+def describe_covers(filename):
+    """Пути и размеры обложки во всех размерах, которые есть на диске."""
+    covers = {
+        'big': os.path.join(BIG_DIR, filename),
+        'thumb': os.path.join(THUMB_DIR, filename),
+    }
+    dimensions = {name: image_size(path) for name, path in covers.items()}
+
+    derivatives = {}
+    for width in WIDTHS:
+        size = image_size(derivative_path(width, filename, 'jpeg'))
+        if size is None:
+            continue
+        entry = {'size': size}
+        for fmt in FORMATS:
+            path = derivative_path(width, filename, fmt)
+            if os.path.exists(path):
+                entry[fmt] = path
+        derivatives[str(width)] = entry
+    return covers, {name: size for name, size in dimensions.items() if size}, derivatives
+
+def describe_files(issue):
+    """Заполняет поля выпуска, которые зависят от файлов на диске. Возвращает issue."""
+    covers, dimensions, derivatives = describe_covers(issue['filename'])
+    pages_manifest = os.path.join(PAGES_DIR, os.path.splitext(os.path.basename(issue['pdf_path']))[0],
+                                  'manifest.json')
+    issue.update({
+        # Копия появляется только после проверки контрольной суммы
+        'pdf_mirrored': os.path.exists(issue['pdf_path']),
+        'pages_manifest': pages_manifest if os.path.exists(pages_manifest) else None,
+        'covers': covers,
+        'dimensions': dimensions,
+        'derivatives': derivatives,
+    })
+    return issue
+
+def read_links(links_file=LINKS_FILE):
+    """Строки links.csv с датой и номером в порядке файла."""
+    rows = []
+    with open(links_file, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            date = (row.get('Дата') or '').strip()
+            number = (row.get('Выпуск') or '').strip()
+            if not (date and number):
+                print(f"Пропущена строка с неполными данными: {row}")
+                continue
+            rows.append({
+                'date': date,
+                'number': number,
+                'pdf_url': (row.get('Ссылка на выпуск') or '').strip(),
+                'cover_url': (row.get('Ссылка на обложку') or '').strip(),
+                'image_url': '',
+            })
+    return rows
+
+def merge_rows(sheet_rows, links):
+    """
+    Выпуски из таблицы со ссылками из links.csv: строки сопоставляются по дате
+    и номеру. Строки links.csv, которых нет в таблице, остаются в каталоге.
+    О несовпадениях печатается предупреждение со списком выпусков.
+    """
+    by_key = {(row['date'], row['number']): row for row in links}
+    rows, missing = [], []
+    for sheet_row in sheet_rows:
+        link = by_key.pop((sheet_row['date'], sheet_row['number']), None)
+        if link is None:
+            missing.append(sheet_row)
+            link = {'pdf_url': '', 'cover_url': ''}
+        rows.append({**link, **sheet_row})
+    if missing:
+        print(f"Предупреждение: {len(missing)} выпусков таблицы нет в links.csv, они будут без PDF:")
+        for row in missing:
+            print(f"  {row['date']} {row['number']}")
+    if by_key:
+        print(f"Предупреждение: {len(by_key)} выпусков из links.csv нет в таблице:")
+        for date, number in by_key:
+            print(f"  {date} {number}")
+    return rows + list(by_key.values())
+
+def build_catalog(links_file=LINKS_FILE, sheet_file=SHEET_ROWS_FILE):
+    """Собирает список выпусков из таблицы и CSV, отсортированный по дате."""
+    rows = read_links(links_file)
+    sheet_rows = load_sheet_rows(sheet_file)
+    if sheet_rows is not None:
+        rows = merge_rows(sheet_rows, rows)
+    by_year = defaultdict(list)
+    for row in rows:
+        by_year[str(datetime.strptime(row['date'], '%Y-%m-%d').year)].append(row)
+
+    issues = []
+    for year in sorted(by_year):
+        for i, row in enumerate(sorted(by_year[year], key=lambda x: x['date'])):
+            issues.append(describe_files({
+                'id': f"{row['date']}_{row['number']}",
+                'date': row['date'],
+                'year': year,
+                'number': row['number'],
+                'i': i,
+                'pdf_url': row['pdf_url'],
+                'cover_url': row['cover_url'],
+                # Миниатюра из таблицы; пусто, если выпуск есть только в links.csv
+                'image_url': row['image_url'],
+                'pdf_path': os.path.join(PDF_DIR, pdf_filename(year, i)),
+                'filename': cover_filename(year, row['number'], i),
+            }))
+    return issues
+
+class Catalog:
+    """Выпуски с индексами для поиска за O(1) по id, номеру, дате, году и ссылке на PDF."""
+
+    def __init__(self, issues):
+        self.issues = issues
+        self.by_id = {}
+        self.by_number = {}
+        self.by_date = {}
+        self.by_pdf_url = {}
+        self.by_year = defaultdict(list)
+        for issue in issues:
+            for index, key in ((self.by_id, 'id'), (self.by_number, 'number'),
+                               (self.by_date, 'date'), (self.by_pdf_url, 'pdf_url')):
+                if not issue[key]:
+                    continue
+                if issue[key] in index:
+                    print(f"Предупреждение: повторяется {key} {issue[key]}, оставлен первый выпуск")
+                    continue
+                index[issue[key]] = issue
+            self.by_year[issue['year']].append(issue)
+
+    def __iter__(self):
+        return iter(self.issues)
+
+    def __len__(self):
+        return len(self.issues)
+
+    def years(self):
+        """Годы по возрастанию."""
+        return sorted(self.by_year)
+
+def save_catalog(issues, key, filename=CATALOG_FILE):
+    """Атомарно сохраняет каталог вместе с ключом входов, из которых он собран."""
+    with build_cache.atomic_write(filename) as f:
+        json.dump({'key': key, 'issues': issues}, f, ensure_ascii=False, indent=1)
+
+def read_catalog(filename, key):
+    """Выпуски из catalog.json, если он собран из входов с ключом key, иначе None."""
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return stored['issues'] if stored.get('key') == key else None
+
+def load_catalog(filename=CATALOG_FILE, links_file=LINKS_FILE, sheet_file=SHEET_ROWS_FILE):
+    """
+    Загружает каталог, не изменяя catalog.json. Если он устарел или его нет,
+    каталог собирается в памяти. Сведения о файлах перечитываются с диска.
+    """
+    issues = read_catalog(filename, source_key(links_file, sheet_file))
+    if issues is None:
+        print(f"{filename} устарел или не собран, каталог собирается в памяти (сохраняет его catalog.py)")
+        return Catalog(build_catalog(links_file, sheet_file))
+    return Catalog([describe_files(issue) for issue in issues])
+
+def update_catalog(filename=CATALOG_FILE, links_file=LINKS_FILE, sheet_file=SHEET_ROWS_FILE, rebuild=False):
+    """Пересобирает catalog.json, если входы изменились с прошлой сборки или rebuild=True."""
+    key = source_key(links_file, sheet_file)
+    if not rebuild and read_catalog(filename, key) is not None:
+        print(f"Каталог {filename} актуален.")
+        return load_catalog(filename, links_file, sheet_file)
+    issues = build_catalog(links_file, sheet_file)
+    save_catalog(issues, key, filename)
+    print(f"Каталог {filename} собран: {len(issues)} выпусков.")
+    return Catalog(issues)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сборка каталога выпусков из таблицы и links.csv")
+    parser.add_argument('--force', action='store_true', help="пересобрать каталог, даже если входы не менялись")
+    args = parser.parse_args()
+    catalog = update_catalog(rebuild=args.force)
+    print(f"В каталоге {len(catalog)} выпусков за {len(catalog.years())} лет.")
@@ -1,15 +1,18 @@
 #!/usr/bin/env python3
 import requests
 import os
-import re
+import argparse
 from bs4 import BeautifulSoup
-from urllib.parse import urlparse
+from async_download import CONCURRENCY, download_all
+import tracing
 
 def extract_image_urls(url):
     """Извлекает все URL изображений из HTML страницы по указанному URL"""
     print(f"Загрузка HTML со страницы: {url}")
-    response = requests.get(url)
-    response.raise_for_status()
+    with tracing.span('fetch', url) as span:
+        response = requests.get(url)
+        response.raise_for_status()
+        span['bytes'] = len(response.content)
     soup = BeautifulSoup(response.text, 'html.parser')
 
     urls = []
@@ -21,32 +24,9 @@ def extract_image_urls(url):
 
     return urls
 
-def download_image(url, filename):
-    """Скачивает изображение по URL"""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-
-        with open(filename, 'wb') as f:
-            f.write(response.content)
-
-        print(f"Скачано: {filename}")
-        return True
-
-    except Exception as e:
-        print(f"Ошибка скачивания {url}: {e}")
-        return False
-
-def main():
+def main(jobs=CONCURRENCY, force=False):
     """Основная функция"""
-    # Создаем папку для изображений
     images_dir = 'covers'
-    if not os.path.exists(images_dir):
-        os.makedirs(images_dir)
 
     # URL для скачивания
     sheet_url = 'https://docs.google.com/spreadsheets/d/e/2PACX-1vT1R7dx12qHVZLlhM6Jm9sKo28_qVuMR1CLtU99woNx7LaqBp0UREiuQHSAZ-1oFgKzQXNQeKKy1Emy/pubhtml'
@@ -56,22 +36,17 @@ def main():
     image_urls = extract_image_urls(sheet_url)
     print(f"Найдено {len(image_urls)} изображений")
 
-    # Скачиваем изображения
-    downloaded = 0
-    for i, url in enumerate(image_urls):
-        # Создаем имя файла из URL
-        parsed = urlparse(url)
-        filename = os.path.join(images_dir, f"cover_{i+1}.jpg")
-
-        if download_image(url, filename):
-            downloaded += 1
-
-        # Небольшая пауза между запросами
-        import time
-        time.sleep(0.5)
-
-    print(f"Скачано {downloaded} из {len(image_urls)} изображений")
+    # Скачиваем изображения параллельно; неизменившиеся файлы не скачиваются заново
+    download_all([(url, os.path.join(images_dir, f"cover_{i+1}.jpg")) for i, url in enumerate(image_urls)],
+                 concurrency=jobs, force=force)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Скачивание обложек со страницы таблицы")
+    parser.add_argument('--jobs', type=int, default=CONCURRENCY,
+                        help=f"число одновременных загрузок (по умолчанию {CONCURRENCY})")
+    parser.add_argument('--force', action='store_true', help="скачать все обложки заново")
+    tracing.add_argument(parser)
+    args = parser.parse_args()
+    with tracing.session(args.trace):
+        main(jobs=max(1, args.jobs), force=args.force)
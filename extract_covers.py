@@ -1,9 +1,19 @@
 import os
-import csv
+import time
+import argparse
 import requests
+import functools
 import fitz  # PyMuPDF
-from collections import defaultdict
-from datetime import datetime
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from pdf_range import download_pdf
+import build_cache
+import tracing
+from catalog import BIG_DIR, load_catalog
+from process_images import (WIDTHS, FORMATS, SSIM_TARGET, create_directory, derivative_dir,
+                            derivative_path, variant_key, available_formats, make_placeholder,
+                            load_placeholders, save_placeholders, save_variants)
 
 def create_output_directory(dir_name="covers_big"):
     """Создает директорию, если она не существует."""
@@ -11,85 +21,259 @@ def create_output_directory(dir_name="covers_big"):
         os.makedirs(dir_name)
         print(f"Директория '{dir_name}' создана.")
 
-def load_links(filename="links.csv"):
-    """Загружает данные из CSV и группирует по годам."""
-    data_by_year = defaultdict(list)
+def iter_cover_tasks(catalog):
+    """Перечисляет выпуски в порядке обработки: (номер, ссылка на PDF, путь к обложке)."""
+    for issue in catalog:
+        if issue['pdf_url']:
+            yield issue['number'], issue['pdf_url'], issue['covers']['big']
+
+def create_session(pool_size):
+    """Создает HTTP-сессию с пулом соединений нужного размера."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def render_cover(pdf_path, output_path, dpi=300, strict=False):
+    """Рендерит первую страницу PDF в JPEG и возвращает время рендеринга.
+
+    Выполняется в отдельном процессе, поэтому принимает только сериализуемые аргументы.
+    При strict=True отказывается от файла, который PyMuPDF пришлось восстанавливать:
+    так выявляются частично скачанные PDF, которым не хватило объектов.
+    """
+    started = time.perf_counter()
+    item = os.path.basename(output_path)
+    with tracing.span('open', item, bytes=os.path.getsize(pdf_path)):
+        pdf_doc = fitz.open(pdf_path)
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                date_str = row.get('Дата')
-                if date_str:
-                    year = datetime.strptime(date_str, '%Y-%m-%d').year
-                    data_by_year[str(year)].append(row)
-        print(f"Загружены данные из {filename}.")
-    except FileNotFoundError:
-        print(f"Ошибка: Файл {filename} не найден.")
-        return None
-    return data_by_year
-
-def sanitize_filename(name):
-    """Очищает имя файла от недопустимых символов."""
-    return name.replace('/', '-').replace('\\', '-')
-
-def extract_covers():
-    """Основная функция для извлечения обложек."""
-    output_dir = "covers_big"
-    create_output_directory(output_dir)
-    data_by_year = load_links()
-
-    if not data_by_year:
-        return
-
-    total_links = sum(len(items) for items in data_by_year.values())
+        if strict and pdf_doc.is_repaired:
+            raise ValueError("частично скачанный PDF пришлось восстанавливать")
+        with tracing.span('render', item, dpi=dpi):
+            pix = pdf_doc.load_page(0).get_pixmap(dpi=dpi)
+        with tracing.span('encode', item, format='jpeg') as span:
+            data = pix.tobytes("jpeg")
+            span['bytes'] = len(data)
+        with tracing.span('write', item, bytes=len(data)):
+            with open(output_path, 'wb') as f:
+                f.write(data)
+    finally:
+        pdf_doc.close()
+    return time.perf_counter() - started
+
+def render_derivatives(pdf_path, filename, widths, formats, target=SSIM_TARGET,
+                       master_path=None, dpi=300, strict=False):
+    """Рендерит первую страницу PDF сразу в нужных ширинах и сжимает их.
+
+    Масштаб матрицы PyMuPDF считается под каждую ширину, поэтому растр
+    нужного размера получается прямо из PDF, в памяти, без промежуточного
+    JPEG и второго поколения сжатия. Мастер-копия в dpi точек на дюйм
+    пишется, только если задан master_path. Возвращает время рендеринга,
+    словарь {(ширина, формат): (размер, качество)} и заглушку для сетки.
+    """
+    started = time.perf_counter()
+    with tracing.span('open', filename, bytes=os.path.getsize(pdf_path)):
+        pdf_doc = fitz.open(pdf_path)
+    try:
+        if strict and pdf_doc.is_repaired:
+            raise ValueError("частично скачанный PDF пришлось восстанавливать")
+        first_page = pdf_doc.load_page(0)
+        sizes = {}
+        placeholder = None
+        for width in sorted(widths, reverse=True):
+            with tracing.span('render', filename, width=width):
+                zoom = width / first_page.rect.width
+                pix = first_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                img = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+            if placeholder is None:
+                placeholder = make_placeholder(img)
+            sizes.update(save_variants(img, width, filename, formats, target))
+        if master_path:
+            with tracing.span('render', filename, dpi=dpi):
+                pix = first_page.get_pixmap(dpi=dpi)
+            with tracing.span('encode', filename, format='jpeg') as span:
+                data = pix.tobytes("jpeg")
+                span['bytes'] = len(data)
+            with tracing.span('write', filename, bytes=len(data)):
+                with open(master_path, 'wb') as f:
+                    f.write(data)
+    finally:
+        pdf_doc.close()
+    return time.perf_counter() - started, sizes, placeholder
+
+def process_issue(session, render_pool, pdf_url, outputs, render, manifest, partial=False,
+                  force=False, **params):
+    """Скачивает выпуск и отдает его на рендеринг.
+
+    render вызывается в пуле процессов с путем к PDF и пишет файлы outputs.
+    Возвращает ключ сборки, время скачивания, результат render и число
+    скачанных байт, либо None, если все outputs уже собраны из того же PDF
+    с теми же параметрами params.
+    Поток ждет окончания рендеринга, поэтому на диске одновременно
+    находится не больше PDF, чем потоков скачивания. Если частично
+    скачанный PDF не удалось отрендерить, выпуск скачивается целиком.
+    """
+    item = os.path.basename(outputs[0])
+    with tracing.span('issue', item):
+        with tracing.span('check', item):
+            try:
+                fingerprint = build_cache.remote_fingerprint(session, pdf_url)
+            except requests.exceptions.RequestException:
+                # Кеш необязателен: если HEAD не прошел, выпуск просто собирается заново
+                fingerprint = None
+            key = build_cache.make_key(url=pdf_url, source=fingerprint, **params)
+            if not force and all(build_cache.is_fresh(manifest, 'extract_covers', path, key)
+                                 for path in outputs):
+                return None
+
+        started = time.perf_counter()
+        with tracing.span('fetch', item, partial=partial) as span:
+            pdf_path, transferred, is_partial = download_pdf(session, pdf_url, partial=partial)
+            span['bytes'] = transferred
+        try:
+            download_time = time.perf_counter() - started
+            try:
+                rendered = tracing.result(tracing.submit(render_pool, render, pdf_path, strict=is_partial))
+            except Exception:
+                if not is_partial:
+                    raise
+                os.remove(pdf_path)
+                pdf_path = None
+                started = time.perf_counter()
+                with tracing.span('fetch', item, partial=False) as span:
+                    pdf_path, full_size, _ = download_pdf(session, pdf_url, partial=False)
+                    span['bytes'] = full_size
+                download_time += time.perf_counter() - started
+                transferred += full_size
+                rendered = tracing.result(tracing.submit(render_pool, render, pdf_path))
+        finally:
+            if pdf_path:
+                os.remove(pdf_path)
+        return key, download_time, rendered, transferred
+
+def print_stage_timings(timings, wall_time, transferred):
+    """Печатает суммарное время по стадиям конвейера."""
+    print("\nВремя по стадиям:")
+    for stage, seconds in timings.items():
+        print(f"  {stage}: {seconds:.1f} с суммарно")
+    print(f"  Общее время: {wall_time:.1f} с")
+    print(f"  Скачано: {transferred / (1024 * 1024):.1f} MB")
+
+def extract_covers(jobs=8, partial=False, force=False, fused=False, keep_master=False,
+                   widths=WIDTHS, formats=tuple(FORMATS), target=SSIM_TARGET, dpi=300):
+    """Основная функция для извлечения обложек.
+
+    Скачивание идет в jobs потоков через общий пул соединений,
+    рендеринг - в пуле процессов по числу ядер. При partial=True из PDF
+    скачиваются только байты, нужные для первой страницы. Обложки, чьи PDF
+    не изменились с прошлой сборки, пропускаются, если не задан force.
+
+    При fused=True вместо обложки в covers_big/ сразу пишутся производные
+    изображения и заглушки process_images.py, а мастер-копия в covers_big/ -
+    только при keep_master=True.
+    """
+    catalog = load_catalog()
+    if fused:
+        formats = available_formats(formats)
+        for width in widths:
+            create_directory(derivative_dir(width))
+        placeholders = load_placeholders()
+    if keep_master or not fused:
+        create_output_directory(BIG_DIR)
+
+    tasks = list(iter_cover_tasks(catalog))
+    total_links = len(catalog)
+    render_jobs = min(jobs, os.cpu_count() or 1)
+    timings = {'Скачивание': 0.0, 'Рендеринг': 0.0}
+    manifest = build_cache.load_manifest()
+    transferred = 0
+    skipped_count = 0
     processed_count = 0
+    started = time.perf_counter()
 
-    print(f"Начинаю обработку {total_links} PDF-файлов...")
+    def issue_job(output_path):
+        """Файлы выпуска, функция рендеринга и параметры для ключа сборки."""
+        if not fused:
+            render = functools.partial(render_cover, output_path=output_path, dpi=dpi)
+            return [output_path], render, {'dpi': dpi}
+        filename = os.path.basename(output_path)
+        outputs = [derivative_path(width, filename, fmt) for width in widths for fmt in formats]
+        master_path = output_path if keep_master else None
+        if master_path:
+            outputs.append(master_path)
+        render = functools.partial(render_derivatives, filename=filename, widths=widths,
+                                   formats=formats, target=target, master_path=master_path, dpi=dpi)
+        return outputs, render, {'widths': sorted(widths), 'formats': list(formats), 'ssim': target,
+                                 'master': dpi if keep_master else 0}
 
-    for year in sorted(data_by_year.keys()):
-        # Сортируем выпуски по дате, чтобы индекс 'i' совпадал с предыдущей логикой
-        sorted_items = sorted(data_by_year[year], key=lambda x: x['Дата'])
-        
-        for i, row in enumerate(sorted_items):
-            issue_number = row.get('Выпуск')
-            pdf_url = row.get('Ссылка на выпуск')
-            
-            if not (issue_number and pdf_url):
-                continue
+    print(f"Начинаю обработку {total_links} PDF-файлов "
+          f"({jobs} потоков скачивания, {render_jobs} процессов рендеринга)...")
 
-            sanitized_number = sanitize_filename(issue_number)
-            new_filename = f"cover_{year}_{sanitized_number}_{i}.jpg"
-            output_path = os.path.join(output_dir, new_filename)
+    with create_session(jobs) as session, \
+            ProcessPoolExecutor(max_workers=render_jobs) as render_pool, \
+            ThreadPoolExecutor(max_workers=jobs) as download_pool:
+        futures = {}
+        for issue_number, pdf_url, output_path in tasks:
+            outputs, render, params = issue_job(output_path)
+            future = download_pool.submit(process_issue, session, render_pool, pdf_url, outputs,
+                                          render, manifest, partial, force, **params)
+            futures[future] = (issue_number, pdf_url, output_path, outputs)
 
+        for future in as_completed(futures):
+            issue_number, pdf_url, output_path, outputs = futures[future]
             processed_count += 1
-            print(f"({processed_count}/{total_links}) Обработка: {new_filename}")
 
             try:
-                # 1. Скачиваем PDF
-                response = requests.get(pdf_url, timeout=60)
-                response.raise_for_status()
-                pdf_bytes = response.content
-
-                # 2. Открываем PDF из памяти
-                pdf_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-                
-                # 3. Извлекаем первую страницу
-                first_page = pdf_doc.load_page(0)
-                
-                # 4. Конвертируем в изображение с высоким разрешением
-                pix = first_page.get_pixmap(dpi=300)
-                
-                # 5. Сохраняем как JPEG
-                pix.save(output_path, "jpeg")
-
-                pdf_doc.close()
-
+                result = future.result()
+                if result is None:
+                    skipped_count += 1
+                    print(f"({processed_count}/{total_links}) Без изменений: "
+                          f"{os.path.basename(output_path)}")
+                    continue
+                print(f"({processed_count}/{total_links}) Обработка: {os.path.basename(output_path)}")
+                key, download_time, rendered, size = result
+                if fused:
+                    filename = os.path.basename(output_path)
+                    render_time, sizes, placeholders[filename] = rendered
+                    if keep_master:
+                        # Производные уже собраны из мастер-копии: process_images.py их не тронет
+                        digest = build_cache.file_digest(output_path)
+                        for width, fmt in sizes:
+                            build_cache.record(manifest, 'process_images',
+                                               derivative_path(width, filename, fmt),
+                                               variant_key(digest, width, fmt, target))
+                else:
+                    render_time = rendered
+                for path in outputs:
+                    build_cache.record(manifest, 'extract_covers', path, key)
+                timings['Скачивание'] += download_time
+                timings['Рендеринг'] += render_time
+                transferred += size
             except requests.exceptions.RequestException as e:
                 print(f"  Ошибка скачивания {pdf_url}: {e}")
             except Exception as e:
                 print(f"  Ошибка обработки файла для {issue_number}: {e}")
 
-    print("Обработка завершена.")
+    if fused:
+        save_placeholders(placeholders)
+    build_cache.save_manifest(manifest)
+    print(f"Обработка завершена. Пропущено без изменений: {skipped_count}.")
+    print_stage_timings(timings, time.perf_counter() - started, transferred)
 
 if __name__ == "__main__":
-    extract_covers()
+    parser = argparse.ArgumentParser(description="Извлечение обложек из PDF-выпусков")
+    parser.add_argument('--jobs', type=int, default=8,
+                        help="число одновременных скачиваний (по умолчанию 8)")
+    parser.add_argument('--range', action='store_true',
+                        help="скачивать из PDF только первую страницу через HTTP Range")
+    parser.add_argument('--force', action='store_true',
+                        help="пересобрать все обложки, даже не изменившиеся")
+    parser.add_argument('--fused', action='store_true',
+                        help="рендерить сразу производные изображения для сайта, минуя covers_big/")
+    parser.add_argument('--keep-master', action='store_true',
+                        help="с --fused сохранять и обложку 300 dpi в covers_big/")
+    tracing.add_argument(parser)
+    args = parser.parse_args()
+    with tracing.session(args.trace):
+        extract_covers(jobs=max(1, args.jobs), partial=args.range, force=args.force,
+                       fused=args.fused, keep_master=args.keep_master)
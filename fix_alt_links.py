@@ -1,48 +1,34 @@
 #!/usr/bin/env python3
-import re
-from bs4 import BeautifulSoup
+from catalog import load_catalog
+from html_stream import rewrite_file
 
 def fix_pdf_links():
     """Заменяет ссылки target="_blank" на вызов функции openPdfModal"""
-    with open('index_alt.html', 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    soup = BeautifulSoup(content, 'html.parser')
-
-    # Находим все элементы a с target="_blank" и href на PDF
-    for a_tag in soup.find_all('a', href=True):
-        href = a_tag.get('href', '')
-        if 'target="_blank"' in str(a_tag) and href.endswith('.pdf'):
-            # Извлекаем номер журнала из alt текста изображения внутри ссылки
-            img_tag = a_tag.find('img')
-            if img_tag and img_tag.get('alt'):
-                alt_text = img_tag['alt']
-                # Извлекаем номер из alt текста (формат: "Обложка № 1 (1)")
-                match = re.search(r'№\s*([^"]+)', alt_text)
-                if match:
-                    issue_number = match.group(1).strip()
-                    # Находим номер журнала в cover-number элементе
-                    cover_info = a_tag.find_next_sibling('div', class_='cover-info')
-                    if cover_info:
-                        cover_number_elem = cover_info.find('div', class_='cover-number')
-                        cover_date_elem = cover_info.find('div', class_='cover-date')
-                        if cover_number_elem and cover_date_elem:
-                            full_number = cover_number_elem.get_text(strip=True)
-                            date = cover_date_elem.get_text(strip=True)
-                            info_text = f"{full_number} - {date}"
-
-                            # Заменяем href и target на onclick
-                            a_tag['href'] = '#'
-                            a_tag['onclick'] = f"openPdfModal('{href}', '{info_text}')"
-                            # Удаляем target="_blank"
-                            if 'target' in a_tag.attrs:
-                                del a_tag['target']
-
-                            print(f"Обновлено: {alt_text} -> onclick с PDF {href}")
-
-    # Сохраняем обновленный HTML
-    with open('index_alt.html', 'w', encoding='utf-8') as f:
-        f.write(str(soup))
+    # Номер и дату выпуска для каждой ссылки на PDF берем из каталога
+    catalog = load_catalog()
+
+    def rewrite(tag, attrs):
+        # Находим все элементы a с target="_blank" и href на PDF
+        if tag != 'a':
+            return None
+        href = attrs.get('href') or ''
+        if attrs.get('target') != '_blank' or not href.endswith('.pdf'):
+            return None
+        issue = catalog.by_pdf_url.get(href)
+        if issue is None:
+            return None
+        info_text = f"{issue['number']} - {issue['date']}"
+
+        # Заменяем href и target на onclick
+        attrs['href'] = '#'
+        attrs['onclick'] = f"openPdfModal('{href}', '{info_text}')"
+        # Удаляем target="_blank"
+        del attrs['target']
+
+        print(f"Обновлено: {info_text} -> onclick с PDF {href}")
+        return attrs
+
+    rewrite_file('index_alt.html', rewrite)
 
     print("Все ссылки обновлены")
 
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Потоковый разбор HTML без построения дерева документа.
+
+Парсер получает документ кусками (из файла или HTTP-ответа) и отдает
+найденные записи по мере чтения, не дожидаясь конца документа.
+Здесь же StreamRewriter - потоковая правка атрибутов тегов, которой
+пользуются скрипты, исправляющие уже сгенерированные страницы.
+"""
+from html import escape
+from html.parser import HTMLParser
+import build_cache
+
+CHUNK_SIZE = 64 * 1024
+
+class SheetRowParser(HTMLParser):
+    """
+    Собирает строки первой таблицы опубликованной Google-таблицы.
+    Каждая строка - список ячеек <td>, ячейка - (текст, src первой картинки).
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self.table_depth = 0
+        self.tables_seen = 0
+        self.row = None
+        self.cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            self.table_depth += 1
+            self.tables_seen += 1
+        if self.table_depth != 1 or self.tables_seen != 1:
+            return
+        if tag == 'tr':
+            self.row = []
+        elif tag == 'td' and self.row is not None:
+            self.cell = {'text': [], 'img': ''}
+        elif tag == 'img' and self.cell is not None and not self.cell['img']:
+            self.cell['img'] = dict(attrs).get('src') or ''
+
+    def handle_endtag(self, tag):
+        if tag == 'table':
+            self.table_depth -= 1
+        elif tag == 'td' and self.cell is not None:
+            self.row.append((''.join(self.cell['text']).strip(), self.cell['img']))
+            self.cell = None
+        elif tag == 'tr' and self.row is not None:
+            self.rows.append(self.row)
+            self.row = None
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell['text'].append(data)
+
+    def pop_rows(self):
+        """Возвращает накопленные строки и очищает буфер."""
+        rows, self.rows = self.rows, []
+        return rows
+
+def read_chunks(filename, chunk_size=CHUNK_SIZE):
+    """Читает текстовый файл кусками."""
+    with open(filename, 'r', encoding='utf-8') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            yield chunk
+
+def iter_sheet_rows(chunks):
+    """Отдает строки таблицы по мере разбора кусков документа."""
+    parser = SheetRowParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.pop_rows()
+    parser.close()
+    yield from parser.pop_rows()
+
+class CoverItemParser(HTMLParser):
+    """
+    Собирает записи из блоков <div class="cover-item"> сгенерированных страниц:
+    номер, дату, картинку и ссылку каждой обложки.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.items = []
+        self.item = None
+        self.div_depth = 0
+        self.field = None
+        self.field_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+        if self.item is None:
+            if tag == 'div' and 'cover-item' in classes:
+                self.item = {'number': '', 'date': '', 'image_url': '', 'alt': '',
+                             'href': '', 'target': '', 'onclick': ''}
+                self.div_depth = 1
+            return
+
+        if tag == 'div':
+            self.div_depth += 1
+            for name in ('number', 'date'):
+                if f'cover-{name}' in classes:
+                    self.field = name
+                    self.field_depth = self.div_depth
+        elif tag == 'img' and not self.item['image_url']:
+            self.item['image_url'] = attrs.get('src') or ''
+            self.item['alt'] = attrs.get('alt') or ''
+        elif tag == 'a' and not self.item['href']:
+            self.item['href'] = attrs.get('href') or ''
+            self.item['target'] = attrs.get('target') or ''
+            self.item['onclick'] = attrs.get('onclick') or ''
+
+    def handle_endtag(self, tag):
+        if self.item is None or tag != 'div':
+            return
+        if self.field and self.div_depth == self.field_depth:
+            self.item[self.field] = self.item[self.field].strip()
+            self.field = None
+        self.div_depth -= 1
+        if self.div_depth == 0:
+            self.items.append(self.item)
+            self.item = None
+
+    def handle_data(self, data):
+        if self.field:
+            self.item[self.field] += data
+
+    def pop_items(self):
+        """Возвращает накопленные записи и очищает буфер."""
+        items, self.items = self.items, []
+        return items
+
+def iter_cover_items(chunks):
+    """Отдает записи cover-item по мере разбора кусков документа."""
+    parser = CoverItemParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.pop_items()
+    parser.close()
+    yield from parser.pop_items()
+
+def quote_attr(value):
+    """Экранирует значение атрибута в двойных кавычках; апострофы остаются как есть."""
+    return escape(value, quote=False).replace('"', '&quot;')
+
+class StreamRewriter(HTMLParser):
+    """
+    Копирует документ в out как есть, кроме открывающих тегов, для которых
+    функция rewrite(tag, attrs) вернула новый словарь атрибутов.
+    Разметка, которую не трогали, сохраняется байт в байт.
+    """
+
+    def __init__(self, out, rewrite):
+        super().__init__(convert_charrefs=False)
+        self.out = out
+        self.rewrite = rewrite
+
+    def write_tag(self, tag, attrs, closing):
+        new_attrs = self.rewrite(tag, dict(attrs))
+        if new_attrs is None:
+            self.out.write(self.get_starttag_text())
+            return
+        parts = [tag] + [name if value is None else f'{name}="{quote_attr(value)}"'
+                         for name, value in new_attrs.items()]
+        self.out.write(f"<{' '.join(parts)}{' /' if closing else ''}>")
+
+    def handle_starttag(self, tag, attrs):
+        self.write_tag(tag, attrs, closing=False)
+
+    def handle_startendtag(self, tag, attrs):
+        self.write_tag(tag, attrs, closing=True)
+
+    def handle_endtag(self, tag):
+        self.out.write(f"</{tag}>")
+
+    def handle_data(self, data):
+        self.out.write(data)
+
+    def handle_entityref(self, name):
+        self.out.write(f"&{name};")
+
+    def handle_charref(self, name):
+        self.out.write(f"&#{name};")
+
+    def handle_comment(self, data):
+        self.out.write(f"<!--{data}-->")
+
+    def handle_decl(self, decl):
+        self.out.write(f"<!{decl}>")
+
+    def handle_pi(self, data):
+        self.out.write(f"<?{data}>")
+
+    def unknown_decl(self, data):
+        self.out.write(f"<![{data}]>")
+
+def rewrite_file(filename, rewrite, output=None):
+    """
+    Потоково правит теги в файле и атомарно заменяет результат.
+    По умолчанию файл перезаписывается на месте.
+    """
+    with build_cache.atomic_write(output or filename) as out:
+        rewriter = StreamRewriter(out, rewrite)
+        for chunk in read_chunks(filename):
+            rewriter.feed(chunk)
+        rewriter.close()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""Локальное зеркало PDF выпусков.
+
+Каждый PDF из каталога скачивается в pdfs/ через файл .part: прерванная
+загрузка продолжается с того же байта запросом Range (с If-Range, чтобы
+не склеить куски разных версий файла). Готовый файл сверяется с ETag
+(у S3 для обычной загрузки это MD5 содержимого) или хотя бы с длиной
+и только после этого переименовывается в итоговый. Контрольные суммы
+SHA-256 хранятся в pdfs/mirror.json, --verify перепроверяет их.
+
+Локальные PDF раздает server.py с поддержкой Range, поэтому pdf.js
+подгружает только нужные страницы.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import build_cache
+from catalog import PDF_DIR, load_catalog
+from extract_covers import create_output_directory, create_session
+
+MIRROR_FILE = os.path.join(PDF_DIR, "mirror.json")
+CHUNK_SIZE = 1024 * 1024
+# ETag S3 для загрузки одним куском - MD5 файла; у составных загрузок в нем есть дефис
+MD5_ETAG_RE = re.compile(r'^"?([0-9a-f]{32})"?$')
+
+class ChecksumError(Exception):
+    """Скачанный файл не совпал с ожидаемой длиной или контрольной суммой."""
+
+def load_mirror(filename=MIRROR_FILE):
+    """Загружает сведения о скачанных PDF."""
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_mirror(mirror, filename=MIRROR_FILE):
+    """Сохраняет сведения о скачанных PDF."""
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(mirror, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+def file_hashes(path):
+    """Возвращает MD5 и SHA-256 файла за одно чтение."""
+    md5 = hashlib.md5()
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            md5.update(chunk)
+            sha256.update(chunk)
+    return md5.hexdigest(), sha256.hexdigest()
+
+def download_resumable(session, url, part_path, validator=None, expected_size=None):
+    """
+    Докачивает url в part_path. Если часть файла уже есть, запрашивает остаток;
+    сервер, ответивший 200 вместо 206, отдает файл целиком, и он пишется заново.
+    expected_size - длина файла из HEAD-запроса, по ней проверяется ответ 416.
+    Возвращает (заголовки ответа, число скачанных байт, полный размер).
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {}
+    # Без ETag или Last-Modified нельзя убедиться, что файл на сервере тот же,
+    # поэтому такой файл скачивается заново целиком
+    if offset and validator:
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = validator
+
+    with session.get(url, headers=headers, stream=True, timeout=60) as response:
+        if response.status_code == 416 and offset:
+            # Часть уже содержит весь файл, только если ее длина равна длине файла;
+            # иначе часть битая (например, длиннее файла) и качается заново
+            match = re.match(r'bytes \*/(\d+)', response.headers.get('Content-Range', ''))
+            total = int(expected_size) if expected_size else (int(match.group(1)) if match else None)
+            if offset and total == offset:
+                return response.headers, 0, offset
+            os.remove(part_path)
+            return download_resumable(session, url, part_path, validator, expected_size)
+        response.raise_for_status()
+        if response.status_code == 206:
+            match = re.match(r'bytes (\d+)-\d+/(\d+)', response.headers.get('Content-Range', ''))
+            if not match or int(match.group(1)) != offset:
+                # Иначе следующий запуск пошлет тот же Range и снова упадет
+                os.remove(part_path)
+                raise ChecksumError("сервер вернул не тот диапазон")
+            total = int(match.group(2))
+            mode = 'ab'
+        else:
+            offset = 0
+            total = int(response.headers.get('Content-Length', 0)) or None
+            mode = 'wb'
+
+        transferred = 0
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                transferred += len(chunk)
+        return response.headers, transferred, total or offset + transferred
+
+def mirror_issue(session, issue, mirror, force=False):
+    """
+    Скачивает и проверяет один PDF. Возвращает запись для mirror.json
+    и число скачанных байт или None, если локальная копия актуальна.
+    """
+    path = issue['pdf_path']
+    part_path = path + '.part'
+    fingerprint = build_cache.remote_fingerprint(session, issue['pdf_url'])
+    entry = mirror.get(path)
+    if (not force and entry and os.path.exists(path) and fingerprint
+            and entry.get('url') == issue['pdf_url']
+            and entry.get('etag') == fingerprint['etag']
+            and entry.get('last_modified') == fingerprint['last_modified']):
+        return None
+
+    validator = fingerprint and (fingerprint['etag'] or fingerprint['last_modified'])
+    headers, transferred, total = download_resumable(session, issue['pdf_url'], part_path, validator,
+                                                     fingerprint and fingerprint['length'])
+
+    size = os.path.getsize(part_path)
+    md5, sha256 = file_hashes(part_path)
+    etag = headers.get('ETag') or (fingerprint and fingerprint['etag']) or ''
+    try:
+        if size != total:
+            raise ChecksumError(f"размер {size} вместо {total}")
+        match = MD5_ETAG_RE.match(etag)
+        if match and match.group(1) != md5:
+            raise ChecksumError(f"MD5 {md5} не совпадает с ETag {etag}")
+    except ChecksumError:
+        # Битую часть не докачиваем, в следующий раз файл скачается заново
+        os.remove(part_path)
+        raise
+    os.replace(part_path, path)
+
+    return {
+        'url': issue['pdf_url'],
+        'etag': fingerprint and fingerprint['etag'],
+        'last_modified': fingerprint and fingerprint['last_modified'],
+        'size': size,
+        'sha256': sha256,
+        'md5_verified': bool(match),
+    }, transferred
+
+def verify_mirror(mirror):
+    """Перепроверяет SHA-256 всех локальных копий. Возвращает список испорченных."""
+    broken = []
+    for path, entry in sorted(mirror.items()):
+        if not os.path.exists(path) or file_hashes(path)[1] != entry['sha256']:
+            broken.append(path)
+            print(f"  Не совпадает контрольная сумма: {path}")
+    print(f"Проверено {len(mirror)} файлов, испорчено {len(broken)}.")
+    return broken
+
+def mirror_pdfs(jobs=4, force=False, verify=False):
+    """Скачивает все PDF каталога в pdfs/ в jobs потоков."""
+    create_output_directory(PDF_DIR)
+    mirror = load_mirror()
+
+    if verify:
+        for path in verify_mirror(mirror):
+            # Испорченная копия удаляется и будет скачана заново
+            if os.path.exists(path):
+                os.remove(path)
+            del mirror[path]
+        save_mirror(mirror)
+
+    catalog = load_catalog()
+    issues = [issue for issue in catalog if issue['pdf_url']]
+    transferred = 0
+    downloaded = skipped = failed = 0
+    started = time.perf_counter()
+
+    print(f"Зеркалирую {len(issues)} PDF в {PDF_DIR} ({jobs} потоков)...")
+    with create_session(jobs) as session, ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(mirror_issue, session, issue, mirror, force): issue for issue in issues}
+        for i, future in enumerate(as_completed(futures)):
+            issue = futures[future]
+            try:
+                result = future.result()
+            except (requests.exceptions.RequestException, ChecksumError, OSError) as e:
+                failed += 1
+                print(f"({i+1}/{len(issues)}) Ошибка {issue['number']}: {e}")
+                continue
+            if result is None:
+                skipped += 1
+                continue
+            mirror[issue['pdf_path']], size = result
+            transferred += size
+            downloaded += 1
+            print(f"({i+1}/{len(issues)}) {issue['number']} -> {issue['pdf_path']} "
+                  f"({size / (1024 * 1024):.1f} MB)")
+            # Сохраняем по ходу, чтобы прерванный запуск не терял уже проверенные файлы
+            save_mirror(mirror)
+
+    save_mirror(mirror)
+    elapsed = time.perf_counter() - started
+    print(f"Готово: скачано {downloaded}, без изменений {skipped}, ошибок {failed}. "
+          f"{transferred / (1024 * 1024):.1f} MB за {elapsed:.1f} с")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальное зеркало PDF выпусков")
+    parser.add_argument('--jobs', type=int, default=4, help="число потоков скачивания (по умолчанию 4)")
+    parser.add_argument('--force', action='store_true', help="скачать все PDF заново")
+    parser.add_argument('--verify', action='store_true',
+                        help="перепроверить контрольные суммы и перекачать испорченные файлы")
+    args = parser.parse_args()
+    mirror_pdfs(jobs=args.jobs, force=args.force, verify=args.verify)
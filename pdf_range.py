@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""Загрузка из удаленного PDF только тех байтов, что нужны для первой страницы.
+
+Читаем хвост файла (startxref и трейлер), таблицы xref и затем объекты
+первой страницы с их ресурсами - все через HTTP Range-запросы. Прочитанные
+куски записываются в разреженный временный файл того же размера, который
+PyMuPDF открывает как обычный PDF. Если сервер не поддерживает Range или
+файл использует xref-потоки, PDF целиком скачивается потоком во временный файл.
+"""
+import os
+import re
+import bisect
+import tempfile
+import requests
+
+HEADER_SIZE = 1024
+TAIL_SIZE = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+# Диапазоны, между которыми меньше этого промежутка, скачиваются одним запросом
+MERGE_GAP = 16 * 1024
+
+REF_RE = re.compile(rb'(\d+)\s+(\d+)\s+R\b')
+# Ключи, по ссылкам из которых не нужно идти: они ведут к другим страницам
+# или к данным, не влияющим на растеризацию
+SKIP_KEYS_RE = re.compile(
+    rb'/(Parent|Annots|Thumb|B|PieceInfo|StructTreeRoot|Outlines|Names|Dests|'
+    rb'AcroForm|Threads|OpenAction|AA|Metadata)\s*(\d+\s+\d+\s+R|\[[^\]]*\])'
+)
+
+class RangeFetchError(Exception):
+    """Частичная загрузка невозможна, нужен полный файл."""
+
+class RemotePdf:
+    """Удаленный PDF, из которого скачиваются только запрошенные диапазоны."""
+
+    def __init__(self, session, url, size, tail_offset, tail):
+        self.session = session
+        self.url = url
+        self.size = size
+        self.chunks = [(tail_offset, tail)]
+        self.transferred = len(tail)
+
+    def find(self, start, end):
+        """Возвращает уже скачанные байты диапазона или None."""
+        for offset, data in self.chunks:
+            if offset <= start and end <= offset + len(data):
+                return data[start - offset:end - offset]
+        return None
+
+    def fetch(self, ranges):
+        """Скачивает недостающие диапазоны, объединяя близко лежащие."""
+        missing = sorted((max(0, s), min(self.size, e)) for s, e in ranges
+                         if self.find(max(0, s), min(self.size, e)) is None)
+        merged = []
+        for start, end in missing:
+            if merged and start - merged[-1][1] <= MERGE_GAP:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        for start, end in merged:
+            response = self.session.get(self.url, headers={'Range': f'bytes={start}-{end - 1}'},
+                                        timeout=60)
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise RangeFetchError("сервер перестал отвечать на Range-запросы")
+            self.chunks.append((start, response.content))
+            self.transferred += len(response.content)
+
+    def read(self, start, end):
+        """Читает диапазон [start, end), при необходимости скачивая его."""
+        end = min(end, self.size)
+        data = self.find(start, end)
+        if data is None:
+            self.fetch([(start, end)])
+            data = self.find(start, end)
+        return data
+
+    def write_sparse(self, path):
+        """Записывает скачанные куски в разреженный файл полного размера."""
+        with open(path, 'wb') as f:
+            f.truncate(self.size)
+            for offset, data in self.chunks:
+                f.seek(offset)
+                f.write(data)
+
+def read_line(pdf, pos):
+    """Читает непустую строку, начиная с pos, возвращает (строка, позиция после нее)."""
+    window = 256
+    while True:
+        data = pdf.read(pos, pos + window)
+        stripped = data.lstrip()
+        skipped = len(data) - len(stripped)
+        match = re.search(rb'[\r\n]', stripped)
+        if match or pos + window >= pdf.size:
+            end = match.start() if match else len(stripped)
+            line_end = pos + skipped + end
+            return stripped[:end].strip(), line_end
+        window *= 2
+
+def read_dict(pdf, pos):
+    """Читает словарь << ... >> с учетом вложенности, начиная с pos."""
+    window = 4096
+    while True:
+        data = pdf.read(pos, pos + window)
+        start = data.find(b'<<')
+        if start >= 0:
+            depth = 0
+            i = start
+            while i < len(data) - 1:
+                pair = data[i:i + 2]
+                if pair == b'<<':
+                    depth += 1
+                    i += 2
+                    continue
+                if pair == b'>>':
+                    depth -= 1
+                    i += 2
+                    if depth == 0:
+                        return data[start:i]
+                    continue
+                i += 1
+        if pos + window >= pdf.size:
+            raise RangeFetchError("не найден конец словаря")
+        window *= 2
+
+def read_xref_section(pdf, offset, offsets):
+    """Читает классическую секцию xref и возвращает словарь ее трейлера."""
+    keyword, pos = read_line(pdf, offset)
+    if not keyword.startswith(b'xref'):
+        raise RangeFetchError("файл использует xref-потоки")
+
+    while True:
+        line_start = pos
+        line, pos = read_line(pdf, pos)
+        if line.startswith(b'trailer'):
+            trailer = read_dict(pdf, line_start)
+            break
+        first, count = (int(value) for value in line.split()[:2])
+        # Каждая запись xref занимает ровно 20 байт, включая перевод строки
+        eol = pdf.read(pos, pos + 2)
+        pos += len(eol) - len(eol.lstrip(b'\r\n'))
+        table = pdf.read(pos, pos + count * 20)
+        for k in range(count):
+            fields = table[k * 20:(k + 1) * 20].split()
+            if len(fields) < 3:
+                raise RangeFetchError("поврежденная таблица xref")
+            # Более новые секции читаются первыми и имеют приоритет
+            offsets.setdefault(first + k, int(fields[0]) if fields[2] == b'n' else None)
+        pos += count * 20
+
+    if b'/XRefStm' in trailer:
+        raise RangeFetchError("гибридный файл с xref-потоком")
+    return trailer
+
+def dict_value(data, key):
+    """Возвращает номер объекта, на который ссылается ключ словаря, или None."""
+    match = re.search(rb'/' + key + rb'\s+(\d+)\s+\d+\s+R', data)
+    return int(match.group(1)) if match else None
+
+def collect_first_page(pdf, offsets, root):
+    """Скачивает каталог, цепочку дерева страниц и ресурсы первой страницы."""
+    boundaries = sorted(set(o for o in offsets.values() if o is not None) | {pdf.size})
+
+    def object_range(number):
+        start = offsets.get(number)
+        if start is None:
+            return None
+        return start, boundaries[bisect.bisect_right(boundaries, start)]
+
+    def load(numbers):
+        ranges = {n: object_range(n) for n in numbers}
+        pdf.fetch([r for r in ranges.values() if r])
+        # Ссылки ищем только в словаре, не в бинарных данных потока
+        return {n: pdf.read(*r).split(b'stream', 1)[0] for n, r in ranges.items() if r}
+
+    catalog = load([root]).get(root)
+    if catalog is None:
+        raise RangeFetchError("каталог документа не найден в xref")
+    queue = [n for n in (dict_value(catalog, b'Pages'), dict_value(catalog, b'OCProperties')) if n]
+    node = dict_value(catalog, b'Pages')
+    seen = {root}
+
+    # Спускаемся по дереву страниц по первому потомку до первой страницы
+    while node is not None:
+        body = load([node]).get(node)
+        if body is None:
+            raise RangeFetchError("узел дерева страниц не найден")
+        seen.add(node)
+        kids = re.search(rb'/Kids\s*\[([^\]]*)\]', body)
+        without_kids = body.replace(kids.group(0), b'') if kids else body
+        queue.extend(int(n) for n, _ in REF_RE.findall(SKIP_KEYS_RE.sub(b'', without_kids)))
+        first_kid = REF_RE.search(kids.group(1)) if kids else None
+        node = int(first_kid.group(1)) if first_kid else None
+
+    # Обходим в ширину все объекты, на которые ссылается первая страница
+    while queue:
+        level = [n for n in dict.fromkeys(queue) if n not in seen]
+        seen.update(level)
+        queue = []
+        for body in load(level).values():
+            queue.extend(int(n) for n, _ in REF_RE.findall(SKIP_KEYS_RE.sub(b'', body)))
+
+def open_remote(session, url):
+    """Запрашивает хвост файла; возвращает RemotePdf или полный ответ, если Range не поддерживается."""
+    response = session.get(url, headers={'Range': f'bytes=-{TAIL_SIZE}'}, stream=True, timeout=60)
+    response.raise_for_status()
+    if response.status_code != 206:
+        return response
+
+    content_range = response.headers.get('Content-Range', '')
+    match = re.match(r'bytes (\d+)-(\d+)/(\d+)', content_range)
+    if not match:
+        response.close()
+        raise RangeFetchError(f"неожиданный Content-Range: {content_range!r}")
+    tail = response.content
+    return RemotePdf(session, url, int(match.group(3)), int(match.group(1)), tail)
+
+def fetch_first_page(pdf):
+    """Скачивает заголовок, xref, трейлер и объекты первой страницы."""
+    # Без маркера версии в начале файла MuPDF считает файл поврежденным
+    pdf.fetch([(0, HEADER_SIZE)])
+    tail = pdf.read(max(0, pdf.size - 1024), pdf.size)
+    match = re.search(rb'startxref\s+(\d+)', tail)
+    if not match:
+        raise RangeFetchError("не найден startxref")
+
+    offsets = {}
+    trailers = []
+    xref_offset = int(match.group(1))
+    visited = set()
+    while xref_offset is not None and xref_offset not in visited:
+        visited.add(xref_offset)
+        trailer = read_xref_section(pdf, xref_offset, offsets)
+        trailers.append(trailer)
+        prev = re.search(rb'/Prev\s+(\d+)', trailer)
+        xref_offset = int(prev.group(1)) if prev else None
+
+    if any(b'/Encrypt' in trailer for trailer in trailers):
+        raise RangeFetchError("зашифрованный PDF")
+    root = next((dict_value(t, b'Root') for t in trailers if dict_value(t, b'Root')), None)
+    if root is None:
+        raise RangeFetchError("в трейлере нет /Root")
+    collect_first_page(pdf, offsets, root)
+
+def stream_to_tempfile(response, path):
+    """Потоково записывает тело ответа в файл и возвращает число байт."""
+    transferred = 0
+    with open(path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            f.write(chunk)
+            transferred += len(chunk)
+    return transferred
+
+def download_pdf(session, url, partial=True):
+    """Скачивает PDF во временный файл и возвращает (путь, число байт, частично ли).
+
+    При partial=True сначала пробует скачать только первую страницу. Вызывающий
+    код отвечает за удаление файла.
+    """
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    try:
+        if partial:
+            try:
+                remote = open_remote(session, url)
+                if isinstance(remote, RemotePdf):
+                    fetch_first_page(remote)
+                    remote.write_sparse(path)
+                    return path, remote.transferred, True
+                with remote:
+                    return path, stream_to_tempfile(remote, path), False
+            except RangeFetchError:
+                pass
+
+        with session.get(url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            return path, stream_to_tempfile(response, path), False
+    except BaseException:
+        os.remove(path)
+        raise
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 2:
+        print("Использование: python3 pdf_range.py <ссылка на PDF>")
+        sys.exit(1)
+
+    with requests.Session() as session:
+        path, transferred, partial = download_pdf(session, sys.argv[1])
+    mode = "частично" if partial else "полностью"
+    print(f"Скачано {transferred / 1024:.1f} KB ({mode}) в {path}")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Подготовка локальных PDF к быстрому просмотру.
+
+Каждый PDF из зеркала (mirror_pdfs.py) линеаризуется ("fast web view"):
+объекты первой страницы переносятся в начало файла, и pdf.js показывает ее,
+не дожидаясь остальных. Для этого нужен qpdf - PyMuPDF линеаризованные файлы
+писать не умеет; без qpdf шаг пропускается.
+
+Затем все страницы рендерятся в WebP-плитки 512x512 в нескольких масштабах:
+pages/issue_2001_0/2/3_0_1.webp - масштаб 2, страница 3, строка 0, столбец 1.
+Рядом лежит manifest.json с размерами страниц. Просмотрщик сразу показывает
+первую страницу картинками и листает их, а pdf.js загружает только для
+увеличения сильнее самого крупного подготовленного масштаба.
+"""
+import os
+import time
+import json
+import shutil
+import argparse
+import subprocess
+import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image
+import build_cache
+from catalog import PAGES_DIR, load_catalog
+from mirror_pdfs import load_mirror, save_mirror, file_hashes
+from process_images import create_directory, encode
+
+# Масштабы относительно 72 dpi: 1 - страница во весь экран, 2 - для retina и приближения
+ZOOMS = (1, 2)
+TILE_SIZE = 512
+PAGE_QUALITY = 80
+MANIFEST_NAME = "manifest.json"
+
+def pages_dir(issue):
+    """Папка с плитками выпуска: pages/issue_2001_0."""
+    return os.path.join(PAGES_DIR, os.path.splitext(os.path.basename(issue['pdf_path']))[0])
+
+def is_linearized(path):
+    """Линеаризованный PDF объявляет об этом в первом объекте файла."""
+    with open(path, 'rb') as f:
+        return b'/Linearized' in f.read(1024)
+
+def linearize(path, qpdf):
+    """Линеаризует PDF через qpdf на месте."""
+    with build_cache.atomic_path(path, suffix='.pdf') as tmp:
+        # Код 3 - qpdf исправил мелкие ошибки в файле и предупредил об этом
+        result = subprocess.run([qpdf, '--linearize', path, tmp], capture_output=True, text=True)
+        if result.returncode not in (0, 3):
+            raise RuntimeError(result.stderr.strip() or f"qpdf завершился с кодом {result.returncode}")
+
+def render_pages(pdf_path, output_dir, zooms, tile_size, quality):
+    """
+    Рендерит все страницы PDF в плитки WebP. Выполняется в отдельном процессе.
+    Возвращает размеры страниц для манифеста и общий размер плиток в байтах.
+    """
+    # Плитки прошлой версии могли остаться от страниц, которых больше нет
+    for zoom in zooms:
+        shutil.rmtree(os.path.join(output_dir, str(zoom)), ignore_errors=True)
+        os.makedirs(os.path.join(output_dir, str(zoom)))
+
+    pages = []
+    total = 0
+    pdf_doc = fitz.open(pdf_path)
+    try:
+        for number, page in enumerate(pdf_doc, 1):
+            entry = {'w': round(page.rect.width, 2), 'h': round(page.rect.height, 2), 'px': {}}
+            for zoom in zooms:
+                pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                img = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+                entry['px'][str(zoom)] = [pix.width, pix.height]
+                for top in range(0, pix.height, tile_size):
+                    for left in range(0, pix.width, tile_size):
+                        box = (left, top, min(left + tile_size, pix.width), min(top + tile_size, pix.height))
+                        data = encode(img.crop(box), 'webp', quality)
+                        name = f"{number}_{top // tile_size}_{left // tile_size}.webp"
+                        with open(os.path.join(output_dir, str(zoom), name), 'wb') as f:
+                            f.write(data)
+                        total += len(data)
+            pages.append(entry)
+    finally:
+        pdf_doc.close()
+    return pages, total
+
+def write_manifest(path, manifest):
+    """Записывает манифест атомарно: просмотрщик не увидит его наполовину записанным."""
+    with build_cache.atomic_write(path, suffix='.json') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+
+def prerender_pages(jobs=None, zooms=ZOOMS, tile_size=TILE_SIZE, quality=PAGE_QUALITY, force=False):
+    """
+    Линеаризует локальные PDF и рендерит их страницы в плитки. Рендеринг идет
+    в пуле процессов, по выпуску на процесс. Выпуски, чей PDF и параметры
+    не изменились с прошлой сборки, пропускаются, если не задан force.
+    """
+    create_directory(PAGES_DIR)
+    catalog = load_catalog()
+    mirror = load_mirror()
+    manifest = build_cache.load_manifest()
+    qpdf = shutil.which('qpdf')
+    zooms = sorted(set(zooms))
+
+    issues = [issue for issue in catalog if os.path.exists(issue['pdf_path'])]
+    if not issues:
+        print("Локальных PDF нет, сначала запустите mirror_pdfs.py")
+        return
+    if not qpdf:
+        print("qpdf не найден, PDF не линеаризуются (страницы все равно будут подготовлены)")
+
+    linearized = 0
+    pending = {}
+    for issue in issues:
+        path = issue['pdf_path']
+        if qpdf and not is_linearized(path):
+            try:
+                linearize(path, qpdf)
+            except (RuntimeError, OSError) as e:
+                print(f"  Не удалось линеаризовать {path}: {e}")
+            else:
+                linearized += 1
+                # Содержимое файла изменилось - обновляем контрольную сумму зеркала
+                if path in mirror:
+                    mirror[path]['size'] = os.path.getsize(path)
+                    mirror[path]['sha256'] = file_hashes(path)[1]
+                    mirror[path]['linearized'] = True
+
+        digest = mirror[path]['sha256'] if path in mirror else build_cache.file_digest(path)
+        key = build_cache.make_key(pdf=digest, zooms=zooms, tile=tile_size, quality=quality)
+        manifest_path = os.path.join(pages_dir(issue), MANIFEST_NAME)
+        if not force and build_cache.is_fresh(manifest, 'prerender_pages', manifest_path, key):
+            continue
+        pending[manifest_path] = (issue, key)
+
+    if linearized:
+        save_mirror(mirror)
+    print(f"Линеаризовано: {linearized}. Без изменений: {len(issues) - len(pending)}, "
+          f"к рендерингу: {len(pending)} (масштабы {', '.join(map(str, zooms))}, плитки {tile_size}px)")
+
+    started = time.perf_counter()
+    total_bytes = 0
+    total_pages = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(render_pages, issue['pdf_path'], pages_dir(issue), zooms, tile_size, quality):
+                manifest_path
+            for manifest_path, (issue, key) in pending.items()
+        }
+        for i, future in enumerate(as_completed(futures)):
+            manifest_path = futures[future]
+            issue, key = pending[manifest_path]
+            try:
+                pages, size = future.result()
+            except Exception as e:
+                print(f"  Ошибка рендеринга {issue['pdf_path']}: {e}")
+                continue
+            write_manifest(manifest_path, {
+                'pdf': issue['pdf_path'],
+                'zooms': zooms,
+                'tile': tile_size,
+                'path': '{zoom}/{page}_{row}_{col}.webp',
+                'pages': pages,
+            })
+            build_cache.record(manifest, 'prerender_pages', manifest_path, key)
+            total_bytes += size
+            total_pages += len(pages)
+            print(f"({i+1}/{len(pending)}) {issue['number']}: {len(pages)} стр., {size / (1024 * 1024):.1f} MB")
+
+    build_cache.save_manifest(manifest)
+    if pending:
+        # Новые манифесты лежат во вложенных папках и не меняют mtime pages/,
+        # по которому каталог узнает, что его пора пересобрать
+        os.utime(PAGES_DIR)
+    elapsed = time.perf_counter() - started
+    print(f"Готово: {total_pages} страниц, {total_bytes / (1024 * 1024):.1f} MB за {elapsed:.1f} с")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Линеаризация локальных PDF и рендеринг страниц в плитки")
+    parser.add_argument('--zooms', type=int, nargs='+', default=list(ZOOMS),
+                        help="масштабы относительно 72 dpi (по умолчанию 1 2)")
+    parser.add_argument('--tile', type=int, default=TILE_SIZE, help=f"размер плитки (по умолчанию {TILE_SIZE})")
+    parser.add_argument('--quality', type=int, default=PAGE_QUALITY,
+                        help=f"качество WebP (по умолчанию {PAGE_QUALITY})")
+    parser.add_argument('--jobs', type=int, default=None, help="число процессов (по умолчанию по числу ядер)")
+    parser.add_argument('--force', action='store_true', help="пересобрать все страницы")
+    args = parser.parse_args()
+    prerender_pages(jobs=args.jobs, zooms=args.zooms, tile_size=args.tile, quality=args.quality,
+                    force=args.force)
@@ -1,5 +1,34 @@
+import io
 import os
-from PIL import Image
+import json
+import base64
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image, ImageFilter, ImageMath
+import build_cache
+import tracing
+
+try:
+    import pillow_avif  # noqa: F401 - плагин AVIF для Pillow старше 11.2
+except ImportError:
+    pass
+
+# Ширины производных изображений для сетки и для srcset
+WIDTHS = (200, 400, 800)
+# Форматы производных изображений и расширения их файлов
+FORMATS = {'jpeg': '.jpg', 'webp': '.webp', 'avif': '.avif'}
+# Минимальное SSIM сжатого изображения относительно несжатого
+SSIM_TARGET = 0.98
+QUALITY_RANGE = (30, 95)
+# AVIF на обычной скорости кодируется медленно, поэтому качество ищется на
+# самой быстрой. Там SSIM при том же качестве ниже на 0.0015-0.003, и поиск
+# идет к цели, уменьшенной на AVIF_SEARCH_MARGIN
+AVIF_SEARCH_SPEED = 10
+AVIF_SEARCH_MARGIN = 0.002
+AVIF_STEP = 2
+# Крошечные размытые превью и основной цвет каждой обложки для сетки
+PLACEHOLDERS_FILE = "covers_placeholders.json"
+PLACEHOLDER_WIDTH = 16
 
 def create_directory(dir_name):
     """Создает директорию, если она не существует."""
@@ -7,42 +36,281 @@ def create_directory(dir_name):
         os.makedirs(dir_name)
         print(f"Директория '{dir_name}' создана.")
 
-def process_images(source_dir, target_dir, target_width=600, quality=85):
+def derivative_dir(width):
+    """Возвращает папку с производными изображениями заданной ширины."""
+    return f"covers_{width}w"
+
+def derivative_path(width, filename, fmt):
+    """Возвращает путь к производному изображению в заданном формате."""
+    base = os.path.splitext(filename)[0]
+    return os.path.join(derivative_dir(width), base + FORMATS[fmt])
+
+def variant_key(digest, width, fmt, target=SSIM_TARGET):
+    """Ключ сборки производного изображения из исходника с хешем digest."""
+    return build_cache.make_key(source=digest, width=width, format=fmt, ssim=target)
+
+def available_formats(formats):
+    """Оставляет только форматы, которые Pillow умеет записывать."""
+    Image.init()
+    supported = [fmt for fmt in formats if fmt.upper() in Image.SAVE]
+    for fmt in formats:
+        if fmt not in supported:
+            print(f"Формат {fmt} не поддерживается установленным Pillow и будет пропущен.")
+    return supported
+
+def ssim(reference, candidate, block=8):
+    """
+    Считает SSIM по яркости на неперекрывающихся блоках block x block.
+    Все вычисления выполняются внутри Pillow, без попиксельных циклов в Python.
+    """
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    x = reference.convert('L').convert('F')
+    y = candidate.convert('L').convert('F')
+
+    mx = x.reduce(block)
+    my = y.reduce(block)
+    xx = ImageMath.lambda_eval(lambda v: v['x'] * v['x'], x=x).reduce(block)
+    yy = ImageMath.lambda_eval(lambda v: v['y'] * v['y'], y=y).reduce(block)
+    xy = ImageMath.lambda_eval(lambda v: v['x'] * v['y'], x=x, y=y).reduce(block)
+    ssim_map = ImageMath.lambda_eval(
+        lambda v: ((2 * v['mx'] * v['my'] + c1) * (2 * (v['xy'] - v['mx'] * v['my']) + c2))
+        / ((v['mx'] * v['mx'] + v['my'] * v['my'] + c1)
+           * (v['xx'] - v['mx'] * v['mx'] + v['yy'] - v['my'] * v['my'] + c2)),
+        mx=mx, my=my, xx=xx, yy=yy, xy=xy,
+    )
+    # ImageStat для режима F считает по гистограмме, поэтому среднее берем через BOX
+    return ssim_map.resize((1, 1), Image.Resampling.BOX).getpixel((0, 0))
+
+def encode(img, fmt, quality, speed=None):
+    """Кодирует изображение в память и возвращает байты. speed - скорость кодировщика AVIF."""
+    buffer = io.BytesIO()
+    if fmt == 'jpeg':
+        img.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    elif fmt == 'avif' and speed is not None:
+        img.save(buffer, format="AVIF", quality=quality, speed=speed)
+    else:
+        img.save(buffer, format=fmt.upper(), quality=quality)
+    return buffer.getvalue()
+
+def meets_target(img, data, target):
+    """Проверяет, что SSIM закодированного изображения не ниже target."""
+    with Image.open(io.BytesIO(data)) as decoded:
+        return ssim(img, decoded) >= target
+
+def search_quality(img, fmt, target, low, high, speed=None):
+    """Бинарный поиск минимального качества в [low, high]: (байты, качество) или None."""
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        data = encode(img, fmt, quality, speed)
+        if meets_target(img, data, target):
+            best = (data, quality)
+            high = quality - 1
+        else:
+            low = quality + 1
+    return best
+
+def encode_to_target(img, fmt, target=SSIM_TARGET):
+    """
+    Бинарным поиском подбирает минимальное качество, при котором SSIM
+    не ниже target. Возвращает (байты, качество).
+    AVIF при поиске кодируется на скорости AVIF_SEARCH_SPEED, а найденное
+    качество - один раз на обычной. Если SSIM там не дотягивает до target,
+    качество поднимается на AVIF_STEP, пока не дотянет.
+    """
+    low, high = QUALITY_RANGE
+    if fmt == 'avif':
+        rough = search_quality(img, fmt, target - AVIF_SEARCH_MARGIN, low, high, AVIF_SEARCH_SPEED)
+        quality = rough[1] if rough else high
+        while True:
+            data = encode(img, fmt, quality)
+            if quality >= high or meets_target(img, data, target):
+                return data, quality
+            quality = min(high, quality + AVIF_STEP)
+    best = search_quality(img, fmt, target, low, high)
+    if best is None:
+        best = (encode(img, fmt, high), high)
+    return best
+
+def make_placeholder(img):
     """
-    Изменяет размер и сжимает изображения.
+    Строит заглушку для обложки: размытый WebP шириной 16px в виде data URI
+    и основной цвет, который виден и там, где WebP не поддерживается.
+    Занимает пару сотен байт - у JPEG такого размера одни таблицы больше.
     """
-    create_directory(target_dir)
-    
-    files = [f for f in os.listdir(source_dir) if f.endswith('.jpg')]
+    height = max(1, round(img.size[1] * PLACEHOLDER_WIDTH / img.size[0]))
+    tiny = img.resize((PLACEHOLDER_WIDTH, height), Image.Resampling.BOX)
+
+    buffer = io.BytesIO()
+    tiny.filter(ImageFilter.GaussianBlur(1)).save(buffer, format="WEBP", quality=40)
+    data_uri = "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+    # Основной цвет - самый частый цвет после квантования до 4 цветов
+    quantized = tiny.quantize(4)
+    count, index = max(quantized.getcolors())
+    r, g, b = quantized.getpalette()[index * 3:index * 3 + 3]
+    return {'lqip': data_uri, 'color': f"#{r:02x}{g:02x}{b:02x}"}
+
+def load_placeholders(filename=PLACEHOLDERS_FILE):
+    """Загружает заглушки обложек, собранные прошлыми запусками."""
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_placeholders(placeholders, filename=PLACEHOLDERS_FILE):
+    """Сохраняет заглушки обложек."""
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(placeholders, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+def save_variants(img, width, filename, formats, target=SSIM_TARGET):
+    """
+    Сжимает изображение ширины width во всех форматах и записывает файлы.
+    Возвращает словарь {(ширина, формат): (размер файла в байтах, качество)}.
+    """
+    sizes = {}
+    for fmt in formats:
+        with tracing.span('encode', filename, width=width, format=fmt) as span:
+            data, quality = encode_to_target(img, fmt, target)
+            span.update(bytes=len(data), quality=quality)
+        with tracing.span('write', filename, bytes=len(data)):
+            with open(derivative_path(width, filename, fmt), 'wb') as f:
+                f.write(data)
+        sizes[(width, fmt)] = (len(data), quality)
+    return sizes
+
+def make_derivatives(source_path, filename, widths, formats, target=SSIM_TARGET):
+    """
+    Декодирует исходник один раз и сохраняет его во всех ширинах и форматах.
+    Заглушка для сетки считается из того же декодированного изображения.
+    Возвращает словарь {(ширина, формат): (размер файла в байтах, качество)} и заглушку.
+    """
+    sizes = {}
+    with tracing.span('image', filename), Image.open(source_path) as img:
+        # Для JPEG draft декодирует сразу в уменьшенном масштабе (1/2, 1/4, 1/8),
+        # но не меньше самой большой из нужных ширин
+        largest = max(widths)
+        if largest < img.size[0]:
+            img.draft('RGB', (largest, round(img.size[1] * largest / img.size[0])))
+        with tracing.span('open', filename, bytes=os.path.getsize(source_path)):
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            img.load()
+        placeholder = make_placeholder(img)
+
+        for width in sorted(widths, reverse=True):
+            if width < img.size[0]:
+                # Изменение размера с сохранением пропорций; reducing_gap сначала
+                # быстро уменьшает картинку через reduce(), потом доводит LANCZOS
+                h_size = round(img.size[1] * width / img.size[0])
+                with tracing.span('resize', filename, width=width):
+                    resized = img.resize((width, h_size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            else:
+                # Исходник уже меньше нужной ширины - не увеличиваем
+                resized = img
+            sizes.update(save_variants(resized, width, filename, formats, target))
+    return sizes, placeholder
+
+def print_savings(source_bytes, variant_bytes, counts):
+    """Печатает суммарный размер каждого варианта и экономию относительно исходников."""
+    print("\nРазмер производных изображений:")
+    print(f"  исходники: {source_bytes / (1024 * 1024):.1f} MB")
+    for width, fmt in sorted(variant_bytes):
+        total = variant_bytes[(width, fmt)]
+        saved = 100 * (1 - total / source_bytes) if source_bytes else 0
+        print(f"  {width}w {fmt}: {total / (1024 * 1024):.1f} MB в {counts[(width, fmt)]} файлах "
+              f"(экономия {saved:.0f}%)")
+
+def process_images(source_dir, widths=WIDTHS, formats=tuple(FORMATS), target=SSIM_TARGET,
+                   jobs=None, force=False):
+    """
+    Изменяет размер и сжимает изображения во всех ширинах из widths и форматах из formats.
+    Качество каждого файла подбирается так, чтобы SSIM был не ниже target.
+    Файлы обрабатываются в пуле процессов, каждый исходник декодируется один раз.
+    Пропускает файлы, чей исходник и параметры не изменились с прошлой сборки.
+    """
+    for width in widths:
+        create_directory(derivative_dir(width))
+    formats = available_formats(formats)
+    manifest = build_cache.load_manifest()
+    placeholders = load_placeholders()
+
+    files = sorted(f for f in os.listdir(source_dir) if f.endswith('.jpg'))
     total_files = len(files)
-    
-    print(f"Начинаю обработку {total_files} изображений...")
+    variants = [(width, fmt) for width in widths for fmt in formats]
+    source_bytes = 0
+    variant_bytes = {variant: 0 for variant in variants}
+    counts = {variant: 0 for variant in variants}
+    pending = {}
+
+    print(f"Начинаю обработку {total_files} изображений в ширинах {', '.join(map(str, widths))} "
+          f"и форматах {', '.join(formats)}...")
 
-    for i, filename in enumerate(files):
+    for filename in files:
         source_path = os.path.join(source_dir, filename)
-        target_path = os.path.join(target_dir, filename)
-        
-        print(f"({i+1}/{total_files}) Обработка: {filename}", end="")
-
-        try:
-            with Image.open(source_path) as img:
-                if img.mode in ('CMYK', 'P'):
-                    img = img.convert('RGB')
-                
-                # Изменение размера с сохранением пропорций
-                w_percent = (target_width / float(img.size[0]))
-                h_size = int((float(img.size[1]) * float(w_percent)))
-                img = img.resize((target_width, h_size), Image.Resampling.LANCZOS)
-
-                img.save(target_path, format="JPEG", quality=quality, optimize=True)
-                
-                final_size_kb = os.path.getsize(target_path) / 1024
-                print(f" -> сохранено ({final_size_kb:.1f} KB)")
-
-        except Exception as e:
-            print(f"\n  Ошибка обработки {filename}: {e}")
-            
+        digest = build_cache.file_digest(source_path)
+        keys = {
+            (width, fmt): variant_key(digest, width, fmt, target)
+            for width, fmt in variants
+        }
+        if not force and filename in placeholders and all(
+            build_cache.is_fresh(manifest, 'process_images',
+                                 derivative_path(width, filename, fmt), key)
+            for (width, fmt), key in keys.items()
+        ):
+            continue
+        pending[filename] = (source_path, keys)
+
+    print(f"Без изменений: {total_files - len(pending)}, к обработке: {len(pending)}")
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            tracing.submit(pool, make_derivatives, source_path, filename, widths, formats, target): filename
+            for filename, (source_path, keys) in pending.items()
+        }
+        for i, future in enumerate(as_completed(futures)):
+            filename = futures[future]
+            source_path, keys = pending[filename]
+
+            try:
+                sizes, placeholders[filename] = tracing.result(future)
+            except Exception as e:
+                print(f"  Ошибка обработки {filename}: {e}")
+                continue
+
+            source_bytes += os.path.getsize(source_path)
+            for (width, fmt), (size, quality) in sizes.items():
+                variant_bytes[(width, fmt)] += size
+                counts[(width, fmt)] += 1
+                build_cache.record(manifest, 'process_images',
+                                   derivative_path(width, filename, fmt), keys[(width, fmt)])
+
+            sizes_kb = ', '.join(f"{w}w {fmt} {sizes[(w, fmt)][0] / 1024:.1f} KB q{sizes[(w, fmt)][1]}"
+                                 for w, fmt in sorted(sizes))
+            print(f"({i+1}/{len(pending)}) {filename} -> {sizes_kb}")
+
+    save_placeholders(placeholders)
+    build_cache.save_manifest(manifest)
     print("Обработка завершена.")
+    if pending:
+        print_savings(source_bytes, variant_bytes, counts)
 
 if __name__ == "__main__":
-    process_images(source_dir="covers_big", target_dir="covers_medium")
+    parser = argparse.ArgumentParser(description="Сжатие обложек для сайта")
+    parser.add_argument('--widths', type=int, nargs='+', default=list(WIDTHS),
+                        help="ширины производных изображений (по умолчанию 200 400 800)")
+    parser.add_argument('--formats', nargs='+', default=list(FORMATS), choices=list(FORMATS),
+                        help="форматы производных изображений (по умолчанию jpeg webp avif)")
+    parser.add_argument('--ssim', type=float, default=SSIM_TARGET,
+                        help=f"минимальный SSIM сжатого изображения (по умолчанию {SSIM_TARGET})")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="число процессов (по умолчанию по числу ядер)")
+    parser.add_argument('--force', action='store_true',
+                        help="пересобрать все изображения, даже не изменившиеся")
+    tracing.add_argument(parser)
+    args = parser.parse_args()
+    with tracing.session(args.trace):
+        process_images(source_dir="covers_big", widths=tuple(args.widths), formats=tuple(args.formats),
+                       target=args.ssim, jobs=args.jobs, force=args.force)
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""Полнотекстовый поиск по выпускам.
+
+Текст страниц извлекается из локальных PDF (mirror_pdfs.py) в пуле процессов.
+Слова приводятся к нижнему регистру, ё заменяется на е, русские слова
+сокращаются до основы стеммером Портера (Snowball): "ресторанами" и
+"ресторанов" дают одну основу "ресторан".
+
+Индекс - это статические файлы в search/: issues.json со списком выпусков
+и шарды по первым двум буквам основы, например search/444-438.json для "фи".
+Поиск на странице загружает только шарды слов из запроса; стоп-слова
+и таблицы окончаний стеммера он берет из issues.json.
+
+Словарь каждого выпуска кешируется в .search_cache/, поэтому при изменении
+одного PDF заново читается только он, а шарды пересобираются из кеша.
+"""
+import os
+import re
+import json
+import time
+import glob
+import argparse
+import fitz  # PyMuPDF
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import build_cache
+from build_assets import create_directory, write_if_changed
+from catalog import SEARCH_DIR, load_catalog
+from mirror_pdfs import load_mirror
+
+CACHE_DIR = ".search_cache"
+ISSUES_FILE = os.path.join(SEARCH_DIR, "issues.json")
+# Меняется при любой правке нормализации: старый кеш словарей становится недействителен
+INDEX_VERSION = 1
+MIN_WORD = 3
+WORD_RE = re.compile(r'[0-9a-zа-яё]+')
+STOP_WORDS = set('''
+    без более больше был была были было быть вам вас ваш вот все всех всего где для его
+    если есть еще же или им их как когда кто ли мне мы над нас не него нее нет ни них
+    но ну об однако она они оно от по под при про раз так там тем то тоже только том
+    тут уже чем что чтобы эта эти это этого этой этот
+    and are but for from has have not that the this was were with you
+'''.split())
+
+# Окончания стеммера Snowball для русского языка. True - окончание
+# снимается, только если перед ним стоит "а" или "я"
+VOWELS = set('аеиоуыэюя')
+PERFECTIVE_GERUND = dict.fromkeys(['в', 'вши', 'вшись'], True) | dict.fromkeys(
+    ['ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'], False)
+REFLEXIVE = dict.fromkeys(['ся', 'сь'], False)
+ADJECTIVE = dict.fromkeys(['ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым',
+                           'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'],
+                          False)
+PARTICIPLE = dict.fromkeys(['ем', 'нн', 'вш', 'ющ', 'щ'], True) | dict.fromkeys(['ивш', 'ывш', 'ующ'], False)
+VERB = dict.fromkeys(['ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны',
+                      'ть', 'ешь', 'нно'], True) | dict.fromkeys(
+    ['ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен',
+     'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'], False)
+NOUN = dict.fromkeys(['а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей',
+                      'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях',
+                      'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я'], False)
+SUPERLATIVE = dict.fromkeys(['ейш', 'ейше'], False)
+# Таблицы уходят в issues.json: поиск на странице нормализует запрос по ним же
+STEMMER_TABLES = {
+    'gerund': PERFECTIVE_GERUND, 'reflexive': REFLEXIVE, 'adjective': ADJECTIVE,
+    'participle': PARTICIPLE, 'verb': VERB, 'noun': NOUN, 'superlative': SUPERLATIVE,
+}
+
+def strip_ending(rv, endings):
+    """
+    Снимает самое длинное окончание из endings. Возвращает остаток
+    или None, если окончания нет или не выполнено условие на "а"/"я".
+    """
+    for length in range(min(len(rv), 6), 0, -1):
+        ending = rv[-length:]
+        if ending in endings:
+            if endings[ending] and not (len(rv) > length and rv[-length - 1] in 'ая'):
+                return None
+            return rv[:-length]
+    return None
+
+def region_start(word, start):
+    """Начало области R1 (или R2 от начала R1): после первой согласной, идущей за гласной."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+def stem(word):
+    """Основа русского слова по алгоритму Snowball. Остальные слова не меняются."""
+    rv_start = next((i + 1 for i, c in enumerate(word) if c in VOWELS), None)
+    if rv_start is None:
+        return word
+    r2 = region_start(word, region_start(word, 0))
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1: деепричастие, иначе возвратность и прилагательное, глагол или существительное
+    rest = strip_ending(rv, PERFECTIVE_GERUND)
+    if rest is None:
+        reflexive = strip_ending(rv, REFLEXIVE)
+        rv = rv if reflexive is None else reflexive
+        rest = strip_ending(rv, ADJECTIVE)
+        if rest is not None:
+            participle = strip_ending(rest, PARTICIPLE)
+            rest = rest if participle is None else participle
+        else:
+            rest = strip_ending(rv, VERB)
+            if rest is None:
+                rest = strip_ending(rv, NOUN)
+    if rest is not None:
+        rv = rest
+
+    # Шаг 2: конечное "и"
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательный суффикс в R2
+    for ending in ('ость', 'ост'):
+        if rv.endswith(ending):
+            if len(prefix) + len(rv) - len(ending) >= r2:
+                rv = rv[:-len(ending)]
+            break
+
+    # Шаг 4: двойное "н", превосходная степень, мягкий знак
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        rest = strip_ending(rv, SUPERLATIVE)
+        if rest is not None:
+            rv = rest[:-1] if rest.endswith('нн') else rest
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+def normalize(text):
+    """Основы слов текста: нижний регистр, ё -> е, без коротких и служебных слов."""
+    for word in WORD_RE.findall(text.lower().replace('ё', 'е')):
+        if len(word) < MIN_WORD or word in STOP_WORDS:
+            continue
+        term = stem(word)
+        # Шарды делятся по двум буквам, поэтому основа не бывает короче
+        yield term if len(term) >= 2 else word
+
+def shard_name(term):
+    """Имя шарда по первым двум буквам: коды символов в hex, чтобы имена файлов были ASCII."""
+    return '-'.join(f"{ord(c):x}" for c in term[:2])
+
+def extract_terms(pdf_path):
+    """
+    Извлекает текст всех страниц и строит словарь выпуска: основа -> номера страниц.
+    Выполняется в отдельном процессе. Возвращает (словарь, число страниц, время).
+    """
+    started = time.perf_counter()
+    terms = defaultdict(set)
+    pdf_doc = fitz.open(pdf_path)
+    try:
+        pages = len(pdf_doc)
+        for number, page in enumerate(pdf_doc, 1):
+            for term in normalize(page.get_text("text")):
+                terms[term].add(number)
+    finally:
+        pdf_doc.close()
+    return {term: sorted(pages) for term, pages in terms.items()}, pages, time.perf_counter() - started
+
+def cache_path(issue):
+    """Кеш словаря выпуска: .search_cache/issue_2001_0.json."""
+    return os.path.join(CACHE_DIR, os.path.splitext(os.path.basename(issue['pdf_path']))[0] + '.json')
+
+def dump(data):
+    """Компактный JSON для статических файлов индекса."""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+def write_index(catalog, indexed):
+    """
+    Собирает шарды из словарей выпусков. Файлы, содержимое которых не изменилось,
+    не переписываются, шарды исчезнувших основ удаляются. Возвращает (число шардов, байт).
+    """
+    issues = []
+    shards = defaultdict(lambda: defaultdict(list))
+    for issue in catalog:
+        terms = indexed.get(issue['id'])
+        if terms is None:
+            continue
+        position = len(issues)
+        issues.append({
+            'n': issue['number'],
+            'd': issue['date'],
+            'u': issue['pdf_url'],
+            'p': issue['pdf_path'],
+            'm': issue.get('pages_manifest'),
+        })
+        for term, pages in terms.items():
+            shards[shard_name(term)][term].append([position, pages])
+
+    create_directory(SEARCH_DIR)
+    produced = {ISSUES_FILE}
+    write_if_changed(ISSUES_FILE, dump({
+        'version': INDEX_VERSION,
+        'min': MIN_WORD,
+        'stop': sorted(STOP_WORDS),
+        'stemmer': STEMMER_TABLES,
+        'issues': issues,
+    }))
+    total = os.path.getsize(ISSUES_FILE)
+    for name, terms in shards.items():
+        path = os.path.join(SEARCH_DIR, f"{name}.json")
+        write_if_changed(path, dump(terms))
+        produced.add(path)
+        total += os.path.getsize(path)
+    for path in glob.glob(os.path.join(SEARCH_DIR, '*.json')):
+        if path not in produced:
+            os.remove(path)
+    return len(shards), total
+
+def search_index(jobs=None, force=False):
+    """
+    Строит индекс по всем локальным PDF. Текст извлекается в пуле процессов,
+    выпуски, чей PDF не изменился с прошлой сборки, берутся из кеша.
+    """
+    create_directory(CACHE_DIR)
+    catalog = load_catalog()
+    mirror = load_mirror()
+    manifest = build_cache.load_manifest()
+
+    issues = [issue for issue in catalog if os.path.exists(issue['pdf_path'])]
+    if not issues:
+        print("Локальных PDF нет, сначала запустите mirror_pdfs.py")
+        return
+
+    indexed = {}
+    pending = {}
+    for issue in issues:
+        path = issue['pdf_path']
+        digest = mirror[path]['sha256'] if path in mirror else build_cache.file_digest(path)
+        key = build_cache.make_key(pdf=digest, version=INDEX_VERSION)
+        cached = cache_path(issue)
+        if not force and build_cache.is_fresh(manifest, 'search_index', cached, key):
+            with open(cached, 'r', encoding='utf-8') as f:
+                indexed[issue['id']] = json.load(f)
+            continue
+        pending[cached] = (issue, key)
+
+    print(f"Выпусков с PDF: {len(issues)}, без изменений: {len(issues) - len(pending)}, "
+          f"к индексации: {len(pending)}")
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(extract_terms, issue['pdf_path']): cached
+                   for cached, (issue, key) in pending.items()}
+        for i, future in enumerate(as_completed(futures)):
+            cached = futures[future]
+            issue, key = pending[cached]
+            try:
+                terms, pages, elapsed = future.result()
+            except Exception as e:
+                print(f"  Ошибка чтения {issue['pdf_path']}: {e}")
+                continue
+            data = dump(terms)
+            with open(cached, 'wb') as f:
+                f.write(data)
+            build_cache.record(manifest, 'search_index', cached, key)
+            indexed[issue['id']] = terms
+            print(f"({i+1}/{len(pending)}) {issue['number']}: {pages} стр., {len(terms)} основ, "
+                  f"{len(data) / 1024:.1f} KB, {elapsed:.2f} с")
+
+    build_cache.save_manifest(manifest)
+    shard_count, size = write_index(catalog, indexed)
+    term_count = len({term for terms in indexed.values() for term in terms})
+    print(f"Индекс: {len(indexed)} выпусков, {term_count} основ, {shard_count} шардов, "
+          f"{size / 1024:.0f} KB ({size / 1024 / max(len(indexed), 1):.1f} KB на выпуск). "
+          f"Время: {time.perf_counter() - started:.1f} с")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Полнотекстовый индекс по PDF выпусков")
+    parser.add_argument('--jobs', type=int, default=None, help="число процессов (по умолчанию по числу ядер)")
+    parser.add_argument('--force', action='store_true', help="переиндексировать все выпуски")
+    args = parser.parse_args()
+    search_index(jobs=args.jobs, force=args.force)
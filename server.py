@@ -1,34 +1,225 @@
 #!/usr/bin/env python3
-import http.server
-import socketserver
-import webbrowser
 import os
+import re
+import argparse
+import webbrowser
+import http.server
+from functools import partial
+from email.utils import formatdate, parsedate_to_datetime
 
 PORT = 8000
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Сжатые копии, которые кладет рядом build_assets.py, в порядке предпочтения
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# Ассеты с хешем в имени (см. build_assets.py) не меняются никогда
+IMMUTABLE_RE = re.compile(r'^/(assets|data)/')
+# Service worker браузер должен перепроверять при каждой загрузке, иначе обновление сайта не дойдет
+NO_CACHE_RE = re.compile(r'^/sw\.js(\?|$)')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
 
 class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
-    def end_headers(self):
-        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-        self.send_header('Pragma', 'no-cache')
-        self.send_header('Expires', '0')
-        super().end_headers()
+    """
+    Раздает файлы с условными запросами (ETag, If-None-Match, If-Modified-Since),
+    сжатыми копиями .br/.gz по Accept-Encoding и запросами диапазонов (Range)
+    для PDF. В режиме dev кеширование отключено, как раньше.
+    """
+    protocol_version = "HTTP/1.1"
+    dev = False
+
+    def do_GET(self):
+        self.serve(head_only=False)
+
+    def do_HEAD(self):
+        self.serve(head_only=True)
+
+    def serve(self, head_only):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            index = os.path.join(path, 'index.html')
+            if not self.path.split('?', 1)[0].endswith('/') or not os.path.isfile(index):
+                # Редирект на путь со слешем и список файлов - как у стандартного сервера
+                f = self.send_head()
+                if f:
+                    try:
+                        if not head_only:
+                            self.copyfile(f, self.wfile)
+                    finally:
+                        f.close()
+                return
+            path = index
+        if not os.path.isfile(path):
+            self.send_error(404, "File not found")
+            return
+
+        ctype = self.guess_type(path)
+        range_header = self.headers.get('Range')
+        # Диапазоны отдаем только из несжатого файла, чтобы смещения совпадали с исходником
+        encoding, file_path = (None, path) if range_header else self.choose_encoding(path)
+        stat = os.stat(file_path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+        has_variants = any(os.path.exists(path + suffix) for _, suffix in ENCODINGS)
+
+        if self.not_modified(etag, stat.st_mtime):
+            self.send_response(304)
+            self.send_common_headers(etag, stat.st_mtime, has_variants)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start, end = 0, stat.st_size - 1
+        status = 200
+        if range_header and self.range_applies(etag, stat.st_mtime):
+            byte_range = self.parse_range(range_header, stat.st_size)
+            if byte_range is False:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{stat.st_size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if byte_range:
+                start, end = byte_range
+                status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', ctype)
+        self.send_common_headers(etag, stat.st_mtime, has_variants)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{stat.st_size}')
+        length = end - start + 1 if stat.st_size else 0
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+
+        if head_only or not length:
+            return
+        with open(file_path, 'rb') as f:
+            self.send_file(f, start, length)
+
+    def choose_encoding(self, path):
+        """Выбирает сжатую копию файла, которую принимает клиент."""
+        accepted = {}
+        for item in self.headers.get('Accept-Encoding', '').split(','):
+            name, _, params = item.strip().partition(';')
+            q = 1.0
+            match = re.search(r'q=([\d.]+)', params)
+            if match:
+                q = float(match.group(1))
+            accepted[name.strip().lower()] = q
+        for encoding, suffix in ENCODINGS:
+            if accepted.get(encoding, 0) > 0 and os.path.isfile(path + suffix):
+                return encoding, path + suffix
+        return None, path
+
+    def not_modified(self, etag, mtime):
+        """Проверяет If-None-Match, а без него - If-Modified-Since."""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags or f'W/{etag}' in tags
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def range_applies(self, etag, mtime):
+        """If-Range: диапазон отдается, только если файл не изменился."""
+        if_range = self.headers.get('If-Range')
+        if not if_range:
+            return True
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            return if_range == etag
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_range).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    @staticmethod
+    def parse_range(header, size):
+        """
+        Разбирает один диапазон bytes=начало-конец. Возвращает (начало, конец),
+        None, если заголовок надо проигнорировать (несколько диапазонов или ошибка),
+        и False, если диапазон за пределами файла.
+        """
+        match = RANGE_RE.match(header.strip())
+        if not match or not any(match.groups()):
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+        else:
+            # bytes=-N - последние N байт
+            start, end = max(0, size - int(last)), size - 1
+            if int(last) == 0:
+                return False
+        if start >= size:
+            return False
+        return start, end
+
+    def send_common_headers(self, etag, mtime, has_variants):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(mtime, usegmt=True))
+        self.send_header('Accept-Ranges', 'bytes')
+        if has_variants:
+            self.send_header('Vary', 'Accept-Encoding')
+        if self.dev:
+            self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
+            self.send_header('Pragma', 'no-cache')
+            self.send_header('Expires', '0')
+        elif NO_CACHE_RE.match(self.path):
+            self.send_header('Cache-Control', 'no-cache')
+        elif IMMUTABLE_RE.match(self.path):
+            self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
+        else:
+            self.send_header('Cache-Control', 'public, max-age=0, must-revalidate')
+
+    def send_file(self, f, start, length):
+        """Отдает кусок файла через sendfile, а если он недоступен - чтением по блокам."""
+        try:
+            self.connection.sendfile(f, start, length)
+            return
+        except (AttributeError, OSError, ValueError):
+            pass
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            self.wfile.write(chunk)
+            length -= len(chunk)
 
-def start_server():
+def start_server(port=PORT, root=ROOT, dev=False, open_browser=True):
     """Запуск локального веб-сервера"""
-    os.chdir('/Users/krasil/Documents/afisha_covers')
+    handler = partial(MyHTTPRequestHandler, directory=root)
+    MyHTTPRequestHandler.dev = dev
 
-    with socketserver.TCPServer(("", PORT), MyHTTPRequestHandler) as httpd:
-        print(f"Сервер запущен на порту {PORT}")
-        print(f"Откройте в браузере: http://localhost:{PORT}/index_selenium.html")
+    with http.server.ThreadingHTTPServer(("", port), handler) as httpd:
+        print(f"Сервер запущен на порту {port}, папка {root}" + (" (dev: без кеширования)" if dev else ""))
+        print(f"Откройте в браузере: http://localhost:{port}/index.html")
 
         # Автоматически открываем браузер
-        webbrowser.open(f'http://localhost:{PORT}/index_selenium.html')
+        if open_browser:
+            webbrowser.open(f'http://localhost:{port}/index.html')
 
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("\nСервер остановлен")
-            httpd.shutdown()
 
 if __name__ == "__main__":
-    start_server()
+    parser = argparse.ArgumentParser(description="Локальный веб-сервер для сайта")
+    parser.add_argument('--port', type=int, default=PORT, help=f"порт (по умолчанию {PORT})")
+    parser.add_argument('--root', default=ROOT,
+                        help="папка сайта (по умолчанию папка проекта; для собранного сайта - dist)")
+    parser.add_argument('--dev', action='store_true', help="отключить кеширование, как при разработке")
+    parser.add_argument('--no-browser', action='store_true', help="не открывать браузер")
+    args = parser.parse_args()
+    start_server(port=args.port, root=os.path.abspath(args.root), dev=args.dev,
+                 open_browser=not args.no_browser)
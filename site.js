@@ -0,0 +1,936 @@
+let pdfDoc = null, currentPage = 1, totalPages = 0, scale = 1.0, currentPdfUrl = '';
+// Страницы-картинки из prerender_pages.py: манифест выпуска и папка с его плитками
+let pagesManifest = null, pagesBase = '';
+// Во сколько раз можно растянуть самый крупный масштаб плиток, прежде чем переключиться на pdf.js
+const TILE_UPSCALE = 1.5;
+
+pdfjsLib.GlobalWorkerOptions.workerSrc = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.worker.min.js';
+
+function openPdfModal(pdfUrl, pagesUrl, page) {
+    if (!pdfUrl || pdfUrl === '#') return false;
+
+    currentPdfUrl = pdfUrl;
+    document.getElementById('pdfModal').style.display = 'block';
+    document.body.style.overflow = 'hidden';
+    currentPage = page || 1;
+    scale = 1.0;
+    document.getElementById('zoomInput').value = 100;
+    pagesManifest = null;
+
+    if (pagesUrl) {
+        loadPages(pagesUrl);
+    } else {
+        loadPDF(pdfUrl);
+    }
+    return false; // Предотвращаем открытие ссылки в новой вкладке
+}
+
+async function openPdfDocument(url) {
+    // Файл читается диапазонами по 64 KB и только по мере надобности:
+    // первая страница появляется, не дожидаясь загрузки всего PDF
+    const loadingTask = pdfjsLib.getDocument({
+        url,
+        disableAutoFetch: true,
+        disableStream: true,
+        rangeChunkSize: 65536,
+    });
+    pdfDoc = await loadingTask.promise;
+    totalPages = pdfDoc.numPages;
+}
+
+async function loadPDF(url) {
+    try {
+        document.getElementById('pdfLoading').style.display = 'flex';
+        await openPdfDocument(url);
+        setTimeout(() => { fitToScreen(); }, 100);
+        renderPage(currentPage);
+        updateNavigationButtons();
+    } catch (error) {
+        console.error('Ошибка загрузки PDF:', error);
+        document.getElementById('pdfLoading').innerHTML = 'Ошибка загрузки PDF файла';
+    }
+}
+
+async function loadPages(url) {
+    try {
+        document.getElementById('pdfLoading').style.display = 'flex';
+        const response = await fetch(url);
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        pagesManifest = await response.json();
+        pagesBase = url.slice(0, url.lastIndexOf('/') + 1);
+        totalPages = pagesManifest.pages.length;
+        fitToScreen();
+    } catch (error) {
+        // Без картинок страниц просто открываем PDF
+        console.error('Ошибка загрузки страниц:', error);
+        pagesManifest = null;
+        loadPDF(currentPdfUrl);
+    }
+}
+
+async function pageSize(pageNum) {
+    if (pagesManifest) return pagesManifest.pages[pageNum - 1];
+    const viewport = (await pdfDoc.getPage(pageNum)).getViewport({ scale: 1.0 });
+    return { w: viewport.width, h: viewport.height };
+}
+
+async function fitToScreen() {
+    const container = document.getElementById('pdfContainer');
+    const containerWidth = container.clientWidth - 20, containerHeight = container.clientHeight - 20;
+    if ((pdfDoc || pagesManifest) && containerWidth > 0) {
+        try {
+            const size = await pageSize(currentPage);
+            const scaleX = containerWidth / size.w;
+            const scaleY = containerHeight / size.h;
+            scale = Math.min(scaleX, scaleY, 3.0);
+            document.getElementById('zoomInput').value = Math.round(scale * 100);
+            renderPage(currentPage);
+        } catch (error) { console.error('Ошибка при подгонке по размеру:', error); }
+    }
+}
+
+// Наименьший подготовленный масштаб плиток, которого хватает для четкой картинки на этом экране
+function tileZoom() {
+    if (!pagesManifest) return null;
+    const needed = scale * (window.devicePixelRatio || 1);
+    const zooms = pagesManifest.zooms;
+    const zoom = zooms.find(z => z >= needed) || zooms[zooms.length - 1];
+    return zoom * TILE_UPSCALE >= needed ? zoom : null;
+}
+
+function tileUrl(pageNum, zoom, row, col) {
+    return pagesBase + pagesManifest.path
+        .replace('{zoom}', zoom).replace('{page}', pageNum)
+        .replace('{row}', row).replace('{col}', col);
+}
+
+function forEachTile(pageNum, zoom, callback) {
+    const tile = pagesManifest.tile;
+    const [width, height] = pagesManifest.pages[pageNum - 1].px[zoom];
+    for (let row = 0; row * tile < height; row++) {
+        for (let col = 0; col * tile < width; col++) {
+            callback(row, col, Math.min(tile, width - col * tile), Math.min(tile, height - row * tile));
+        }
+    }
+}
+
+function showPage(content) {
+    const container = document.getElementById('pdfContainer');
+    container.innerHTML = '';
+
+    const pageDiv = document.createElement('div');
+    pageDiv.className = 'pdf-page';
+    pageDiv.appendChild(content);
+
+    const pageInfo = document.createElement('div');
+    pageInfo.className = 'pdf-page-info';
+    pageInfo.textContent = `Страница ${currentPage} из ${totalPages}`;
+    pageDiv.appendChild(pageInfo);
+
+    container.appendChild(pageDiv);
+    updateNavigationButtons();
+}
+
+function renderTiles(pageNum, zoom) {
+    const page = pagesManifest.pages[pageNum - 1];
+    const tile = pagesManifest.tile;
+    // Плитки масштаба zoom ужимаются до размера страницы при текущем scale
+    const ratio = page.w * scale / page.px[zoom][0];
+    const tiles = document.createElement('div');
+    tiles.className = 'pdf-tiles';
+    tiles.style.width = `${page.w * scale}px`;
+    tiles.style.height = `${page.h * scale}px`;
+
+    forEachTile(pageNum, zoom, (row, col, width, height) => {
+        const img = document.createElement('img');
+        img.src = tileUrl(pageNum, zoom, row, col);
+        img.alt = '';
+        img.style.left = `${col * tile * ratio}px`;
+        img.style.top = `${row * tile * ratio}px`;
+        img.style.width = `${width * ratio}px`;
+        img.style.height = `${height * ratio}px`;
+        tiles.appendChild(img);
+    });
+
+    showPage(tiles);
+    document.getElementById('pdfLoading').style.display = 'none';
+
+    // Следующая страница загружается заранее, чтобы листание было мгновенным
+    if (pageNum < totalPages) {
+        forEachTile(pageNum + 1, zoom, (row, col) => { new Image().src = tileUrl(pageNum + 1, zoom, row, col); });
+    }
+}
+
+async function renderPage(pageNum) {
+    const zoom = tileZoom();
+    if (zoom) {
+        renderTiles(pageNum, zoom);
+        return;
+    }
+    try {
+        if (!pdfDoc) {
+            // Для такого увеличения картинок не хватает - подгружаем сам PDF
+            document.getElementById('pdfLoading').style.display = 'flex';
+            await openPdfDocument(currentPdfUrl);
+        }
+        const page = await pdfDoc.getPage(pageNum);
+        const viewport = page.getViewport({ scale });
+
+        const canvas = document.createElement('canvas');
+        canvas.className = 'pdf-canvas';
+        const context = canvas.getContext('2d');
+        canvas.height = viewport.height;
+        canvas.width = viewport.width;
+
+        await page.render({ canvasContext: context, viewport }).promise;
+        showPage(canvas);
+
+    } catch (error) {
+        console.error('Ошибка рендеринга страницы:', error);
+    } finally {
+        document.getElementById('pdfLoading').style.display = 'none';
+    }
+}
+
+function nextPage() {
+    if (currentPage < totalPages) {
+        currentPage++;
+        renderPage(currentPage);
+    }
+}
+
+function prevPage() {
+    if (currentPage > 1) {
+        currentPage--;
+        renderPage(currentPage);
+    }
+}
+
+function zoomIn() {
+    scale = Math.min(scale * 1.25, 3.0);
+    document.getElementById('zoomInput').value = Math.round(scale * 100);
+    renderPage(currentPage);
+}
+
+function zoomOut() {
+    scale = Math.max(scale / 1.25, 0.5);
+    document.getElementById('zoomInput').value = Math.round(scale * 100);
+    renderPage(currentPage);
+}
+
+function setZoom(value) {
+    scale = parseFloat(value) / 100;
+    renderPage(currentPage);
+}
+
+function fitToWidth() {
+    fitToScreen();
+}
+
+function updateNavigationButtons() {
+    const prevBtn = document.getElementById('prevPageBtn');
+    const nextBtn = document.getElementById('nextPageBtn');
+
+    if (prevBtn && nextBtn) {
+        prevBtn.disabled = currentPage <= 1;
+        nextBtn.disabled = currentPage >= totalPages;
+    }
+}
+
+function toggleFullscreen() {
+    const modal = document.getElementById('pdfModal');
+    if (modal.requestFullscreen) {
+        modal.requestFullscreen();
+    } else if (modal.webkitRequestFullscreen) {
+        modal.webkitRequestFullscreen();
+    } else if (modal.msRequestFullscreen) {
+        modal.msRequestFullscreen();
+    }
+}
+
+window.addEventListener('resize', () => {
+    if (document.getElementById('pdfModal').style.display === 'block' && (pdfDoc || pagesManifest)) {
+        setTimeout(() => { fitToScreen(); }, 100);
+    }
+});
+
+function closePdfModal() {
+    document.getElementById('pdfModal').style.display = 'none';
+    document.getElementById('pdfContainer').innerHTML = '';
+    pdfDoc = null;
+    pagesManifest = null;
+    document.body.style.overflow = 'auto';
+}
+
+window.onclick = (event) => {
+    if (event.target === document.getElementById('pdfModal')) {
+        closePdfModal();
+    }
+};
+
+document.addEventListener('keydown', (event) => {
+    if (event.key === 'Escape') closePdfModal();
+});
+
+// Поиск по текстам выпусков (search_index.py). Запрос нормализуется так же,
+// как при сборке индекса: стоп-слова и окончания стеммера лежат в issues.json.
+// Для каждого слова загружается только шард его первых двух букв
+(function() {
+    const box = document.querySelector('.search');
+    if (!box) return;
+    const input = box.querySelector('.search-input');
+    const results = box.querySelector('.search-results');
+    const base = box.dataset.index;
+    const local = box.dataset.local === '1';
+    const vowels = 'аеиоуыэюя';
+    const shards = new Map();
+    let index = null, timer = null, latest = 0;
+
+    function loadJson(url) {
+        return fetch(url).then(response => {
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            return response.json();
+        });
+    }
+
+    function loadShard(term) {
+        const name = Array.from(term.slice(0, 2)).map(c => c.codePointAt(0).toString(16)).join('-');
+        if (!shards.has(name)) shards.set(name, loadJson(`${base}${name}.json`).catch(() => ({})));
+        return shards.get(name);
+    }
+
+    function stripEnding(rv, endings) {
+        for (let length = Math.min(rv.length, 6); length > 0; length--) {
+            const ending = rv.slice(-length);
+            if (ending in endings) {
+                if (endings[ending] && !(rv.length > length && 'ая'.includes(rv[rv.length - length - 1]))) return null;
+                return rv.slice(0, -length);
+            }
+        }
+        return null;
+    }
+
+    function regionStart(word, start) {
+        for (let i = start + 1; i < word.length; i++) {
+            if (!vowels.includes(word[i]) && vowels.includes(word[i - 1])) return i + 1;
+        }
+        return word.length;
+    }
+
+    // Тот же алгоритм Snowball, что stem() в search_index.py
+    function stem(word, tables) {
+        const first = Array.from(word).findIndex(c => vowels.includes(c));
+        if (first < 0) return word;
+        const r2 = regionStart(word, regionStart(word, 0));
+        const prefix = word.slice(0, first + 1);
+        let rv = word.slice(first + 1);
+
+        let rest = stripEnding(rv, tables.gerund);
+        if (rest === null) {
+            const reflexive = stripEnding(rv, tables.reflexive);
+            if (reflexive !== null) rv = reflexive;
+            rest = stripEnding(rv, tables.adjective);
+            if (rest !== null) {
+                const participle = stripEnding(rest, tables.participle);
+                if (participle !== null) rest = participle;
+            } else {
+                rest = stripEnding(rv, tables.verb);
+                if (rest === null) rest = stripEnding(rv, tables.noun);
+            }
+        }
+        if (rest !== null) rv = rest;
+
+        if (rv.endsWith('и')) rv = rv.slice(0, -1);
+
+        for (const ending of ['ость', 'ост']) {
+            if (rv.endsWith(ending)) {
+                if (prefix.length + rv.length - ending.length >= r2) rv = rv.slice(0, -ending.length);
+                break;
+            }
+        }
+
+        if (rv.endsWith('нн')) {
+            rv = rv.slice(0, -1);
+        } else {
+            rest = stripEnding(rv, tables.superlative);
+            if (rest !== null) {
+                rv = rest.endsWith('нн') ? rest.slice(0, -1) : rest;
+            } else if (rv.endsWith('ь')) {
+                rv = rv.slice(0, -1);
+            }
+        }
+        return prefix + rv;
+    }
+
+    function queryTerms(text) {
+        const stop = new Set(index.stop);
+        const words = text.toLowerCase().replace(/ё/g, 'е').match(/[0-9a-zа-я]+/g) || [];
+        const terms = words.filter(word => word.length >= index.min && !stop.has(word)).map(word => {
+            const term = stem(word, index.stemmer);
+            return term.length >= 2 ? term : word;
+        });
+        return [...new Set(terms)];
+    }
+
+    // Выпуск подходит, если в нем есть все слова запроса; страницы совпадений объединяются
+    async function search(query) {
+        if (!index) index = await loadJson(`${base}issues.json`);
+        const terms = queryTerms(query);
+        if (!terms.length) return [];
+        const postings = await Promise.all(terms.map(async term => {
+            const shard = await loadShard(term);
+            if (shard[term]) return shard[term];
+            // Слово еще не допечатано - берем все основы, которые с него начинаются
+            return Object.keys(shard).filter(key => key.startsWith(term)).flatMap(key => shard[key]);
+        }));
+
+        let found = null;
+        for (const list of postings) {
+            const pages = new Map();
+            for (const [issue, issuePages] of list) {
+                if (found && !found.has(issue)) continue;
+                if (!pages.has(issue)) pages.set(issue, new Set(found ? found.get(issue) : []));
+                issuePages.forEach(page => pages.get(issue).add(page));
+            }
+            found = pages;
+        }
+        return [...found].sort((a, b) => b[1].size - a[1].size || index.issues[b[0]].d.localeCompare(index.issues[a[0]].d));
+    }
+
+    function showResults(found) {
+        results.innerHTML = '';
+        if (!found.length) {
+            results.textContent = 'Ничего не найдено';
+            return;
+        }
+        for (const [position, pageSet] of found.slice(0, 30)) {
+            const issue = index.issues[position];
+            const pages = [...pageSet].sort((a, b) => a - b);
+            const link = document.createElement('a');
+            link.href = local ? issue.p : issue.u;
+            link.textContent = `${issue.n} - ${issue.d}, стр. ${pages.slice(0, 10).join(', ')}${pages.length > 10 ? '…' : ''}`;
+            link.onclick = () => openPdfModal(link.getAttribute('href'), local ? issue.m : null, pages[0]);
+            results.appendChild(link);
+        }
+        if (found.length > 30) {
+            const more = document.createElement('div');
+            more.textContent = `И еще ${found.length - 30}`;
+            results.appendChild(more);
+        }
+    }
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(async () => {
+            const query = input.value.trim();
+            const request = ++latest;
+            if (!query) {
+                results.innerHTML = '';
+                return;
+            }
+            try {
+                const found = await search(query);
+                // Ответ на устаревший запрос не перерисовывает результаты нового
+                if (request === latest) showResults(found);
+            } catch (error) {
+                console.error('Ошибка поиска:', error);
+                if (request === latest) results.textContent = 'Поиск недоступен';
+            }
+        }, 200);
+    });
+})();
+
+// Hover preview для полноразмерных изображений
+(function() {
+    // Создаём элемент для preview
+    const preview = document.createElement('div');
+    preview.className = 'image-preview';
+    preview.innerHTML = '<img src="" alt="Preview">';
+    document.body.appendChild(preview);
+    
+    const previewImg = preview.querySelector('img');
+    
+    // Добавляем обработчики hover для изображений обложек внутри root;
+    // виртуальная сетка вызывает это для каждой новой строки
+    window.bindCoverPreview = root => root.querySelectorAll('.cover-image img').forEach(img => {
+        const coverImage = img.closest('.cover-image');
+        
+        coverImage.addEventListener('mouseenter', function(e) {
+            // Используем то же изображение из covers_medium, но в полном размере
+            previewImg.src = img.currentSrc || img.src;
+            preview.classList.add('active');
+        });
+        
+        coverImage.addEventListener('mousemove', function(e) {
+            // Позиционируем preview рядом с курсором
+            const offsetX = 20;
+            const offsetY = 20;
+            
+            // Получаем размеры preview после загрузки изображения
+            const previewRect = preview.getBoundingClientRect();
+            const previewWidth = previewRect.width || 0;
+            const previewHeight = previewRect.height || 0;
+            
+            let left = e.clientX + offsetX;
+            let top = e.clientY + offsetY;
+            
+            // Проверяем, не выходит ли preview за границы экрана справа
+            if (left + previewWidth > window.innerWidth) {
+                left = e.clientX - previewWidth - offsetX;
+            }
+            
+            // Проверяем, не выходит ли preview за границы экрана слева
+            if (left < 0) {
+                left = 10;
+            }
+            
+            // Проверяем, не выходит ли preview за границы экрана снизу
+            if (top + previewHeight > window.innerHeight) {
+                top = e.clientY - previewHeight - offsetY;
+            }
+            
+            // Проверяем, не выходит ли preview за границы экрана сверху
+            if (top < 0) {
+                top = 10;
+            }
+            
+            preview.style.left = left + 'px';
+            preview.style.top = top + 'px';
+        });
+        
+        coverImage.addEventListener('mouseleave', function() {
+            preview.classList.remove('active');
+        });
+    });
+    bindCoverPreview(document);
+})();
+
+// Виртуальная сетка (site_render.py --virtual): обложки рисуются из JSON каталога,
+// в DOM только строки рядом с видимой областью
+(function() {
+    const grid = document.querySelector('.vgrid');
+    if (!grid) return;
+    // Сколько пикселей сверху и снизу от экрана рисовать заранее
+    const OVERSCAN = 800;
+    const MIME = { '.avif': 'image/avif', '.webp': 'image/webp' };
+    const sizes = grid.dataset.sizes;
+    const defaultWidth = Number(grid.dataset.width);
+    const topSpacer = document.createElement('div');
+    const body = document.createElement('div');
+    const bottomSpacer = document.createElement('div');
+    grid.append(topSpacer, body, bottomSpacer);
+
+    let data = null;
+    // Строки: заголовок года {year} или обложки data.i[start..end)
+    let rows = [], heights = [], offsets = [0];
+    let columns = 0, columnWidth = 0, rowGap = 0, yearGap = 0;
+    // Оценки высоты еще не нарисованных строк уточняются по нарисованным
+    let headerHeight = 60, infoHeight = 60;
+    let shownFirst = 0, shownLast = -1, scheduled = false;
+
+    function escapeHtml(text) {
+        return String(text).replace(/[&<>"']/g, c => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' })[c]);
+    }
+
+    // Как quote из urllib: encodeURIComponent не кодирует !'()*
+    function encodePath(path) {
+        return path.split('/').map(part => encodeURIComponent(part)
+            .replace(/[!'()*]/g, c => '%' + c.charCodeAt(0).toString(16).toUpperCase())).join('/');
+    }
+
+    function derivative(item, width, ext) {
+        return data.r.replace('{w}', width) + '/' + item.f + ext;
+    }
+
+    function aspect(item) {
+        const entry = (item.w || []).find(w => w[0] === defaultWidth);
+        if (entry) return entry[2] / entry[1];
+        return item.s ? item.s[1] / item.s[0] : 1.41;
+    }
+
+    // Та же разметка, что cover_picture_html в site_render.py
+    function pictureHtml(item) {
+        const alt = escapeHtml('Обложка ' + item.n);
+        const srcsets = data.x.map((ext, bit) => {
+            const candidates = new Map();
+            (item.w || []).forEach(([width, realWidth, , mask]) => {
+                // Дескриптор - реальная ширина файла: маленькие исходники не увеличиваются
+                if (mask & (1 << bit) && !candidates.has(realWidth)) candidates.set(realWidth, derivative(item, width, ext));
+            });
+            return [...candidates].sort((a, b) => a[0] - b[0]).map(([w, path]) => encodePath(path) + ' ' + w + 'w').join(', ');
+        });
+        let sources = '';
+        ['.avif', '.webp'].forEach(ext => {
+            const srcset = srcsets[data.x.indexOf(ext)];
+            if (srcset) sources += `<source type="${MIME[ext]}" srcset="${srcset}" sizes="${sizes}">`;
+        });
+        const entry = (item.w || []).find(w => w[0] === defaultWidth);
+        const src = entry ? derivative(item, defaultWidth, data.x[0]) : item.t;
+        const size = entry ? [entry[1], entry[2]] : item.s;
+        const jpeg = srcsets[0];
+        let attrs = jpeg ? ` srcset="${jpeg}" sizes="${sizes}"` : '';
+        if (size) attrs += ` width="${size[0]}" height="${size[1]}"`;
+        if (item.c) attrs += ` style="background: ${item.c} url(data:image/webp;base64,${item.l || ''}) center / cover no-repeat"`;
+        return `<picture>${sources}<img src="${escapeHtml(src)}"${attrs} alt="${alt}" loading="lazy"></picture>`;
+    }
+
+    function itemHtml(index) {
+        const item = data.i[index];
+        const url = item.u ? data.b + item.u : '';
+        return `<div class="cover-item"><a href="${escapeHtml(url)}" target="_blank" data-i="${index}">` +
+            `<div class="cover-image">${pictureHtml(item)}</div></a>` +
+            `<div class="cover-info"><div class="cover-number">${escapeHtml(item.n)}</div>` +
+            `<div class="cover-date">${escapeHtml(item.d)}</div></div></div>`;
+    }
+
+    function rowHtml(index) {
+        const row = rows[index];
+        if (row.year) {
+            return `<div class="vgrid-year"><h2 class="year-title" id="y${row.year}">${row.year}</h2></div>`;
+        }
+        const items = [];
+        for (let i = row.start; i < row.end; i++) items.push(itemHtml(i));
+        return `<div class="covers-grid" style="margin-bottom: ${row.last ? yearGap : rowGap}px">${items.join('')}</div>`;
+    }
+
+    function estimate(row) {
+        if (row.year) return headerHeight;
+        let ratio = 0;
+        for (let i = row.start; i < row.end; i++) ratio = Math.max(ratio, aspect(data.i[i]));
+        return columnWidth * ratio + infoHeight + (row.last ? yearGap : rowGap);
+    }
+
+    function computeOffsets() {
+        offsets = [0];
+        heights.forEach(h => offsets.push(offsets[offsets.length - 1] + h));
+    }
+
+    // Колонки и отступы берутся из стилей страницы через пробную секцию
+    function measureGrid() {
+        const section = document.createElement('section');
+        section.className = 'year-section';
+        section.style.visibility = 'hidden';
+        section.innerHTML = '<div class="covers-grid"></div>';
+        grid.prepend(section);
+        const style = getComputedStyle(section.firstChild);
+        const tracks = style.gridTemplateColumns.split(' ').filter(Boolean).length || 1;
+        const gap = parseFloat(style.rowGap) || 0;
+        const columnGap = parseFloat(style.columnGap) || 0;
+        yearGap = parseFloat(getComputedStyle(section).marginBottom) || 0;
+        section.remove();
+        rowGap = gap;
+        columnWidth = (grid.clientWidth - columnGap * (tracks - 1)) / tracks;
+        return tracks;
+    }
+
+    function layout() {
+        const anchor = shownLast >= 0 ? firstVisibleItem() : null;
+        columns = measureGrid();
+        rows = [];
+        let start = 0;
+        data.y.forEach(([year, count]) => {
+            rows.push({ year });
+            for (let i = 0; i < count; i += columns) {
+                rows.push({ start: start + i, end: start + Math.min(i + columns, count), last: i + columns >= count });
+            }
+            start += count;
+        });
+        heights = rows.map(estimate);
+        computeOffsets();
+        body.textContent = '';
+        shownFirst = 0;
+        shownLast = -1;
+        if (anchor !== null) {
+            const index = rows.findIndex(row => !row.year && row.start <= anchor && anchor < row.end);
+            window.scrollTo(0, offsets[index] + grid.getBoundingClientRect().top + window.scrollY);
+        }
+    }
+
+    function firstVisibleItem() {
+        const row = rows[findRow(-grid.getBoundingClientRect().top)];
+        return row.year ? rows[Math.min(rows.indexOf(row) + 1, rows.length - 1)].start : row.start;
+    }
+
+    // Последняя строка, которая начинается не ниже y
+    function findRow(y) {
+        let low = 0, high = rows.length - 1;
+        while (low < high) {
+            const mid = (low + high + 1) >> 1;
+            if (offsets[mid] <= y) low = mid; else high = mid - 1;
+        }
+        return low;
+    }
+
+    function createRows(first, last) {
+        const template = document.createElement('template');
+        const html = [];
+        for (let i = first; i <= last; i++) html.push(rowHtml(i));
+        template.innerHTML = html.join('');
+        const nodes = [...template.content.children];
+        nodes.forEach(node => bindCoverPreview(node));
+        return nodes;
+    }
+
+    // Дорисовывает и убирает строки с краев, не трогая те, что уже на месте
+    function renderRange(first, last) {
+        if (first > shownLast || last < shownFirst) {
+            body.textContent = '';
+            shownFirst = first;
+            shownLast = first - 1;
+        }
+        while (shownFirst < first) { body.firstChild.remove(); shownFirst++; }
+        while (shownLast > last) { body.lastChild.remove(); shownLast--; }
+        if (first < shownFirst) body.prepend(...createRows(first, shownFirst - 1));
+        if (last > shownLast) body.append(...createRows(shownLast + 1, last));
+        shownFirst = first;
+        shownLast = last;
+    }
+
+    // Уточняет высоты нарисованных строк; true, если раскладка сдвинулась
+    function measureRows() {
+        let changed = false;
+        [...body.children].forEach((el, k) => {
+            const row = rows[shownFirst + k];
+            const height = el.offsetHeight + (parseFloat(el.style.marginBottom) || 0);
+            if (row.year) {
+                headerHeight = height;
+            } else {
+                let ratio = 0;
+                for (let i = row.start; i < row.end; i++) ratio = Math.max(ratio, aspect(data.i[i]));
+                infoHeight = height - columnWidth * ratio - (row.last ? yearGap : rowGap);
+            }
+            if (Math.abs(height - heights[shownFirst + k]) > 0.5) {
+                heights[shownFirst + k] = height;
+                changed = true;
+            }
+        });
+        if (changed) computeOffsets();
+        topSpacer.style.height = offsets[shownFirst] + 'px';
+        bottomSpacer.style.height = (offsets[rows.length] - offsets[shownLast + 1]) + 'px';
+        return changed;
+    }
+
+    function update() {
+        scheduled = false;
+        const top = -grid.getBoundingClientRect().top;
+        renderRange(findRow(top - OVERSCAN), findRow(top + window.innerHeight + OVERSCAN));
+        if (measureRows()) schedule();
+    }
+
+    function schedule() {
+        if (scheduled) return;
+        scheduled = true;
+        requestAnimationFrame(update);
+    }
+
+    grid.addEventListener('click', e => {
+        const link = e.target.closest('a[data-i]');
+        if (!link) return;
+        const item = data.i[link.dataset.i];
+        if (openPdfModal(link.getAttribute('href'), item.p) === false) e.preventDefault();
+    });
+
+    fetch(grid.dataset.src)
+        .then(response => response.json())
+        .then(json => {
+            data = json;
+            layout();
+            const year = /^#y(\d{4})$/.exec(location.hash);
+            const index = year ? rows.findIndex(row => row.year === year[1]) : -1;
+            if (index >= 0) window.scrollTo(0, offsets[index] + grid.getBoundingClientRect().top + window.scrollY);
+            update();
+            performance.mark('vgrid-ready');
+            window.addEventListener('scroll', schedule, { passive: true });
+            window.addEventListener('resize', () => {
+                if (measureGrid() !== columns) {
+                    layout();
+                } else {
+                    heights = rows.map(estimate);
+                    computeOffsets();
+                }
+                schedule();
+            });
+        })
+        .catch(() => { grid.textContent = 'Не удалось загрузить каталог обложек.'; });
+})();
+
+// Музыкальный плеер
+(function() {
+    const audio = new Audio();
+    let currentTrackIndex = 0;
+    let isPlaying = false;
+    let playlist = [];
+    let currentRotation = 0; // Отслеживаем текущий угол поворота диска
+    
+    // Список треков
+    const trackList = [
+        '01 Francoise Hardy-Comment Te Dire Adieu.mp3',
+        '02 Jeanette - Le Temps De Mon Pere.mp3',
+        '03 Nino Ferrer - Madame Robert.mp3',
+        '04 Dori Ghezzi - Casatschok.mp3',
+        '05 Claudine Longet - Como La Luna.mp3',
+        '06 Lolita - Calamita.mp3',
+        '07 The Fevers - Onde Estao Teus Olhos Negros.mp3',
+        '08 Penny Lee & The Silverstones - Kung See Kung See Let\'s Be Happy.mp3',
+        '09 Marie Laforet - Ivan, Boris Et Moi.mp3',
+        '10 Henry Buzz - The Rain Is Falling.mp3',
+        '11 Robert Mitchum - Jean And Dina.mp3',
+        '12 Eileen - Ces Bottes Sont Faites Pour Marcher.mp3',
+        '13 Naomi & The Boys - Bad Loser.mp3',
+        '14 Gianni Morandi - Il Giocattolo.mp3',
+        '15 Los Belkings - Okinawa.mp3',
+        '16 Lone Star - La PlaYA.mp3',
+        '17 Sergio Murilo E Snakes - Tu Seras.mp3',
+        '18 Patty Pravo - La Bambola.mp3',
+        '19 Leanette - Pourque Te Vas.mp3',
+        '20 Caterina Caselli - Il Carnevale.mp3',
+        '21 Francoise Hardy - Le Temps Da L\'amour.mp3',
+        '22 The Hormonauts- Hatuey.mp3',
+        '23 Lulu - The Man Who Sold The World.mp3',
+        '24 The Tempters - Stop The Music.mp3'
+    ];
+    
+    // Элементы интерфейса
+    const toggleMusicBtn = document.getElementById('toggleMusic');
+    const musicControls = document.getElementById('musicControls');
+    const playPauseBtn = document.getElementById('playPause');
+    const prevTrackBtn = document.getElementById('prevTrack');
+    const nextTrackBtn = document.getElementById('nextTrack');
+    const currentTrackSpan = document.getElementById('currentTrack');
+    
+    // Элементы диска
+    const discPlayer = document.getElementById('discPlayer');
+    const discImage = document.querySelector('.disc-image');
+    
+    // Обработчики событий
+    toggleMusicBtn.addEventListener('click', toggleMusicPlayer);
+    playPauseBtn.addEventListener('click', togglePlayPause);
+    prevTrackBtn.addEventListener('click', playPreviousTrack);
+    nextTrackBtn.addEventListener('click', playNextTrack);
+    
+    // Обработчики аудио
+    audio.addEventListener('ended', playNextTrack);
+    
+    function toggleMusicPlayer() {
+        if (musicControls.style.display === 'none') {
+            musicControls.style.display = 'flex';
+            toggleMusicBtn.querySelector('.music-text').textContent = 'Скрыть плеер';
+            discPlayer.classList.add('visible');
+            loadTrack(0);
+            // Автоматически запускаем воспроизведение
+            setTimeout(() => {
+                audio.play();
+                playPauseBtn.textContent = '⏸';
+                startDisc();
+                isPlaying = true;
+            }, 100);
+        } else {
+            musicControls.style.display = 'none';
+            toggleMusicBtn.querySelector('.music-text').textContent = 'Включить Afisha Hold Music';
+            discPlayer.classList.remove('visible');
+            stopDisc();
+            audio.pause();
+            isPlaying = false;
+            playPauseBtn.textContent = '▶';
+        }
+    }
+    
+    function loadTrack(index) {
+        if (index >= 0 && index < trackList.length) {
+            currentTrackIndex = index;
+            const trackName = trackList[index].replace(/^\d+\s+/, '').replace(/\.mp3$/, '');
+            audio.src = `music/${trackList[index]}`;
+            currentTrackSpan.textContent = trackName;
+        }
+    }
+    
+    function togglePlayPause() {
+        if (isPlaying) {
+            audio.pause();
+            playPauseBtn.textContent = '▶';
+            stopDisc();
+            isPlaying = false;
+        } else {
+            audio.play();
+            playPauseBtn.textContent = '⏸';
+            startDisc();
+            isPlaying = true;
+        }
+    }
+    
+    function startDisc() {
+        // Запоминаем текущий угол и начинаем крутить с него
+        const currentAngle = getCurrentDiscAngle();
+        discImage.style.transform = `rotate(${currentAngle}deg)`;
+        discImage.classList.add('spinning');
+        currentRotation = currentAngle;
+    }
+    
+    function stopDisc() {
+        // Сохраняем текущий угол поворота
+        const currentAngle = getCurrentDiscAngle();
+        discImage.classList.remove('spinning');
+        discImage.style.transform = `rotate(${currentAngle}deg)`;
+        currentRotation = currentAngle;
+    }
+    
+    function getCurrentDiscAngle() {
+        const computedStyle = window.getComputedStyle(discImage);
+        const transform = computedStyle.transform;
+        
+        if (transform === 'none' || !transform.includes('matrix')) {
+            return currentRotation;
+        }
+        
+        // Парсим matrix для получения текущего поворота
+        const values = transform.match(/matrix\(([^)]+)\)/);
+        if (values) {
+            const matrix = values[1].split(',').map(parseFloat);
+            const angle = Math.atan2(matrix[1], matrix[0]) * (180 / Math.PI);
+            return angle < 0 ? angle + 360 : angle;
+        }
+        
+        return currentRotation;
+    }
+    
+    function playPreviousTrack() {
+        const newIndex = currentTrackIndex > 0 ? currentTrackIndex - 1 : trackList.length - 1;
+        loadTrack(newIndex);
+        if (isPlaying) {
+            audio.play();
+            startDisc();
+        }
+    }
+    
+    function playNextTrack() {
+        const newIndex = currentTrackIndex < trackList.length - 1 ? currentTrackIndex + 1 : 0;
+        loadTrack(newIndex);
+        if (isPlaying) {
+            audio.play();
+            startDisc();
+        }
+    }
+})();
+
+// Обложки из спрайта заменяются отдельной картинкой только при наведении или клике
+function loadFullCover(el) {
+    if (el.dataset.loaded) return;
+    el.dataset.loaded = '1';
+    const img = new Image();
+    img.alt = el.getAttribute('aria-label');
+    img.onload = () => el.appendChild(img);
+    img.src = el.dataset.full;
+}
+
+document.querySelectorAll('.cover-sprite').forEach((el) => {
+    el.addEventListener('mouseenter', () => loadFullCover(el), { once: true });
+    el.addEventListener('click', () => loadFullCover(el), { once: true });
+});
+
+// Service worker есть только в сборке dist/ (см. build_assets.py): при открытии
+// страниц из корня репозитория регистрация просто не удается
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', () => {
+        navigator.serviceWorker.register('sw.js').catch(() => {});
+    });
+}
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""Сборка страниц сайта из каталога выпусков.
+
+Шаблоны из templates/ читаются и компилируются один раз при импорте,
+страница собирается списком кусков и пишется на диск потоком.
+В режиме shard архив делится на легкую главную страницу со ссылками
+на годы и по одной странице на каждый год. В режиме virtual обложек
+в разметке нет вовсе: каталог пишется компактным JSON в data/, а site.js
+рисует из него только строки сетки рядом с видимой областью. Страница пересобирается,
+только если изменились ее входы: выпуски, заглушки, спрайт или шаблоны.
+"""
+import os
+import json
+import hashlib
+import argparse
+from string import Template
+from urllib.parse import quote
+import build_cache
+import tracing
+from build_assets import hashed_name, write_if_changed
+from catalog import SEARCH_DIR, DATA_DIR, load_catalog
+from process_images import WIDTHS, FORMATS, derivative_dir, derivative_path, load_placeholders
+from sprites import load_sprite_map, sprite_style
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+TITLE = "Архив обложек журнала Афиша"
+STYLESHEET = "styles_alt.css"
+
+# Ширина колонки .covers-grid из styles_alt.css: до 600px - три колонки
+# с отступами 15px; шире - auto-fill по minmax(203px, 1fr) в main до 1200px,
+# где колонка не бывает шире ~315px, а на полной ширине равна 224px
+COVER_SIZES = "(max-width: 600px) calc((100vw - 60px) / 3), (max-width: 1240px) 315px, 224px"
+# Ширина, которая идет в src для браузеров без поддержки srcset
+DEFAULT_WIDTH = 400
+
+def read_template(name):
+    """Читает файл шаблона из templates/."""
+    with open(os.path.join(TEMPLATES_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+# Страница делится по $main на начало и конец, чтобы сетку обложек
+# писать в файл по кускам, не склеивая всю страницу в одну строку
+PAGE_HEAD, PAGE_TAIL = (Template(part) for part in read_template('page.html').split('$main'))
+MODAL_HTML = read_template('modal.html')
+
+YEAR_OPEN = Template('<section class="year-section" id="y$year">'
+                     '<h2 class="year-title">$year</h2><div class="covers-grid">')
+YEAR_CLOSE = '</div></section>'
+COVER_ITEM = Template('''
+<div class="cover-item">
+    <a href="$pdf_url" target="_blank" onclick="return openPdfModal('$pdf_url'$pages)">
+        <div class="cover-image">
+            $cover
+        </div>
+    </a>
+    <div class="cover-info">
+        <div class="cover-number">$number</div>
+        <div class="cover-date">$date</div>
+    </div>
+</div>''')
+YEAR_CARD = Template('''
+<div class="cover-item">
+    <a class="year-card" href="$href">
+        <div class="cover-image">
+            $cover
+        </div>
+        <div class="cover-info">
+            <div class="cover-number">$year</div>
+            <div class="cover-date">$count</div>
+        </div>
+    </a>
+</div>''')
+NAV_LINK = Template('<a href="$href"$current>$label</a>')
+SEARCH_BOX = Template('''
+<div class="search" data-index="$index" data-local="$local">
+    <input type="search" class="search-input" placeholder="Поиск по текстам выпусков" autocomplete="off">
+    <div class="search-results" aria-live="polite"></div>
+</div>''')
+VIRTUAL_GRID = Template('<div class="vgrid" data-src="$src" data-sizes="$sizes" data-width="$width"></div>'
+                        '<noscript><p class="vgrid-noscript">Чтобы увидеть обложки, включите JavaScript.</p></noscript>')
+# Шаблоны входят в ключ каждой страницы: правка шаблона пересобирает все
+TEMPLATES_KEY = hashlib.sha256(''.join([
+    read_template('page.html'), MODAL_HTML, YEAR_OPEN.template, YEAR_CLOSE,
+    COVER_ITEM.template, YEAR_CARD.template, NAV_LINK.template, SEARCH_BOX.template,
+    VIRTUAL_GRID.template,
+]).encode('utf-8')).hexdigest()
+# Префикс заглушек в data URI: в JSON он не пишется, его добавляет site.js
+LQIP_PREFIX = "data:image/webp;base64,"
+
+def plural(n, one, few, many):
+    """Русское склонение существительного после числа: 1 выпуск, 2 выпуска, 5 выпусков."""
+    if n % 10 == 1 and n % 100 != 11:
+        return f"{n} {one}"
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return f"{n} {few}"
+    return f"{n} {many}"
+
+def year_page(year):
+    """Имя страницы года в режиме shard."""
+    return f"{year}.html"
+
+def cover_picture_html(issue, alt, placeholder=None):
+    """Разметка обложки: srcset по всем собранным ширинам для AVIF, WebP и JPEG.
+    Пути и размеры берутся из каталога, файлы обложек не открываются.
+    В srcset пробелы разделяют кандидатов, поэтому пути в нем кодируются.
+    Заглушка рисуется фоном картинки, пока та не загрузилась."""
+    derivatives = issue['derivatives']
+    sources = []
+    jpeg_srcset = ""
+    for fmt, mime in (('avif', 'image/avif'), ('webp', 'image/webp'), ('jpeg', None)):
+        candidates = {}
+        for width in WIDTHS:
+            entry = derivatives.get(str(width), {})
+            if fmt in entry:
+                # Дескриптор - реальная ширина файла: маленькие исходники не увеличиваются
+                candidates.setdefault(entry['size'][0], entry[fmt])
+        srcset = ", ".join(f"{quote(path)} {width}w" for width, path in sorted(candidates.items()))
+        if fmt == 'jpeg':
+            jpeg_srcset = srcset
+        elif srcset:
+            sources.append(f'<source type="{mime}" srcset="{srcset}" sizes="{COVER_SIZES}">')
+
+    if str(DEFAULT_WIDTH) in derivatives:
+        image_path = derivatives[str(DEFAULT_WIDTH)]['jpeg']
+        size = derivatives[str(DEFAULT_WIDTH)]['size']
+    else:
+        # Производных еще нет - показываем миниатюру из таблицы
+        image_path = issue['covers']['thumb']
+        size = issue['dimensions'].get('thumb')
+    dimensions = ""
+    if size:
+        # Размеры резервируют место под обложку, пока она не загрузилась
+        width, height = size
+        dimensions = f' width="{width}" height="{height}"'
+    srcset_attrs = f' srcset="{jpeg_srcset}" sizes="{COVER_SIZES}"' if jpeg_srcset else ""
+    style = ""
+    if placeholder:
+        style = (f' style="background: {placeholder["color"]} url({placeholder["lqip"]}) '
+                 f'center / cover no-repeat"')
+    return (f'<picture>{"".join(sources)}<img src="{image_path}"{srcset_attrs}{dimensions}{style} '
+            f'alt="{alt}" loading="lazy"></picture>')
+
+def cover_sprite_html(sprite, filename, alt):
+    """Разметка обложки из спрайта года; отдельная картинка грузится при наведении или клике."""
+    full_path = derivative_path(DEFAULT_WIDTH, filename, 'jpeg')
+    return (f'<div class="cover-sprite" role="img" aria-label="{alt}" '
+            f'style="{sprite_style(sprite, filename)}" data-full="{quote(full_path)}"></div>')
+
+def cover_html(issue, placeholders, sprite=None):
+    """Картинка обложки: из спрайта года, если он есть, иначе picture со srcset."""
+    alt = f"Обложка {issue['number']}"
+    if sprite and issue['filename'] in sprite['items']:
+        return cover_sprite_html(sprite, issue['filename'], alt)
+    return cover_picture_html(issue, alt, placeholders.get(issue['filename']))
+
+def pdf_href(issue, local_pdfs=False):
+    """Ссылка на PDF: локальная копия из mirror_pdfs.py, если она есть и нужна, иначе S3."""
+    if local_pdfs and issue.get('pdf_mirrored'):
+        return issue['pdf_path']
+    return issue['pdf_url']
+
+def pages_manifest(issue, local_pdfs=False):
+    """Манифест страниц-картинок из prerender_pages.py, если просмотрщик может их показать."""
+    if local_pdfs and issue.get('pdf_mirrored') and issue.get('pages_manifest'):
+        return issue['pages_manifest']
+    return None
+
+def pages_arg(issue, local_pdfs=False):
+    """Второй аргумент openPdfModal: манифест страниц-картинок."""
+    manifest = pages_manifest(issue, local_pdfs)
+    return f", '{manifest}'" if manifest else ""
+
+def render_year(year, issues, placeholders, sprite=None, local_pdfs=False):
+    """Куски разметки секции одного года."""
+    parts = [YEAR_OPEN.substitute(year=year)]
+    for issue in issues:
+        parts.append(COVER_ITEM.substitute(
+            pdf_url=pdf_href(issue, local_pdfs),
+            pages=pages_arg(issue, local_pdfs),
+            cover=cover_html(issue, placeholders, sprite),
+            number=issue['number'],
+            date=issue['date'],
+        ))
+    parts.append(YEAR_CLOSE)
+    return parts
+
+def render_index(catalog, placeholders, sprite_map):
+    """Куски разметки главной страницы shard-режима: по карточке на год."""
+    parts = ['<section class="year-section"><div class="covers-grid">']
+    for year in catalog.years():
+        issues = catalog.by_year[year]
+        parts.append(YEAR_CARD.substitute(
+            href=year_page(year),
+            cover=cover_html(issues[0], placeholders, sprite_map.get(year)),
+            year=year,
+            count=plural(len(issues), "выпуск", "выпуска", "выпусков"),
+        ))
+    parts.append(YEAR_CLOSE)
+    return parts
+
+def issue_record(issue, placeholder=None, local_pdfs=False, url_base=""):
+    """
+    Выпуск для данных виртуальной сетки с короткими ключами: n - номер, d - дата,
+    u - PDF без общего префикса url_base (пустая строка, если PDF нет), p - манифест страниц, f - имя файла обложки
+    без расширения, w - [ширина, реальная ширина, реальная высота, маска форматов]
+    для каждой собранной ширины, t и s - миниатюра и ее размер, если производных нет,
+    c и l - цвет и заглушка без префикса data URI.
+    """
+    url = pdf_href(issue, local_pdfs)
+    record = {'n': issue['number'], 'd': issue['date'], 'u': url[len(url_base):] if url else ""}
+    manifest = pages_manifest(issue, local_pdfs)
+    if manifest:
+        record['p'] = manifest
+    record['f'] = os.path.splitext(issue['filename'])[0]
+    widths = []
+    for width in WIDTHS:
+        entry = issue['derivatives'].get(str(width))
+        if entry:
+            mask = sum(1 << i for i, fmt in enumerate(FORMATS) if fmt in entry)
+            widths.append([width, entry['size'][0], entry['size'][1], mask])
+    if widths:
+        record['w'] = widths
+    if str(DEFAULT_WIDTH) not in issue['derivatives']:
+        # Производных нужной ширины нет - показываем миниатюру из таблицы
+        record['t'] = issue['covers']['thumb']
+        if issue['dimensions'].get('thumb'):
+            record['s'] = issue['dimensions']['thumb']
+    if placeholder:
+        record['c'] = placeholder['color']
+        if placeholder['lqip'].startswith(LQIP_PREFIX):
+            record['l'] = placeholder['lqip'][len(LQIP_PREFIX):]
+    return record
+
+def catalog_data(catalog, placeholders, local_pdfs=False):
+    """
+    Компактный JSON каталога для виртуальной сетки: y - [год, число выпусков]
+    в порядке выпусков i, b - общий префикс ссылок на PDF, x - расширения форматов
+    в порядке бит маски, r - шаблон папки производных с {w} вместо ширины.
+    """
+    years = catalog.years()
+    urls = [url for url in (pdf_href(issue, local_pdfs) for issue in catalog) if url]
+    url_base = os.path.commonprefix(urls) if len(urls) > 1 else ""
+    url_base = url_base[:url_base.rfind('/') + 1]
+    data = {
+        'b': url_base,
+        'r': derivative_dir('{w}'),
+        'x': list(FORMATS.values()),
+        'y': [[year, len(catalog.by_year[year])] for year in years],
+        'i': [issue_record(issue, placeholders.get(issue['filename']), local_pdfs, url_base)
+              for year in years for issue in catalog.by_year[year]],
+    }
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def write_catalog_data(out_dir, data):
+    """
+    Пишет данные сетки в data/ под именем с хешем содержимого, чтобы их можно
+    было кешировать навсегда, и удаляет прошлые версии. Возвращает путь для страницы.
+    """
+    directory = os.path.join(out_dir, DATA_DIR)
+    name = hashed_name("covers.json", data)
+    write_if_changed(os.path.join(directory, name), data)
+    for old in os.listdir(directory):
+        if old.startswith("covers.") and old.endswith(".json") and old != name:
+            os.remove(os.path.join(directory, old))
+    return f"{DATA_DIR}/{name}"
+
+def render_nav(years, index_href, current=None):
+    """Навигация по годам для shard-режима."""
+    links = [NAV_LINK.substitute(href=index_href, label="Все годы",
+                                 current=' aria-current="page"' if current is None else '')]
+    for year in years:
+        links.append(NAV_LINK.substitute(href=year_page(year), label=year,
+                                         current=' aria-current="page"' if year == current else ''))
+    return f'<nav class="year-nav">{" ".join(links)}</nav>'
+
+def render_search(out_dir, local_pdfs=False):
+    """Строка поиска, если рядом со страницей собран индекс search_index.py."""
+    if not os.path.exists(os.path.join(out_dir, SEARCH_DIR, 'issues.json')):
+        return ""
+    return SEARCH_BOX.substitute(index=f"{SEARCH_DIR}/", local=int(local_pdfs))
+
+def write_page(path, main_parts, total, nav="", title=TITLE, stylesheet=STYLESHEET, search=""):
+    """Пишет страницу потоком во временный файл и атомарно подменяет старую."""
+    fields = {'title': title, 'stylesheet': stylesheet, 'total': total,
+              'nav': nav, 'search': search, 'modal': MODAL_HTML}
+    with build_cache.atomic_write(path) as f:
+        f.write(PAGE_HEAD.substitute(fields))
+        f.writelines(main_parts)
+        f.write(PAGE_TAIL.substitute(fields))
+
+def render_site(catalog, output="index.html", shard=False, use_sprites=False,
+                stylesheet=STYLESHEET, local_pdfs=False, force=False, virtual=False):
+    """
+    Собирает сайт из каталога. Без shard весь архив пишется в output;
+    с shard в output попадает главная страница, а рядом - страницы годов.
+    С virtual в output пишется страница без обложек, а каталог - в data/
+    (спрайты и shard в этом режиме не используются).
+    При local_pdfs=True ссылки ведут на локальные копии PDF (см. mirror_pdfs.py),
+    а просмотрщик открывает их страницы-картинки, если они подготовлены
+    (см. prerender_pages.py).
+    Страницы, чьи входы не изменились с прошлой сборки, не переписываются.
+    Возвращает список записанных файлов.
+    """
+    placeholders = load_placeholders()
+    sprite_map = load_sprite_map() if use_sprites else {}
+    manifest = build_cache.load_manifest()
+    years = catalog.years()
+    out_dir = os.path.dirname(output)
+    index_href = os.path.basename(output)
+    search = render_search(out_dir, local_pdfs)
+    written = []
+
+    def page_key(issues, **extra):
+        return build_cache.make_key(
+            templates=TEMPLATES_KEY, stylesheet=stylesheet, total=len(catalog), local_pdfs=local_pdfs,
+            issues=issues, search=search,
+            placeholders=[placeholders.get(issue['filename']) for issue in issues],
+            **extra,
+        )
+
+    def emit(path, key, render, nav=""):
+        if not force and build_cache.is_fresh(manifest, 'site_render', path, key):
+            return
+        with tracing.span('page', path):
+            with tracing.span('render', path):
+                parts = render()
+            with tracing.span('write', path) as span:
+                write_page(path, parts, len(catalog), nav=nav, stylesheet=stylesheet, search=search)
+                span['bytes'] = os.path.getsize(path)
+        build_cache.record(manifest, 'site_render', path, key)
+        written.append(path)
+
+    if virtual:
+        src = write_catalog_data(out_dir, catalog_data(catalog, placeholders, local_pdfs))
+        emit(output,
+             page_key([], src=src, mode='virtual'),
+             lambda: [VIRTUAL_GRID.substitute(src=src, sizes=COVER_SIZES, width=DEFAULT_WIDTH)])
+    elif shard:
+        # В ключ года входит список всех лет: от него зависит навигация
+        for year in years:
+            issues = catalog.by_year[year]
+            sprite = sprite_map.get(year)
+            emit(os.path.join(out_dir, year_page(year)),
+                 page_key(issues, year=year, years=years, sprite=sprite or {}),
+                 lambda: render_year(year, issues, placeholders, sprite, local_pdfs),
+                 nav=render_nav(years, index_href, current=year))
+        firsts = [catalog.by_year[year][0] for year in years]
+        emit(output,
+             page_key(firsts, counts=[len(catalog.by_year[year]) for year in years],
+                      sprites={year: sprite_map.get(year, {}) for year in years}, mode='index'),
+             lambda: render_index(catalog, placeholders, sprite_map),
+             nav=render_nav(years, index_href))
+    else:
+        emit(output,
+             page_key(catalog.issues, sprites=sprite_map, mode='single'),
+             lambda: [part for year in years
+                      for part in render_year(year, catalog.by_year[year], placeholders,
+                                              sprite_map.get(year), local_pdfs)])
+
+    build_cache.save_manifest(manifest)
+    print(f"Страниц записано: {len(written)}" + (f" ({', '.join(written)})" if written else ""))
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сборка страниц сайта из каталога выпусков")
+    parser.add_argument('--output', default="index.html", help="главная страница (по умолчанию index.html)")
+    parser.add_argument('--shard', action='store_true',
+                        help="разбить архив на главную страницу и страницы по годам")
+    parser.add_argument('--sprites', action='store_true',
+                        help="рисовать сетку из спрайтов годов (см. sprites.py)")
+    parser.add_argument('--stylesheet', default=STYLESHEET, help=f"файл стилей (по умолчанию {STYLESHEET})")
+    parser.add_argument('--local-pdfs', action='store_true',
+                        help="ссылаться на локальные копии PDF из mirror_pdfs.py (для server.py)")
+    parser.add_argument('--virtual', action='store_true',
+                        help="сетка из компактного JSON: в разметке только строки рядом с экраном")
+    parser.add_argument('--force', action='store_true', help="переписать все страницы")
+    tracing.add_argument(parser)
+    args = parser.parse_args()
+    with tracing.session(args.trace):
+        render_site(load_catalog(), output=args.output, shard=args.shard, use_sprites=args.sprites,
+                    stylesheet=args.stylesheet, local_pdfs=args.local_pdfs, force=args.force,
+                    virtual=args.virtual)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Сборка спрайтов: все миниатюры года в одном изображении.
+
+Для первой отрисовки сетке хватает по одному запросу на год вместо
+запроса на каждую обложку. Координаты каждой обложки в спрайте
+сохраняются в sprites/sprites.json.
+"""
+import os
+import json
+import argparse
+from PIL import Image
+import build_cache
+from catalog import load_catalog
+from process_images import create_directory, derivative_dir, encode_to_target
+
+SPRITES_DIR = "sprites"
+SPRITES_MAP = os.path.join(SPRITES_DIR, "sprites.json")
+SPRITE_WIDTH = 200
+SPRITE_COLUMNS = 10
+
+def group_by_year(source_dir):
+    """Группирует миниатюры по годам в порядке индекса выпуска внутри года."""
+    catalog = load_catalog()
+    by_year = {}
+    for year in catalog.years():
+        filenames = [issue['filename'] for issue in catalog.by_year[year]
+                     if os.path.exists(os.path.join(source_dir, issue['filename']))]
+        if filenames:
+            by_year[year] = filenames
+    return by_year
+
+def load_sprite_map(filename=SPRITES_MAP):
+    """Загружает карту координат спрайтов."""
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def pack_year(source_dir, filenames, output_path, columns=SPRITE_COLUMNS):
+    """
+    Раскладывает миниатюры по сетке из columns колонок и сохраняет спрайт.
+    Возвращает описание спрайта с координатами [x, y, ширина, высота] каждой обложки.
+    """
+    images = [Image.open(os.path.join(source_dir, f)) for f in filenames]
+    try:
+        cell_width = max(img.size[0] for img in images)
+        cell_height = max(img.size[1] for img in images)
+        rows = (len(images) + columns - 1) // columns
+        sprite = Image.new('RGB', (cell_width * min(columns, len(images)), cell_height * rows), '#000')
+
+        items = {}
+        for index, (filename, img) in enumerate(zip(filenames, images)):
+            x = (index % columns) * cell_width
+            y = (index // columns) * cell_height
+            sprite.paste(img.convert('RGB'), (x, y))
+            items[filename] = [x, y, img.size[0], img.size[1]]
+    finally:
+        for img in images:
+            img.close()
+
+    data, quality = encode_to_target(sprite, 'jpeg')
+    with open(output_path, 'wb') as f:
+        f.write(data)
+    return {
+        'file': output_path.replace(os.sep, '/'),
+        'width': sprite.size[0],
+        'height': sprite.size[1],
+        'items': items,
+    }, len(data)
+
+def build_sprites(width=SPRITE_WIDTH, columns=SPRITE_COLUMNS, force=False):
+    """Собирает спрайты по годам из миниатюр заданной ширины."""
+    source_dir = derivative_dir(width)
+    if not os.path.isdir(source_dir):
+        print(f"Папка {source_dir} не найдена. Сначала запустите process_images.py.")
+        return
+
+    create_directory(SPRITES_DIR)
+    manifest = build_cache.load_manifest()
+    sprite_map = load_sprite_map()
+    by_year = group_by_year(source_dir)
+
+    print(f"Собираю спрайты для {len(by_year)} лет из {source_dir}...")
+    for year, filenames in by_year.items():
+        output_path = os.path.join(SPRITES_DIR, f"sprite_{year}.jpg")
+        key = build_cache.make_key(
+            sources=[[f, build_cache.file_digest(os.path.join(source_dir, f))] for f in filenames],
+            columns=columns,
+        )
+        if not force and year in sprite_map and build_cache.is_fresh(manifest, 'sprites', output_path, key):
+            continue
+
+        sprite_map[year], size = pack_year(source_dir, filenames, output_path, columns)
+        build_cache.record(manifest, 'sprites', output_path, key)
+        print(f"  {year}: {len(filenames)} обложек -> {output_path} ({size / 1024:.1f} KB)")
+
+    # Удаляем годы, для которых больше нет миниатюр
+    for year in set(sprite_map) - set(by_year):
+        del sprite_map[year]
+
+    with open(SPRITES_MAP, 'w', encoding='utf-8') as f:
+        json.dump(sprite_map, f, ensure_ascii=False, indent=1, sort_keys=True)
+    build_cache.save_manifest(manifest)
+    print(f"Карта спрайтов сохранена в {SPRITES_MAP}")
+
+def sprite_style(sprite, filename):
+    """
+    CSS для показа одной обложки из спрайта в блоке любой ширины.
+    Размер и позиция фона задаются в процентах, поэтому обложка
+    масштабируется вместе с колонкой сетки.
+    """
+    x, y, w, h = sprite['items'][filename]
+    size_x = sprite['width'] / w * 100
+    size_y = sprite['height'] / h * 100
+    pos_x = x / (sprite['width'] - w) * 100 if sprite['width'] > w else 0
+    pos_y = y / (sprite['height'] - h) * 100 if sprite['height'] > h else 0
+    return (f"background-image: url('{sprite['file']}'); "
+            f"background-size: {size_x:.4f}% {size_y:.4f}%; "
+            f"background-position: {pos_x:.4f}% {pos_y:.4f}%; "
+            f"aspect-ratio: {w} / {h}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сборка спрайтов обложек по годам")
+    parser.add_argument('--width', type=int, default=SPRITE_WIDTH,
+                        help=f"ширина миниатюр в спрайте (по умолчанию {SPRITE_WIDTH})")
+    parser.add_argument('--columns', type=int, default=SPRITE_COLUMNS,
+                        help=f"число колонок в спрайте (по умолчанию {SPRITE_COLUMNS})")
+    parser.add_argument('--force', action='store_true', help="пересобрать все спрайты")
+    args = parser.parse_args()
+    build_sprites(width=args.width, columns=args.columns, force=args.force)
@@ -0,0 +1,249 @@
+// Service worker сайта. Это исходник: build_assets.py собирает из него dist/sw.js
+// и дописывает в начало VERSION, COVERS_VERSION, CACHE_PDFS и манифест PRECACHE -
+// список [путь, ревизия] страниц, ассетов и самых мелких обложек.
+//
+// Стратегии:
+// - файлы из манифеста лежат в кеше precache-<VERSION> и отдаются из него;
+// - обложки, спрайты и скрипты с CDN - сначала из кеша, потом из сети;
+// - страницы и JSON каталога и поиска - из кеша, с обновлением в фоне;
+// - PDF (если сборка с --cache-pdfs) кешируются целиком после первого открытия,
+//   запросы диапазонов pdf.js отдаются кусками из кеша.
+
+const PRECACHE_CACHE = 'precache-' + VERSION;
+const COVERS_CACHE = 'covers-' + COVERS_VERSION;
+// Страницы и данные из сети хранятся отдельно для каждой версии: в старых
+// страницах ссылки на ассеты, которых в новой сборке уже нет
+const DATA_CACHE = 'data-' + VERSION;
+const CDN_CACHE = 'cdn';
+const PDF_CACHE = 'pdfs';
+const CACHES = [PRECACHE_CACHE, COVERS_CACHE, DATA_CACHE, CDN_CACHE, PDF_CACHE];
+// Сколько PDF держать в кеше: лишние удаляются, начиная с давно открытых
+const PDF_LIMIT = 20;
+const INSTALL_CONCURRENCY = 8;
+const COVER_RE = /^\/(covers(_\d+w|_medium)?|sprites)\//;
+const DATA_RE = /^\/(data|search)\//;
+const CDN_HOSTS = ['cdnjs.cloudflare.com', 'fonts.googleapis.com', 'fonts.gstatic.com'];
+
+const scope = new URL(self.registration.scope);
+
+// Путь из манифеста -> URL для сети и ключ в кеше (с ревизией, чтобы новая
+// версия файла не совпала со старой). Ищем по раскодированному пути:
+// в разметке имена обложек закодированы иначе, чем их кодирует new URL
+const precache = new Map();
+// Имя обложки без расширения -> путь мелкой копии из манифеста, для работы без сети
+const coverFallback = new Map();
+for (const [path, revision] of PRECACHE) {
+    const url = new URL(path.split('/').map(encodeURIComponent).join('/'), scope).href;
+    const entry = { url, key: revision ? `${url}?__rev=${revision}` : url };
+    const pathname = decodePath(new URL(url).pathname);
+    precache.set(pathname, entry);
+    if (COVER_RE.test(pathname)) {
+        coverFallback.set(coverStem(pathname), entry);
+    }
+}
+
+function decodePath(pathname) {
+    try {
+        return decodeURIComponent(pathname);
+    } catch (error) {
+        return pathname;
+    }
+}
+
+function coverStem(pathname) {
+    const name = pathname.slice(pathname.lastIndexOf('/') + 1);
+    return name.replace(/\.[^.]+$/, '');
+}
+
+// Страницы годов на Vercel открываются как /1999, а собраны как 1999.html
+function pagePath(pathname) {
+    const local = pathname.slice(scope.pathname.length - 1);
+    if (local === '/') return scope.pathname + 'index.html';
+    if (/^\/\d{4}$/.test(local)) return pathname + '.html';
+    return pathname;
+}
+
+self.addEventListener('install', (event) => {
+    event.waitUntil((async () => {
+        const cache = await caches.open(PRECACHE_CACHE);
+        const present = new Set((await cache.keys()).map((request) => request.url));
+        const queue = [...precache.values()].filter((entry) => !present.has(entry.key));
+        let failed = 0;
+
+        async function worker() {
+            while (queue.length) {
+                const entry = queue.pop();
+                // Файлы с той же ревизией берем из кеша прошлой версии, а не из сети
+                let response = await caches.match(entry.key);
+                if (!response) {
+                    try {
+                        response = await fetch(entry.url, { cache: 'no-cache' });
+                    } catch (error) {
+                        response = null;
+                    }
+                }
+                if (response && response.ok) {
+                    await cache.put(entry.key, response);
+                } else {
+                    failed++;
+                }
+            }
+        }
+
+        await Promise.all(Array.from({ length: INSTALL_CONCURRENCY }, worker));
+        if (failed) {
+            console.warn(`Service worker: не удалось закешировать ${failed} файлов`);
+        }
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil((async () => {
+        // Удаляем кеши прошлых версий: precache, страницы и обложки прошлой сборки
+        for (const name of await caches.keys()) {
+            if (!CACHES.includes(name)) {
+                await caches.delete(name);
+            }
+        }
+        if (!CACHE_PDFS) {
+            await caches.delete(PDF_CACHE);
+        }
+        await self.clients.claim();
+    })());
+});
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+
+    if (CACHE_PDFS && /\.pdf$/i.test(url.pathname)) {
+        event.respondWith(pdfResponse(event, request));
+        return;
+    }
+    if (url.origin !== scope.origin) {
+        if (CDN_HOSTS.includes(url.hostname)) {
+            event.respondWith(cacheFirst(event, request, CDN_CACHE));
+        }
+        return;
+    }
+
+    const pathname = decodePath(url.pathname);
+    if (request.mode === 'navigate') {
+        event.respondWith(staleWhileRevalidate(event, request, precache.get(pagePath(pathname))));
+    } else if (DATA_RE.test(pathname)) {
+        event.respondWith(staleWhileRevalidate(event, request, precache.get(pathname)));
+    } else if (precache.has(pathname)) {
+        event.respondWith(precached(request, precache.get(pathname)));
+    } else if (COVER_RE.test(pathname)) {
+        event.respondWith(cacheFirst(event, request, COVERS_CACHE, coverFallback.get(coverStem(pathname))));
+    }
+});
+
+async function precached(request, entry) {
+    const cached = await caches.match(entry.key, { cacheName: PRECACHE_CACHE });
+    return cached || fetch(request);
+}
+
+async function cacheFirst(event, request, cacheName, fallback) {
+    const cache = await caches.open(cacheName);
+    const cached = await cache.match(request);
+    if (cached) return cached;
+    try {
+        const response = await fetch(request);
+        // Ответы CDN на запросы без CORS непрозрачны (status 0), но их тоже можно кешировать
+        if (response.ok || response.type === 'opaque') {
+            event.waitUntil(cache.put(request, response.clone()));
+        }
+        return response;
+    } catch (error) {
+        // Без сети вместо крупной копии обложки показываем мелкую из precache
+        const replacement = fallback && await caches.match(fallback.key, { cacheName: PRECACHE_CACHE });
+        if (replacement) return replacement;
+        throw error;
+    }
+}
+
+async function staleWhileRevalidate(event, request, entry) {
+    const cache = await caches.open(DATA_CACHE);
+    const key = entry ? entry.url : request.url;
+    const cached = await cache.match(key)
+        || (entry && await caches.match(entry.key, { cacheName: PRECACHE_CACHE }));
+    const update = fetch(request).then((response) => {
+        if (response.ok) {
+            return cache.put(key, response.clone()).then(() => response);
+        }
+        return response;
+    });
+    if (!cached) {
+        return update.catch(async (error) => {
+            // Без сети любая страница архива открывается как главная
+            const index = precache.get(scope.pathname + 'index.html');
+            const fallback = request.mode === 'navigate' && index
+                && await caches.match(index.key, { cacheName: PRECACHE_CACHE });
+            if (fallback) return fallback;
+            throw error;
+        });
+    }
+    event.waitUntil(update.catch(() => {}));
+    return cached;
+}
+
+// Скачивания PDF в фоне: один файл не качается дважды, даже если pdf.js
+// за время загрузки прислал десятки запросов диапазонов
+const pdfDownloads = new Map();
+
+async function pdfResponse(event, request) {
+    const cache = await caches.open(PDF_CACHE);
+    const cached = await cache.match(request.url);
+    if (!cached) {
+        if (!pdfDownloads.has(request.url)) {
+            const download = cachePdf(cache, request.url).finally(() => pdfDownloads.delete(request.url));
+            pdfDownloads.set(request.url, download);
+            event.waitUntil(download);
+        }
+        return fetch(request);
+    }
+    const blob = await cached.blob();
+    const headers = { 'Content-Type': 'application/pdf', 'Accept-Ranges': 'bytes' };
+    const range = /^bytes=(\d*)-(\d*)$/.exec(request.headers.get('Range') || '');
+    if (!range || (!range[1] && !range[2])) {
+        return new Response(blob, { headers: { ...headers, 'Content-Length': String(blob.size) } });
+    }
+    let start, end;
+    if (range[1]) {
+        start = Number(range[1]);
+        end = range[2] ? Math.min(Number(range[2]), blob.size - 1) : blob.size - 1;
+    } else {
+        start = Math.max(0, blob.size - Number(range[2]));
+        end = blob.size - 1;
+    }
+    if (start > end) {
+        return new Response(null, { status: 416, headers: { 'Content-Range': `bytes */${blob.size}` } });
+    }
+    return new Response(blob.slice(start, end + 1), {
+        status: 206,
+        headers: {
+            ...headers,
+            'Content-Range': `bytes ${start}-${end}/${blob.size}`,
+            'Content-Length': String(end - start + 1),
+        },
+    });
+}
+
+async function cachePdf(cache, url) {
+    try {
+        const response = await fetch(url, { mode: 'cors' });
+        if (response.status !== 200) return;
+        // Обновляем порядок: недавно открытый PDF уходит в конец очереди на удаление
+        await cache.delete(url);
+        await cache.put(url, response);
+        const keys = await cache.keys();
+        for (const request of keys.slice(0, Math.max(0, keys.length - PDF_LIMIT))) {
+            await cache.delete(request);
+        }
+    } catch (error) {
+        console.warn('Service worker: PDF не закеширован', url, error);
+    }
+}
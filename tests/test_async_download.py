@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Скачивание с повторами и условными запросами против локального сервера-заглушки.
+
+Запуск из корня репозитория: python -m pytest tests
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import async_download
+from async_download import download_all
+
+BODY = bytes(range(256)) * 64
+ETAG = '"v1"'
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Отвечает по пути запроса: /retry-after - 429 с Retry-After, потом файл;
+    /flaky - дважды 503, потом файл; /etag - файл с ETag и 304 на If-None-Match;
+    /missing - 404; /truncated - в первый раз обрывает тело, потом отдает целиком.
+    """
+    requests = {}
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, headers=()):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(BODY)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def send_status(self, status, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_GET(self):
+        with self.lock:
+            self.requests.setdefault(self.path, []).append(dict(self.headers))
+            attempt = len(self.requests[self.path])
+        if self.path == '/retry-after':
+            if attempt == 1:
+                self.send_status(429, [('Retry-After', '1')])
+            else:
+                self.send_body()
+        elif self.path == '/flaky':
+            if attempt <= 2:
+                self.send_status(503)
+            else:
+                self.send_body()
+        elif self.path == '/etag':
+            if self.headers.get('If-None-Match') == ETAG:
+                self.send_status(304, [('ETag', ETAG)])
+            else:
+                self.send_body([('ETag', ETAG)])
+        elif self.path == '/truncated' and attempt == 1:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY[:10])
+            self.close_connection = True
+        elif self.path == '/truncated':
+            self.send_body()
+        else:
+            self.send_status(404)
+
+class DownloadTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubHandler.requests.clear()
+        self.tmp = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.tmp, 'state.json')
+        # Без этого повторы после 503 ждут по секунде и больше
+        self.backoff, async_download.BACKOFF = async_download.BACKOFF, 0.01
+
+    def tearDown(self):
+        async_download.BACKOFF = self.backoff
+        shutil.rmtree(self.tmp)
+
+    def download(self, name):
+        path = os.path.join(self.tmp, 'files', name)
+        stats = download_all([(f"{self.base}/{name}", path)], retries=3, state_file=self.state_file)
+        return path, stats
+
+    def assert_downloaded(self, path, stats):
+        self.assertEqual((stats['downloaded'], stats['failed']), (1, []))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), BODY)
+
+    def test_retry_after(self):
+        started = time.monotonic()
+        path, stats = self.download('retry-after')
+        self.assert_downloaded(path, stats)
+        self.assertEqual(len(StubHandler.requests['/retry-after']), 2)
+        self.assertGreaterEqual(time.monotonic() - started, 0.9)
+
+    def test_server_errors_then_success(self):
+        path, stats = self.download('flaky')
+        self.assert_downloaded(path, stats)
+        self.assertEqual(len(StubHandler.requests['/flaky']), 3)
+
+    def test_not_modified_is_skipped(self):
+        path, stats = self.download('etag')
+        self.assert_downloaded(path, stats)
+        mtime = os.stat(path).st_mtime_ns
+        path, stats = self.download('etag')
+        self.assertEqual((stats['downloaded'], stats['skipped']), (0, 1))
+        self.assertEqual(StubHandler.requests['/etag'][-1].get('If-None-Match'), ETAG)
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+    def test_not_found_fails_without_retries(self):
+        path, stats = self.download('missing')
+        self.assertEqual(len(stats['failed']), 1)
+        self.assertEqual(len(StubHandler.requests['/missing']), 1)
+        self.assertFalse(os.path.exists(path))
+
+    def test_truncated_body_is_retried(self):
+        path, stats = self.download('truncated')
+        self.assert_downloaded(path, stats)
+        self.assertEqual(len(StubHandler.requests['/truncated']), 2)
+        self.assertEqual(os.listdir(os.path.dirname(path)), ['truncated'])
+
+if __name__ == "__main__":
+    unittest.main()
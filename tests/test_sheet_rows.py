@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Разбор опубликованной таблицы на сохраненной странице iframe_output.html.
+
+Запуск из корня репозитория: python -m pytest tests
+"""
+import os
+import sys
+import random
+import unittest
+from bs4 import BeautifulSoup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from html_stream import SheetRowParser, iter_sheet_rows, read_chunks
+from selenium_extract import extract_from_file, rows_to_sorted_data
+
+FIXTURE = os.path.join(ROOT, "iframe_output.html")
+FIXTURE_ISSUES = 357
+ITEM_KEYS = {'number', 'date', 'year', 'image_url', 'date_obj'}
+
+def soup_rows(html):
+    """Строки первой таблицы так, как их раньше доставал BeautifulSoup."""
+    table = BeautifulSoup(html, 'html.parser').find_all('table')[0]
+    rows = []
+    for row in table.find_all('tr'):
+        cells = []
+        for td in row.find_all('td'):
+            img = td.find('img')
+            cells.append((td.get_text(strip=True), img['src'] if img and 'src' in img.attrs else ''))
+        rows.append(cells)
+    return rows
+
+class SheetRowsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(FIXTURE, 'r', encoding='utf-8') as f:
+            cls.html = f.read()
+        cls.rows = list(iter_sheet_rows(read_chunks(FIXTURE)))
+
+    def test_extract_from_file(self):
+        data = extract_from_file(FIXTURE)
+        self.assertEqual(sum(len(items) for items in data.values()), FIXTURE_ISSUES)
+        self.assertEqual(list(data), sorted(data))
+        for year, items in data.items():
+            self.assertEqual([item['date'] for item in items], sorted(item['date'] for item in items))
+            for item in items:
+                self.assertEqual(set(item), ITEM_KEYS)
+                self.assertEqual(item['year'], year)
+                self.assertEqual(item['date_obj'], item['date'])
+                self.assertIn('lh3.googleusercontent.com', item['image_url'])
+
+    def test_chunk_boundaries(self):
+        rng = random.Random(0)
+        for _ in range(5):
+            chunks, pos = [], 0
+            while pos < len(self.html):
+                size = rng.randint(1, 4096)
+                chunks.append(self.html[pos:pos + size])
+                pos += size
+            self.assertEqual(list(iter_sheet_rows(chunks)), self.rows)
+
+    def test_single_characters(self):
+        parser = SheetRowParser()
+        for char in self.html:
+            parser.feed(char)
+        parser.close()
+        self.assertEqual(parser.pop_rows(), self.rows)
+
+    def test_matches_beautifulsoup(self):
+        self.assertEqual(rows_to_sorted_data(soup_rows(self.html)), rows_to_sorted_data(self.rows))
+
+if __name__ == "__main__":
+    unittest.main()
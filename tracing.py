@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Трассировка стадий конвейера.
+
+Скрипты оборачивают работу над каждым элементом и ее фазы (скачивание,
+открытие, рендеринг, сжатие, запись) в span(...). Пока трассировка не
+включена, span ничего не записывает. С флагом --trace файл.json скрипт
+пишет трассу в формате Chrome (открывается в chrome://tracing и
+ui.perfetto.dev) и печатает по каждой фазе число вызовов, p50, p95,
+максимум и сумму байт.
+
+Спаны из процессов пула возвращаются родителю вместе с результатом:
+задача отправляется через submit(pool, ...), а результат берется
+через result(future).
+"""
+import os
+import sys
+import json
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+_enabled = False
+_events = []
+
+def enable():
+    """Включает запись спанов в этом процессе."""
+    global _enabled
+    _enabled = True
+
+@contextmanager
+def span(name, item=None, **args):
+    """
+    Замеряет блок кода как фазу name элемента item. Отдает словарь
+    аргументов спана: в него можно дописать bytes и другие сведения о результате.
+    """
+    if item is not None:
+        args['item'] = item
+    if not _enabled:
+        yield args
+        return
+    started = time.perf_counter()
+    try:
+        yield args
+    except BaseException as e:
+        args['error'] = type(e).__name__
+        raise
+    finally:
+        # perf_counter в Linux, macOS и Windows идет по общим для всех процессов
+        # монотонным часам, поэтому спаны воркеров ложатся на ту же шкалу
+        _events.append({'name': name, 'ts': started, 'dur': time.perf_counter() - started,
+                        'pid': os.getpid(), 'tid': threading.get_native_id(), 'args': args})
+
+def _call(enabled, fn, args, kwargs):
+    """Выполняет задачу в процессе пула и возвращает ее спаны вместе с результатом."""
+    global _enabled
+    _enabled = enabled
+    # После fork в воркере остаются спаны родителя - они не наши
+    _events.clear()
+    try:
+        value, error = fn(*args, **kwargs), None
+    except Exception as e:
+        value, error = None, e
+    events = list(_events)
+    _events.clear()
+    return value, error, events
+
+def submit(pool, fn, *args, **kwargs):
+    """pool.submit, который передает родителю спаны задачи."""
+    return pool.submit(_call, _enabled, fn, args, kwargs)
+
+def result(future):
+    """Результат задачи из submit; ее спаны добавляются к спанам этого процесса."""
+    value, error, events = future.result()
+    _events.extend(events)
+    if error is not None:
+        raise error
+    return value
+
+def percentile(values, q):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+def summarize(events):
+    """Сводка по фазам в порядке первого появления: [(фаза, число, p50, p95, max, сумма, байт)]."""
+    phases = {}
+    for event in events:
+        phases.setdefault(event['name'], []).append(event)
+    rows = []
+    for name, items in phases.items():
+        durations = sorted(event['dur'] for event in items)
+        rows.append((name, len(items), percentile(durations, 0.5), percentile(durations, 0.95),
+                     durations[-1], sum(durations),
+                     sum(event['args'].get('bytes') or 0 for event in items)))
+    return rows
+
+def print_summary(events):
+    """Печатает таблицу фаз: времена в миллисекундах."""
+    print(f"\n{'фаза':<10} {'число':>7} {'p50, мс':>9} {'p95, мс':>9} {'max, мс':>9} "
+          f"{'сумма, с':>9} {'MB':>8}")
+    for name, count, p50, p95, longest, total, size in summarize(events):
+        print(f"{name:<10} {count:>7} {p50 * 1000:>9.1f} {p95 * 1000:>9.1f} {longest * 1000:>9.1f} "
+              f"{total:>9.2f} {size / (1024 * 1024):>8.2f}")
+
+def write_trace(path, events):
+    """Пишет спаны в формате Chrome Trace Event: полные события с временем в микросекундах."""
+    origin = min((event['ts'] for event in events), default=0)
+    script = os.path.basename(sys.argv[0]) or 'python'
+    trace = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+              'args': {'name': script if pid == os.getpid() else f"{script}: воркер {pid}"}}
+             for pid in sorted({event['pid'] for event in events} | {os.getpid()})]
+    for event in events:
+        trace.append({
+            'name': event['name'], 'cat': event['name'], 'ph': 'X',
+            'ts': round((event['ts'] - origin) * 1e6, 1), 'dur': round(event['dur'] * 1e6, 1),
+            'pid': event['pid'], 'tid': event['tid'],
+            'args': {key: value for key, value in event['args'].items() if value is not None},
+        })
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False, default=str)
+
+@contextmanager
+def session(path):
+    """
+    Трассирует блок, если задан path: в конце пишет трассу в path
+    и печатает сводку по фазам. Без path ничего не делает.
+    """
+    if not path:
+        yield
+        return
+    enable()
+    try:
+        yield
+    finally:
+        events = list(_events)
+        write_trace(path, events)
+        print_summary(events)
+        print(f"Трасса записана в {path} ({len(events)} спанов)")
+
+def add_argument(parser):
+    """Добавляет скрипту флаг --trace."""
+    parser.add_argument('--trace', metavar='FILE',
+                        help="записать трассу фаз в FILE (формат Chrome, chrome://tracing) "
+                             "и напечатать сводку p50/p95/max")
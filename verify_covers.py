@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""Сверка обложек по перцептивным хешам.
+
+Для каждого выпуска каталога сравниваются все его обложки: миниатюра
+из таблицы (covers/), увеличенная копия (covers_medium/), обложка,
+отрендеренная из PDF (covers_big/), и производные process_images.py.
+Эталон - миниатюра из таблицы: она берется из той же строки, что и номер.
+
+Хеш - dHash на 64 бита: он почти не меняется от размера, сжатия и цвета,
+но различает разные обложки. Похожие хеши ищутся в дереве
+Буркхарда-Келлера, а не перебором всех пар. Хеши кешируются
+в .cover_hashes.json по времени изменения и размеру файла.
+
+Отчет: обложки, не похожие на эталон своего выпуска (с догадкой, чья это
+обложка), и одинаковые обложки у разных выпусков.
+"""
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from catalog import load_catalog
+
+HASH_CACHE = ".cover_hashes.json"
+MEDIUM_DIR = "covers_medium"
+HASH_SIZE = 8
+# Расстояния Хэмминга из 64 бит: дальше MISMATCH - другая обложка,
+# ближе DUPLICATE - та же самая
+MISMATCH_DISTANCE = 12
+DUPLICATE_DISTANCE = 4
+REFERENCE = 'sheet'
+
+def dhash(path, size=HASH_SIZE):
+    """Разностный хеш: уменьшенная серая копия, бит - ярче ли пиксель соседа справа."""
+    with Image.open(path) as img:
+        # JPEG сразу декодируется в уменьшенном масштабе - это в разы быстрее
+        img.draft('L', (size * 4, size * 4))
+        pixels = img.convert('L').resize((size + 1, size), Image.BILINEAR).tobytes()
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            i = row * (size + 1) + col
+            value = value << 1 | (pixels[i] > pixels[i + 1])
+    return value
+
+def hamming(a, b):
+    """Число различающихся бит двух хешей."""
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    """
+    Дерево Буркхарда-Келлера для расстояния Хэмминга. Поиск в радиусе r
+    обходит только ветви, чье расстояние до узла отличается от расстояния
+    до запроса не больше чем на r (неравенство треугольника).
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        # Узел: [хеш, элементы с этим хешем, {расстояние: дочерний узел}]
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, radius):
+        """Элементы в пределах radius от value: список (расстояние, элемент) по возрастанию."""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend((distance, item) for item in node[1])
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return sorted(found, key=lambda pair: pair[0])
+
+def cover_sources(issue):
+    """Все обложки выпуска: источник -> путь."""
+    sources = {
+        REFERENCE: issue['covers']['thumb'],
+        'medium': os.path.join(MEDIUM_DIR, issue['filename']),
+        'pdf': issue['covers']['big'],
+    }
+    for width, entry in issue['derivatives'].items():
+        sources[f"{width}w"] = entry['jpeg']
+    return sources
+
+def load_hashes(paths, filename=HASH_CACHE):
+    """
+    Хеши файлов: из кеша, если файл не менялся, иначе считаются заново
+    в пуле потоков (Pillow отпускает GIL на декодировании).
+    """
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        cache = {}
+
+    hashes = {}
+    stale = []
+    for path in paths:
+        stat = os.stat(path)
+        entry = cache.get(path)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            hashes[path] = int(entry[2], 16)
+        else:
+            stale.append((path, stat))
+
+    def compute(item):
+        path, stat = item
+        try:
+            return path, stat, dhash(path)
+        except OSError as e:
+            print(f"  Не удалось прочитать {path}: {e}")
+            return path, stat, None
+
+    with ThreadPoolExecutor() as pool:
+        for path, stat, value in pool.map(compute, stale):
+            if value is not None:
+                hashes[path] = value
+                cache[path] = [stat.st_mtime_ns, stat.st_size, f"{value:016x}"]
+
+    if stale:
+        cache = {path: entry for path, entry in cache.items() if path in hashes}
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, separators=(',', ':'), sort_keys=True)
+    return hashes, len(stale)
+
+def verify_covers(mismatch=MISMATCH_DISTANCE, duplicate=DUPLICATE_DISTANCE):
+    """Проверяет обложки всех выпусков. Возвращает число найденных проблем."""
+    started = time.perf_counter()
+    catalog = load_catalog()
+    sources = {issue['id']: {name: path for name, path in cover_sources(issue).items()
+                             if os.path.exists(path)}
+               for issue in catalog}
+    hashes, computed = load_hashes([path for paths in sources.values() for path in paths.values()])
+    hashed = time.perf_counter()
+
+    # Дерево на каждый источник: обложки из одной папки сравниваются между собой,
+    # а чужие - с эталонами из таблицы
+    trees = {}
+    for issue_id, paths in sources.items():
+        for name, path in paths.items():
+            if path in hashes:
+                trees.setdefault(name, BKTree()).add(hashes[path], issue_id)
+
+    mismatches = []
+    for issue in catalog:
+        paths = sources[issue['id']]
+        reference = hashes.get(paths.get(REFERENCE))
+        if reference is None:
+            continue
+        for name, path in paths.items():
+            if name == REFERENCE or path not in hashes:
+                continue
+            distance = hamming(reference, hashes[path])
+            if distance <= mismatch:
+                continue
+            # Чья это обложка: ближайший эталон из таблицы
+            candidates = [(d, other) for d, other in trees[REFERENCE].search(hashes[path], mismatch)
+                          if other != issue['id']]
+            mismatches.append((issue, name, path, distance, candidates[0] if candidates else None))
+
+    duplicates = []
+    for name, tree in sorted(trees.items()):
+        seen = set()
+        for issue in catalog:
+            path = sources[issue['id']].get(name)
+            if path not in hashes:
+                continue
+            for distance, other in tree.search(hashes[path], duplicate):
+                pair = tuple(sorted((issue['id'], other)))
+                if other != issue['id'] and pair not in seen:
+                    seen.add(pair)
+                    duplicates.append((name, pair, distance))
+    finished = time.perf_counter()
+
+    counts = ', '.join(f"{name} {sum(name in paths for paths in sources.values())}"
+                       for name in sorted(trees))
+    print(f"Выпусков: {len(catalog)}. Обложек по источникам: {counts}")
+    for issue, name, path, distance, guess in mismatches:
+        hint = (f", похожа на {catalog.by_id[guess[1]]['number']} ({catalog.by_id[guess[1]]['date']}, "
+                f"расстояние {guess[0]})" if guess else "")
+        print(f"  Не совпадает: {issue['number']} ({issue['date']}) {name} {path}: "
+              f"расстояние {distance}{hint}")
+    for name, (first, second), distance in duplicates:
+        print(f"  Дубликат в {name}: {catalog.by_id[first]['number']} ({catalog.by_id[first]['date']}) и "
+              f"{catalog.by_id[second]['number']} ({catalog.by_id[second]['date']}), расстояние {distance}")
+    print(f"Несовпадений: {len(mismatches)}, дубликатов: {len(duplicates)}. "
+          f"Хеши: {len(hashes)} ({computed} посчитано) за {hashed - started:.2f} с, "
+          f"сверка за {(finished - hashed) * 1000:.0f} мс")
+    return len(mismatches) + len(duplicates)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Поиск перепутанных и повторяющихся обложек")
+    parser.add_argument('--mismatch', type=int, default=MISMATCH_DISTANCE,
+                        help=f"расстояние, с которого обложка считается чужой (по умолчанию {MISMATCH_DISTANCE})")
+    parser.add_argument('--duplicate', type=int, default=DUPLICATE_DISTANCE,
+                        help=f"расстояние, до которого обложки считаются одинаковыми (по умолчанию {DUPLICATE_DISTANCE})")
+    args = parser.parse_args()
+    if verify_covers(mismatch=args.mismatch, duplicate=args.duplicate):
+        raise SystemExit(1)